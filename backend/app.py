@@ -1,13 +1,24 @@
 from flask import Flask, request, jsonify, render_template, redirect, session, url_for, flash
 from flask_cors import CORS
+import json
+import logging
+import numpy as np
 import pandas as pd
-from aif360.datasets import StandardDataset
-from aif360.metrics import BinaryLabelDatasetMetric
-from models import db, User
+from user_models import db, User
+from bias_metrics import (metrics_from_counts, compute_bias_metrics, group_counts, stream_group_counts,
+                          bias_report_from_counts, as_column_type, EmptyGroupError)
+from bias_cache import bias_cache, cached_frame, cached_group_counts, file_digest
+from jobs import get_job_queue, save_upload, QueueFullError
+from fairness_sweep import threshold_sweep, parse_folds, parse_thresholds, DEFAULT_FOLDS
+from dataset_store import (dataset_registry, upload_store, register_upload, finish_upload, parse_byte_count,
+                      UploadError, OffsetMismatchError, InvalidDatasetError)
+from metrics import instrument_flask
 from werkzeug.security import generate_password_hash, check_password_hash
 
 app = Flask(__name__)
 CORS(app)
+# Per-route latency, sizes and in-flight counts on /metrics, and profiles of slow requests
+instrument_flask(app)
 
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///aicademia.db'
 app.config['SECRET_KEY'] = 'vaibhav@aicademia'
@@ -80,11 +91,74 @@ def upload_file():
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No selected file'})
-    # Process the file here
-    return jsonify({'message': 'File uploaded successfully'})
+    # Stored once as Parquet; later requests refer to it by dataset_id
+    try:
+        dataset = register_upload(file.stream, file.filename)
+    except InvalidDatasetError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'File uploaded successfully', **dataset})
+
+# Resumable uploads: create one, PATCH chunks with an Upload-Offset header
+# (after a dropped connection, GET tells where to continue), then complete it
+# to get a dataset_id.
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    body = request.get_json(silent=True) or {}
+    try:
+        upload_id = upload_store.create(body.get('filename'), body.get('size'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid size: {e}'}), 400
+    return jsonify(upload_store.status(upload_id)), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'PATCH'])
+def upload_chunk(upload_id):
+    try:
+        if request.method == 'GET':
+            return jsonify(upload_store.status(upload_id))
+        try:
+            offset = parse_byte_count(request.headers.get('Upload-Offset'))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid Upload-Offset header: {e}'}), 400
+        new_offset = upload_store.append(upload_id, offset, request.stream)
+        return jsonify({'upload_id': upload_id, 'offset': new_offset})
+    except KeyError:
+        return jsonify({'error': 'Unknown upload id'}), 404
+    except OffsetMismatchError as e:
+        return jsonify({'error': str(e), 'offset': e.expected}), 409
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    try:
+        return jsonify(finish_upload(upload_id))
+    except KeyError:
+        return jsonify({'error': 'Unknown upload id'}), 404
+    except InvalidDatasetError as e:
+        return jsonify({'error': str(e)}), 400
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/datasets/<dataset_id>')
+def dataset_info(dataset_id):
+    try:
+        return jsonify(dataset_registry.info(dataset_id))
+    except (KeyError, FileNotFoundError):
+        return jsonify({'error': 'Unknown dataset id'}), 404
 
 def check_bias(data, label, protected_attr, favorable_class, privileged_value):
+    # aif360 is imported on first use so login and registration workers never load it
+    from aif360.datasets import StandardDataset
+    from aif360.metrics import BinaryLabelDatasetMetric
+
     try:
+        # Form values are strings, compare them as the column's type
+        favorable_class = as_column_type(data[label], favorable_class)
+        privileged_value = as_column_type(data[protected_attr], privileged_value)
+        privileged = data.dropna()[protected_attr] == privileged_value
+        if not privileged.any():
+            raise EmptyGroupError(f'No rows have {protected_attr} = {privileged_value}')
+        if privileged.all():
+            raise EmptyGroupError(f'Every row has {protected_attr} = {privileged_value}, the unprivileged group is empty')
+
         # Ensure privileged_value is formatted correctly
         privileged_classes = [[privileged_value]]
 
@@ -97,53 +171,179 @@ def check_bias(data, label, protected_attr, favorable_class, privileged_value):
             privileged_classes=privileged_classes
         )
 
-        # Define the metric
+        # Define the metric. StandardDataset recodes text attributes to 1.0
+        # (privileged) and 0.0 but keeps numeric ones, so the groups are taken
+        # from the values it reports rather than from privileged_value.
         metric = BinaryLabelDatasetMetric(
             dataset,
-            privileged_groups=[{protected_attr: privileged_value}],
-            unprivileged_groups=[{protected_attr: lambda x: x != privileged_value}]
+            privileged_groups=[{protected_attr: value} for value in dataset.privileged_protected_attributes[0]],
+            unprivileged_groups=[{protected_attr: value} for value in dataset.unprivileged_protected_attributes[0]]
         )
 
         # Return the bias metrics
+        disparate_impact = metric.disparate_impact()
         bias_metrics = {
             'mean_difference': metric.mean_difference(),
-            'disparate_impact': metric.disparate_impact()
+            # JSON has no NaN; undefined when no privileged row is favorable
+            'disparate_impact': disparate_impact if np.isfinite(disparate_impact) else None
         }
         return bias_metrics
-    except Exception as e:
-        print("Error in check_bias function:", e)
+    except EmptyGroupError:
+        raise
+    except Exception:
+        logging.exception("Error in check_bias function")
         raise
 
 @app.route('/check-bias', methods=['POST'])
 def check_bias_route():
     try:
-        print("Request received")
-        if 'file' not in request.files:
+        dataset_id = request.form.get('dataset_id')
+        if not dataset_id and 'file' not in request.files:
             return jsonify({'error': 'No file part'})
-        file = request.files['file']
-        print("File received:", file.filename)
-        data = pd.read_csv(file)
-        print("Data read into dataframe")
-
+        file = request.files.get('file')
         label = request.form['label']
-        print("Label received:", label)
-
         protected_attr = request.form['protected_attr']
-        print("Protected attribute received:", protected_attr)
+        favorable_class = request.form['favorable_class']
+        privileged_value = request.form['privileged_value']
+
+        # Large uploads can ask for the streaming mode, which parses the CSV
+        # chunk by chunk and keeps only group counts. Both modes are cached on
+        # the upload's hash, so re-sending the same file with other parameters
+        # skips parsing. A registered dataset is read from Parquet.
+        if dataset_id:
+            try:
+                # All columns: a missing value in any of them drops the row
+                data = dataset_registry.load(dataset_id)
+            except KeyError:
+                return jsonify({'error': 'Unknown dataset id'}), 404
+            if request.form.get('mode') == 'stream':
+                counts = group_counts(data, label, [protected_attr])
+                bias_metrics = metrics_from_counts(counts, label, protected_attr, favorable_class, privileged_value)
+            else:
+                bias_metrics = check_bias(data, label, protected_attr, favorable_class, privileged_value)
+        elif request.form.get('mode') == 'stream':
+            counts = cached_group_counts(file.stream, label, [protected_attr], stream_group_counts)
+            bias_metrics = metrics_from_counts(counts, label, protected_attr, favorable_class, privileged_value)
+        else:
+            data = cached_frame(file.stream, pd.read_csv)
+            bias_metrics = check_bias(data, label, protected_attr, favorable_class, privileged_value)
+
+        return jsonify(bias_metrics)
+    except EmptyGroupError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.exception("Error processing check-bias request")
+        return jsonify({"error": str(e)}), 500
 
+@app.route('/check-bias-multi', methods=['POST'])
+def check_bias_multi_route():
+    try:
+        dataset_id = request.form.get('dataset_id')
+        if not dataset_id and 'file' not in request.files:
+            return jsonify({'error': 'No file part'})
+        file = request.files.get('file')
+
+        label = request.form['label']
         favorable_class = request.form['favorable_class']
-        print("Favorable class received:", favorable_class)
+        # Comma separated list of attributes, and a JSON object mapping each one
+        # to its privileged value
+        protected_attrs = [attr.strip() for attr in request.form['protected_attrs'].split(',') if attr.strip()]
+        privileged_values = json.loads(request.form['privileged_values'])
+
+        missing = [attr for attr in protected_attrs if attr not in privileged_values]
+        if missing:
+            return jsonify({'error': f'No privileged value for: {", ".join(missing)}'}), 400
+
+        if dataset_id:
+            try:
+                data = dataset_registry.load(dataset_id)
+            except KeyError:
+                return jsonify({'error': 'Unknown dataset id'}), 404
+            bias_report = compute_bias_metrics(data, label, protected_attrs, favorable_class, privileged_values)
+        elif request.form.get('mode') == 'stream':
+            counts = cached_group_counts(file.stream, label, protected_attrs, stream_group_counts)
+            bias_report = bias_report_from_counts(counts, label, protected_attrs, favorable_class, privileged_values)
+        else:
+            data = cached_frame(file.stream, pd.read_csv)
+            bias_report = compute_bias_metrics(data, label, protected_attrs, favorable_class, privileged_values)
+
+        return jsonify(bias_report)
+    except EmptyGroupError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.exception("Error processing check-bias-multi request")
+        return jsonify({"error": str(e)}), 500
 
+@app.route('/fairness-sweep', methods=['POST'])
+def fairness_sweep_route():
+    try:
+        dataset_id = request.form.get('dataset_id')
+        if not dataset_id and 'file' not in request.files:
+            return jsonify({'error': 'No file part'})
+        label = request.form['label']
+        protected_attr = request.form['protected_attr']
+        favorable_class = request.form['favorable_class']
         privileged_value = request.form['privileged_value']
-        print("Privileged value received:", privileged_value)
+        try:
+            n_folds = parse_folds(request.form.get('n_folds', DEFAULT_FOLDS))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid n_folds: {e}'}), 400
+        # Optional comma separated thresholds, the default grid otherwise
+        try:
+            thresholds = parse_thresholds(request.form.get('thresholds'))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid thresholds: {e}'}), 400
 
-        bias_metrics = check_bias(data, label, protected_attr, favorable_class, privileged_value)
-        print("Bias metrics calculated:", bias_metrics)
+        if dataset_id:
+            try:
+                data = dataset_registry.load(dataset_id)
+            except KeyError:
+                return jsonify({'error': 'Unknown dataset id'}), 404
+        else:
+            data = cached_frame(request.files['file'].stream, pd.read_csv)
 
-        return jsonify(bias_metrics)
+        curve = threshold_sweep(data, label, protected_attr, favorable_class, privileged_value,
+                                thresholds=thresholds, n_folds=n_folds)
+        return jsonify(curve)
     except Exception as e:
-        print("Error processing request:", e)
+        logging.exception("Error processing fairness-sweep request")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/cache-stats')
+def cache_stats():
+    return jsonify(bias_cache.stats())
+
+@app.route('/mitigation-jobs', methods=['POST'])
+def submit_mitigation_job():
+    dataset_id = request.form.get('dataset_id')
+    if not dataset_id and 'file' not in request.files:
+        return jsonify({'error': 'No file part'})
+    label = request.form['label']
+    protected_attr = request.form['protected_attr']
+
+    if dataset_id:
+        # Dataset ids are the SHA-256 of the uploaded CSV, the same key jobs use
+        try:
+            file_path = dataset_registry.parquet_path(dataset_id)
+        except KeyError:
+            return jsonify({'error': 'Unknown dataset id'}), 404
+        dataset_digest = dataset_id
+    else:
+        file = request.files['file']
+        dataset_digest = file_digest(file.stream)
+        file_path = save_upload(file.stream, dataset_digest)
+    try:
+        job_id = get_job_queue().submit(file_path, dataset_digest, label, protected_attr)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+    return jsonify({'job_id': job_id}), 202
+
+@app.route('/mitigation-jobs/<job_id>')
+def mitigation_job_status(job_id):
+    status = get_job_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(status)
+
 if __name__ == '__main__':
     app.run(debug=True, port=8000)
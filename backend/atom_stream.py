@@ -0,0 +1,87 @@
+import re
+import xml.etree.ElementTree as ET
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+OPENSEARCH = '{http://a9.com/-/spec/opensearch/1.1/}'
+
+# Bytes read from the response per parser feed
+CHUNK_SIZE = 64 * 1024
+
+
+def arxiv_id_from_url(url):
+    """
+    Extracts the version-less arXiv id from an entry id such as 'http://arxiv.org/abs/2101.00001v2'.
+    """
+    arxiv_id = url.split('/abs/', 1)[-1]
+    return re.sub(r'v\d+$', '', arxiv_id)
+
+
+def parse_entry(entry):
+    """
+    Converts an Atom <entry> element into a paper dict.
+
+    Args:
+        entry (xml.etree.ElementTree.Element): The entry element.
+
+    Returns:
+        dict: The paper details.
+    """
+    pdf_link_element = entry.find(f'{ATOM}link[@type="application/pdf"]')
+    return {
+        "arxiv_id": arxiv_id_from_url(entry.findtext(f'{ATOM}id', '')),
+        "title": entry.findtext(f'{ATOM}title'),
+        "summary": (entry.findtext(f'{ATOM}summary') or '').strip(),
+        "authors": [author.findtext(f'{ATOM}name') for author in entry.findall(f'{ATOM}author')],
+        "link": pdf_link_element.attrib.get('href') if pdf_link_element is not None else None,
+        "published": entry.findtext(f'{ATOM}published'),
+        "updated": entry.findtext(f'{ATOM}updated')
+    }
+
+
+class AtomStream:
+    """
+    Parses an arXiv Atom response incrementally, yielding a paper dict as soon as each <entry> closes.
+
+    The body is fed to an XMLPullParser chunk by chunk and finished entries are
+    dropped from the tree, so memory holds one chunk and one entry rather than
+    the whole response twice (text plus tree).
+
+    Usage:
+        stream = AtomStream(response)
+        async for paper in stream:
+            ...
+        stream.total_results  # set once the feed header has been parsed
+
+    Args:
+        response (aiohttp.ClientResponse): Response whose body is the Atom feed.
+        chunk_size (int, optional): Bytes read per parser feed.
+    """
+
+    def __init__(self, response, chunk_size=CHUNK_SIZE):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.total_results = None
+
+    async def __aiter__(self):
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        root = None
+
+        def drain():
+            nonlocal root
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                elif elem.tag == f'{ATOM}entry':
+                    yield parse_entry(elem)
+                    root.remove(elem)
+                elif elem.tag == f'{OPENSEARCH}totalResults':
+                    self.total_results = int(elem.text)
+
+        async for chunk in self.response.content.iter_chunked(self.chunk_size):
+            parser.feed(chunk)
+            for paper in drain():
+                yield paper
+        parser.close()
+        for paper in drain():
+            yield paper
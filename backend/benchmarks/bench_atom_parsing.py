@@ -0,0 +1,73 @@
+"""
+Compares whole-body Atom parsing with AtomStream on a page served by the local stub server.
+
+Reports peak Python memory (tracemalloc) and time to the first parsed paper.
+
+Usage: python benchmarks/bench_atom_parsing.py [entries_per_page]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import aiohttp
+from aiohttp import web
+
+from harness import BACKEND_DIR  # noqa: F401 (puts the backend modules on sys.path)
+from stub_arxiv import make_app, synthetic_papers
+from atom_stream import ATOM, AtomStream, parse_entry
+
+PORT = 8089
+
+
+async def whole_body(session, url):
+    start = time.perf_counter()
+    async with session.get(url) as response:
+        data = await response.text()
+        root = ET.fromstring(data)
+        papers = [parse_entry(entry) for entry in root.findall(f'{ATOM}entry')]
+    # Nothing is available before the whole body has been parsed
+    return papers, time.perf_counter() - start
+
+
+async def streamed(session, url):
+    start = time.perf_counter()
+    first = None
+    papers = []
+    async with session.get(url) as response:
+        async for paper in AtomStream(response):
+            if first is None:
+                first = time.perf_counter() - start
+            papers.append(paper)
+    return papers, first
+
+
+async def run(name, parse, session, url):
+    tracemalloc.start()
+    start = time.perf_counter()
+    papers, first_paper = await parse(session, url)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:>10}: {len(papers)} papers, first after {first_paper * 1000:.1f} ms, '
+          f'total {total * 1000:.1f} ms, peak {peak / 1024 / 1024:.1f} MB')
+
+
+async def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    runner = web.AppRunner(make_app(synthetic_papers(entries)))
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', PORT).start()
+
+    url = f'http://localhost:{PORT}/api/query?start=0&max_results={entries}'
+    try:
+        async with aiohttp.ClientSession() as session:
+            await run('whole body', whole_body, session, url)
+            await run('streamed', streamed, session, url)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""
+Measures embedding throughput into the on-disk EmbeddingStore at several encoder batch sizes.
+
+A second pass over the same corpus shows the cost of an incremental run
+where nothing changed.
+
+Usage: python benchmarks/bench_embedding.py [n_docs] [workers]
+"""
+import sys
+import tempfile
+import time
+
+from harness import peak_rss_mb, synthetic_corpus
+from sentence_transformers import SentenceTransformer
+from embedding_store import EmbeddingStore
+from preprocessing import EMBEDDING_DIM, MODEL_NAME, embed_batch
+
+READ_BATCH = 1024
+
+
+def embed_corpus(store, model, doc_ids, documents, batch_size, pool):
+    encoded = 0
+    for start in range(0, len(documents), READ_BATCH):
+        encoded += embed_batch(store, model, doc_ids[start:start + READ_BATCH],
+                               documents[start:start + READ_BATCH], batch_size, pool)
+    store.flush()
+    return encoded
+
+
+def main():
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    documents = synthetic_corpus(n_docs)
+    doc_ids = [f'doc{i}' for i in range(n_docs)]
+    model = SentenceTransformer(MODEL_NAME)
+    pool = model.start_multi_process_pool(target_devices=['cpu'] * workers) if workers else None
+
+    try:
+        for batch_size in (16, 64, 256):
+            with tempfile.TemporaryDirectory() as store_dir:
+                store = EmbeddingStore(store_dir, EMBEDDING_DIM)
+                start = time.perf_counter()
+                encoded = embed_corpus(store, model, doc_ids, documents, batch_size, pool)
+                cold = time.perf_counter() - start
+
+                start = time.perf_counter()
+                embed_corpus(store, model, doc_ids, documents, batch_size, pool)
+                warm = time.perf_counter() - start
+                print(f'batch {batch_size:>3}: {encoded / cold:.0f} docs/s, '
+                      f'unchanged re-run {warm:.2f}s, peak RSS {peak_rss_mb():.0f} MB')
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+
+
+if __name__ == '__main__':
+    main()
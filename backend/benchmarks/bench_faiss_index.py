@@ -0,0 +1,71 @@
+"""
+Recall@k versus query latency of the approximate index types against the flat baseline.
+
+Usage: python benchmarks/bench_faiss_index.py [n_vectors] [n_queries]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from harness import BACKEND_DIR  # noqa: F401 (puts the RAG modules on sys.path)
+from indexing import PersistentIndex
+
+DIM = 384
+K = 10
+CONFIGS = [
+    ('flat', {}, {}),
+    ('ivf_flat', {'nlist': 1024}, {'nprobe': 8}),
+    ('ivf_flat', {'nlist': 1024}, {'nprobe': 32}),
+    ('ivf_pq', {'nlist': 1024, 'pq_m': 48}, {'nprobe': 16}),
+    ('hnsw', {'hnsw_m': 32}, {'ef_search': 64}),
+    ('hnsw', {'hnsw_m': 32}, {'ef_search': 256}),
+]
+
+
+def clustered_vectors(n, dim, n_clusters=200, seed=0):
+    """Normalized vectors around random centres, closer to sentence embeddings than pure noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(n_clusters, dim))
+    vectors = centres[rng.integers(0, n_clusters, n)] + 0.5 * rng.normal(size=(n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def main():
+    n_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    vectors = clustered_vectors(n_vectors + n_queries, DIM)
+    corpus, queries = vectors[:n_vectors], vectors[n_vectors:]
+    doc_ids = [str(i) for i in range(n_vectors)]
+
+    truth = None
+    for index_type, build_params, search_params in CONFIGS:
+        with tempfile.TemporaryDirectory() as path:
+            index = PersistentIndex(path, DIM, index_type, **build_params)
+            start = time.perf_counter()
+            index.train(corpus)
+            index.add(corpus, doc_ids)
+            build = time.perf_counter() - start
+            index.save()
+
+            start = time.perf_counter()
+            index = PersistentIndex.load(path, mmap=index_type != 'hnsw')
+            load = time.perf_counter() - start
+            index.set_search_params(**search_params)
+
+            start = time.perf_counter()
+            _, results = index.search(queries, K)
+            per_query = (time.perf_counter() - start) / n_queries
+
+        if truth is None:
+            truth = results
+        recall = np.mean([len(set(found) & set(expected)) / K for found, expected in zip(results, truth)])
+        print(f'{index_type:>8} {str(search_params):<20} recall@{K} {recall:.3f}  '
+              f'{per_query * 1e6:8.1f} us/query  build {build:6.1f}s  load {load:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
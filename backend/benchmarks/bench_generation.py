@@ -0,0 +1,54 @@
+"""
+Time-to-first-token and tokens/sec of the GPT-2 GenerationEngine, float32 and int8-quantized.
+
+Streaming measures a single request; batched runs N concurrent requests
+through the micro-batcher.
+
+Usage: python benchmarks/bench_generation.py [max_new_tokens]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import synthetic_corpus
+from generation import GenerationEngine
+
+CONCURRENCY = (1, 4, 8)
+
+
+def bench_stream(engine, query, docs, max_new_tokens):
+    start = time.perf_counter()
+    first = None
+    pieces = 0
+    for _ in engine.stream(query, docs, max_new_tokens):
+        if first is None:
+            first = time.perf_counter() - start
+        pieces += 1
+    total = time.perf_counter() - start
+    return first, pieces / total
+
+
+def bench_batched(engine, queries, docs, max_new_tokens):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(len(queries)) as pool:
+        list(pool.map(lambda query: engine.generate(query, docs, max_new_tokens), queries))
+    return len(queries) * max_new_tokens / (time.perf_counter() - start)
+
+
+def main():
+    max_new_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    docs = synthetic_corpus(5, words_per_doc=300)
+    queries = [f'What does the literature say about topic {i}?' for i in range(max(CONCURRENCY))]
+
+    for quantize in (False, True):
+        engine = GenerationEngine(quantize=quantize)
+        ttft, stream_rate = bench_stream(engine, queries[0], docs, max_new_tokens)
+        label = 'int8' if quantize else 'fp32'
+        print(f'{label}: stream TTFT {ttft * 1000:.0f} ms, {stream_rate:.1f} tokens/s')
+        for concurrency in CONCURRENCY:
+            rate = bench_batched(engine, queries[:concurrency], docs, max_new_tokens)
+            print(f'{label}: {concurrency} concurrent requests, {rate:.1f} tokens/s')
+
+
+if __name__ == '__main__':
+    main()
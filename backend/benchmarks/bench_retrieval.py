@@ -0,0 +1,49 @@
+"""
+Queries/sec of RetrievalService at batch sizes 1 to 256, with and without a domain filter.
+
+Builds a unified flat index over a synthetic corpus split into the three domains.
+
+Usage: python benchmarks/bench_retrieval.py [n_docs]
+"""
+import sys
+import tempfile
+import time
+
+from harness import synthetic_corpus
+from sentence_transformers import SentenceTransformer
+from embedding_store import EmbeddingStore
+from indexing import PersistentIndex
+from preprocessing import COLLECTIONS, EMBEDDING_DIM, MODEL_NAME
+from retrieval import RetrievalService
+
+BATCH_SIZES = (1, 4, 16, 64, 256)
+N_QUERIES = 512
+
+
+def main():
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    model = SentenceTransformer(MODEL_NAME)
+    documents = synthetic_corpus(n_docs, words_per_doc=60)
+    queries = synthetic_corpus(N_QUERIES, words_per_doc=8, seed=1)
+
+    with tempfile.TemporaryDirectory() as path:
+        index = PersistentIndex(path, EMBEDDING_DIM)
+        vectors = model.encode(documents, batch_size=128)
+        for i, collection in enumerate(COLLECTIONS):
+            store = EmbeddingStore(f'{path}/{collection}', EMBEDDING_DIM)
+            rows = range(i, n_docs, len(COLLECTIONS))
+            store.put([str(row) for row in rows], [''] * len(rows), vectors[list(rows)])
+            index.sync_from_store(store, id_prefix=f'{collection}:')
+        service = RetrievalService(model, index)
+
+        for domains in (None, ['ethics_papers']):
+            for batch_size in BATCH_SIZES:
+                start = time.perf_counter()
+                for offset in range(0, N_QUERIES, batch_size):
+                    service.search(queries[offset:offset + batch_size], k=5, domains=domains)
+                qps = N_QUERIES / (time.perf_counter() - start)
+                print(f'domains={domains} batch {batch_size:>3}: {qps:8.1f} queries/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Reports import time and peak RSS of the Flask app in a fresh interpreter.
+
+'eager' reproduces the old startup, where importing models pulled in
+tensorflow, aif360 algorithms and sklearn. 'lazy' is what app.py costs now.
+
+Usage: python benchmarks/bench_startup.py [repeat]
+"""
+import json
+import subprocess
+import sys
+
+from harness import BACKEND_DIR
+
+EAGER_IMPORTS = (
+    'import tensorflow, sklearn.linear_model, sklearn.metrics; '
+    'import aif360.datasets, aif360.metrics, aif360.algorithms.preprocessing, aif360.algorithms.inprocessing; '
+)
+
+CHILD = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{imports}import app
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'import_seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'tensorflow_loaded': 'tensorflow' in sys.modules
+}}))
+'''
+
+
+def run_child(imports):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(imports=imports)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for name, imports in (('eager', EAGER_IMPORTS), ('lazy', '')):
+        runs = [run_child(imports) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['import_seconds'])
+        print(f'{name:>5}: import {best["import_seconds"]:.2f}s, '
+              f'peak RSS {best["max_rss_mb"]:.0f} MB, tensorflow loaded: {best["tensorflow_loaded"]}')
+
+
+if __name__ == '__main__':
+    main()
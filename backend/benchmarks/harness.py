@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+# Benchmarks run as scripts from anywhere, so make the backend and RAG modules importable
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAG_DIR = os.path.join(BACKEND_DIR, 'rag-integration')
+for path in (BACKEND_DIR, RAG_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def measure(fn, repeat=5, warmup=1):
+    """
+    Times repeated calls of fn and summarizes the latencies.
+
+    Args:
+        fn (callable): Function called without arguments.
+        repeat (int, optional): Number of timed calls.
+        warmup (int, optional): Number of untimed calls made first.
+
+    Returns:
+        dict: Latency percentiles and mean in seconds.
+    """
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    return summarize(timings)
+
+
+def summarize(timings):
+    """Latency percentiles and mean of timings measured in seconds."""
+    timings = np.array(timings)
+    return {
+        'p50': float(np.percentile(timings, 50)),
+        'p95': float(np.percentile(timings, 95)),
+        'p99': float(np.percentile(timings, 99)),
+        'min': float(timings.min()),
+        'mean': float(timings.mean()),
+        'repeat': len(timings)
+    }
+
+
+def synthetic_hiring_frame(n_rows, n_attrs, seed=0):
+    """
+    Builds a numeric hiring dataset with a binary 'hired' label and n_attrs protected attributes.
+
+    The label is skewed by the first attribute so the metrics are not all zero.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    data = {f'attr_{i}': rng.integers(0, 3, n_rows) for i in range(n_attrs)}
+    data['score'] = rng.normal(size=n_rows)
+    bias = np.where(data['attr_0'] == 1, 0.15, 0.0)
+    data['hired'] = (rng.random(n_rows) < 0.4 + bias).astype(int)
+    return pd.DataFrame(data)
+
+
+def synthetic_corpus(n_docs, words_per_doc=200, seed=0):
+    """Generates n_docs pseudo-abstracts drawn from a Zipf-distributed vocabulary."""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f'term{i}' for i in range(5000)])
+    ranks = np.minimum(rng.zipf(1.3, size=(n_docs, words_per_doc)), len(vocabulary)) - 1
+    return [' '.join(vocabulary[row]) for row in ranks]
+
+
+def peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
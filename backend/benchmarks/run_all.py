@@ -0,0 +1,362 @@
+"""
+Runs the hot-path benchmarks and saves latency percentiles, throughput and peak memory as JSON.
+
+Every case runs in a fresh interpreter so its peak RSS is its own. Inputs
+are synthetic: hiring CSVs, a local stub arXiv server and generated
+corpora, sized by the options below. Cases whose packages are missing or
+whose models cannot be downloaded are recorded as skipped; any other error
+is recorded as failed and makes the run exit non-zero.
+
+Results land in benchmarks/results/<commit>-<time>.json; pass --compare with
+an earlier file to print the p50 change of every case.
+
+Usage: python benchmarks/run_all.py [--cases bias_check,faiss_search] [--rows N] [--docs N]
+                                    [--papers N] [--repeat N] [--compare OLD.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from harness import BACKEND_DIR, measure, peak_rss_mb, summarize, synthetic_corpus, synthetic_hiring_frame
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+STUB_PORT = 8093
+# Dimension of the sentence embeddings, without importing the encoder just for it
+EMBEDDING_DIM = 384
+
+
+class ModelUnavailable(Exception):
+    """A model a case needs could not be downloaded or loaded here."""
+
+
+def load_model(loader, *args, **kwargs):
+    """Calls a model loader, turning its download and file errors into ModelUnavailable."""
+    try:
+        return loader(*args, **kwargs)
+    except OSError as e:
+        raise ModelUnavailable(f'{type(e).__name__}: {e}') from e
+
+
+def bench_bias_check(args):
+    """Single-pass metrics for every protected attribute of an in-memory frame."""
+    from bias_metrics import compute_bias_metrics
+
+    data = synthetic_hiring_frame(args.rows, args.attrs)
+    attrs = [f'attr_{i}' for i in range(args.attrs)]
+    privileged = {attr: 1 for attr in attrs}
+    timing = measure(lambda: compute_bias_metrics(data, 'hired', attrs, 1, privileged), repeat=args.repeat)
+    return timing, args.rows
+
+
+def bench_bias_check_streaming(args):
+    """check_bias_streaming over a CSV on disk, as /check-bias?mode=stream does."""
+    from bias_metrics import check_bias_streaming
+
+    with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+        synthetic_hiring_frame(args.rows, args.attrs).to_csv(f.name, index=False)
+        timing = measure(lambda: check_bias_streaming(f.name, 'hired', 'attr_0', 1, 1), repeat=args.repeat)
+    return timing, args.rows
+
+
+def bench_fairness_sweep(args):
+    """Cross-validated accuracy/fairness curve over 19 thresholds, folds fitted in parallel."""
+    from fairness_sweep import threshold_sweep
+
+    data = synthetic_hiring_frame(args.rows, args.attrs)
+    timing = measure(lambda: threshold_sweep(data, 'hired', 'attr_0', 1, 1), repeat=args.repeat)
+    return timing, args.rows
+
+
+def bench_harvest(args):
+    """Pages through the stub arXiv server with ArxivHarvester; storage is left out."""
+    from aiohttp import web
+    from fns_papers import ArxivHarvester
+    from stub_arxiv import make_app, synthetic_papers
+
+    class UnstoredHarvester(ArxivHarvester):
+        # Measures fetching, streaming parse and paging, not MongoDB
+        async def get_watermark(self, collection_name):
+            return None
+
+        async def set_watermark(self, collection_name, watermark):
+            pass
+
+        async def store(self, papers, collection_name):
+            return len(papers)
+
+    async def harvest_once():
+        async with UnstoredHarvester(database={}, base_url=f'http://localhost:{STUB_PORT}/api/query',
+                                     min_interval=0.0) as harvester:
+            harvester._indexed.add('bench')
+            return await harvester.harvest('bench', 'bench')
+
+    async def run():
+        runner = web.AppRunner(make_app(synthetic_papers(args.papers)))
+        await runner.setup()
+        await web.TCPSite(runner, 'localhost', STUB_PORT).start()
+        try:
+            timings = []
+            for _ in range(args.repeat + 1):
+                start = time.perf_counter()
+                await harvest_once()
+                timings.append(time.perf_counter() - start)
+            return timings[1:]
+        finally:
+            await runner.cleanup()
+
+    timings = asyncio.run(run())
+    return summarize(timings), args.papers
+
+
+def bench_chunking(args):
+    """Splits a generated corpus into overlapping passages."""
+    from chunking import chunk_papers
+
+    papers = [(str(i), text) for i, text in enumerate(synthetic_corpus(args.docs, words_per_doc=1000))]
+    return measure(lambda: chunk_papers(papers), repeat=args.repeat), args.docs
+
+
+def bench_trend_counting(args):
+    """Unigram to trigram counts of a generated corpus, the work of one trend partition."""
+    from report_generation import count_ngrams
+
+    papers = [{'title': '', 'summary': text} for text in synthetic_corpus(args.docs)]
+    return measure(lambda: count_ngrams(papers, 3), repeat=args.repeat), args.docs
+
+
+def bench_embedding(args):
+    """Encodes a generated corpus into an EmbeddingStore."""
+    from sentence_transformers import SentenceTransformer
+    from embedding_store import EmbeddingStore
+    from preprocessing import EMBEDDING_DIM, MODEL_NAME, embed_batch
+
+    model = load_model(SentenceTransformer, MODEL_NAME)
+    documents = synthetic_corpus(args.docs)
+    doc_ids = [str(i) for i in range(args.docs)]
+
+    def embed():
+        with tempfile.TemporaryDirectory() as path:
+            embed_batch(EmbeddingStore(path, EMBEDDING_DIM), model, doc_ids, documents)
+
+    return measure(embed, repeat=args.repeat), args.docs
+
+
+def random_vectors(n, seed=0):
+    import numpy as np
+
+    vectors = np.random.default_rng(seed).standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_faiss_build(args):
+    """Builds a flat PersistentIndex from random unit vectors."""
+    from indexing import PersistentIndex
+
+    vectors = random_vectors(args.docs)
+    doc_ids = [str(i) for i in range(args.docs)]
+
+    def build():
+        with tempfile.TemporaryDirectory() as path:
+            index = PersistentIndex(path, EMBEDDING_DIM)
+            index.add(vectors, doc_ids)
+            index.save()
+
+    return measure(build, repeat=args.repeat), args.docs
+
+
+def bench_faiss_search(args):
+    """Top-5 searches of single queries against a flat index, as retrieve_documents does."""
+    from indexing import PersistentIndex
+
+    with tempfile.TemporaryDirectory() as path:
+        index = PersistentIndex(path, EMBEDDING_DIM)
+        index.add(random_vectors(args.docs), [str(i) for i in range(args.docs)])
+        queries = random_vectors(args.queries, seed=1)
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query[None, :], k=5)
+            timings.append(time.perf_counter() - start)
+    return summarize(timings), 1
+
+
+def bench_bm25_search(args):
+    """Top-20 BM25 searches, the depth RetrievalService fuses with the dense results."""
+    from bm25 import BM25Index
+
+    documents = synthetic_corpus(args.docs, words_per_doc=60)
+    queries = synthetic_corpus(args.queries, words_per_doc=8, seed=1)
+    with tempfile.TemporaryDirectory() as path:
+        index = BM25Index(path)
+        index.add([f'bench:{i}' for i in range(args.docs)], documents)
+        index.save()
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, k=20)
+            timings.append(time.perf_counter() - start)
+    return summarize(timings), 1
+
+
+def bench_retrieval(args):
+    """End-to-end RetrievalService.search: encode the query, then search the index."""
+    from sentence_transformers import SentenceTransformer
+    from indexing import PersistentIndex
+    from preprocessing import EMBEDDING_DIM, MODEL_NAME
+    from retrieval import RetrievalService
+
+    model = load_model(SentenceTransformer, MODEL_NAME)
+    documents = synthetic_corpus(args.docs, words_per_doc=60)
+    queries = synthetic_corpus(args.queries, words_per_doc=8, seed=1)
+    with tempfile.TemporaryDirectory() as path:
+        index = PersistentIndex(path, EMBEDDING_DIM)
+        index.add(model.encode(documents, batch_size=128), [f'bench:{i}' for i in range(args.docs)])
+        service = RetrievalService(model, index)
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            service.search([query], k=5)
+            timings.append(time.perf_counter() - start)
+    return summarize(timings), 1
+
+
+def bench_generation(args):
+    """generate_response latency on the warm GPT-2 engine, with five retrieved documents as context."""
+    from generation import get_engine
+
+    engine = load_model(get_engine, max_new_tokens=args.new_tokens)
+    docs = synthetic_corpus(5, words_per_doc=300)
+    timing = measure(lambda: engine.generate('What does the literature say about fairness?', docs),
+                     repeat=args.repeat)
+    return timing, args.new_tokens
+
+
+CASES = {
+    'bias_check': bench_bias_check,
+    'bias_check_streaming': bench_bias_check_streaming,
+    'fairness_sweep': bench_fairness_sweep,
+    'harvest': bench_harvest,
+    'chunking': bench_chunking,
+    'trend_counting': bench_trend_counting,
+    'embedding': bench_embedding,
+    'faiss_build': bench_faiss_build,
+    'faiss_search': bench_faiss_search,
+    'bm25_search': bench_bm25_search,
+    'retrieval': bench_retrieval,
+    'generation': bench_generation,
+}
+
+
+def run_case(name, args):
+    """Runs one case in this process and prints its result as the last line of output."""
+    try:
+        timing, items = CASES[name](args)
+        result = dict(timing, items=items, throughput_per_s=items / timing['p50'] if timing['p50'] else None,
+                      peak_rss_mb=peak_rss_mb())
+    except (ImportError, ModelUnavailable) as e:
+        # Missing packages or models that cannot be downloaded here
+        result = {'skipped': f'{type(e).__name__}: {e}'}
+    except Exception as e:
+        result = {'failed': f'{type(e).__name__}: {e}', 'traceback': traceback.format_exc()}
+    print(json.dumps(result))
+
+
+def run_child(name, argv):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--case', name] + argv,
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {'failed': f'exited with {completed.returncode}: {completed.stderr.strip()[-500:]}'}
+    return json.loads(lines[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old_path, results):
+    with open(old_path) as f:
+        old = json.load(f)
+    print(f'\nCompared with {old["commit"]} ({os.path.basename(old_path)}):')
+    for name, result in results['cases'].items():
+        before = old['cases'].get(name, {})
+        if 'p50' in result and 'p50' in before:
+            change = (result['p50'] - before['p50']) / before['p50'] * 100
+            print(f'{name:>22}: p50 {before["p50"] * 1000:9.2f} ms -> {result["p50"] * 1000:9.2f} ms ({change:+.1f}%)')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', default=','.join(CASES), help='comma-separated cases to run')
+    parser.add_argument('--rows', type=int, default=200_000, help='rows of the synthetic hiring CSV')
+    parser.add_argument('--attrs', type=int, default=5, help='protected attributes of the hiring CSV')
+    parser.add_argument('--papers', type=int, default=1000, help='papers served by the stub arXiv server')
+    parser.add_argument('--docs', type=int, default=2000, help='documents in generated corpora')
+    parser.add_argument('--queries', type=int, default=200, help='single-query searches timed')
+    parser.add_argument('--new-tokens', type=int, default=32, help='tokens generated per request')
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per case')
+    parser.add_argument('--compare', help='earlier results file to compare with')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.case:
+        run_case(args.case, args)
+        return
+
+    params = {key: value for key, value in vars(args).items() if key not in ('cases', 'compare', 'case')}
+    # Children get the same sizes
+    child_argv = [f'--{key.replace("_", "-")}={value}' for key, value in params.items()]
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'cases': {}
+    }
+    for name in args.cases.split(','):
+        if name not in CASES:
+            raise SystemExit(f'Unknown case {name!r}, expected one of {", ".join(CASES)}')
+        result = run_child(name, child_argv)
+        results['cases'][name] = result
+        if 'skipped' in result:
+            print(f'{name:>22}: skipped ({result["skipped"].splitlines()[-1][:100]})')
+        elif 'failed' in result:
+            print(f'{name:>22}: FAILED ({result["failed"].splitlines()[-1][:100]})')
+        else:
+            print(f'{name:>22}: p50 {result["p50"] * 1000:9.2f} ms  p95 {result["p95"] * 1000:9.2f} ms  '
+                  f'p99 {result["p99"] * 1000:9.2f} ms  {result["throughput_per_s"]:10.1f} items/s  '
+                  f'peak RSS {result["peak_rss_mb"]:.0f} MB')
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f'{results["commit"]}-{time.strftime("%Y%m%d-%H%M%S")}.json')
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nSaved {path}')
+    if args.compare:
+        compare(args.compare, results)
+    failed = [name for name, result in results['cases'].items() if 'failed' in result]
+    if failed:
+        raise SystemExit(f'{len(failed)} case(s) failed: {", ".join(failed)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Local stand-in for the arXiv query API, serving a synthetic Atom corpus.
+
+It honours start, max_results and the newest-first sort the harvester asks
+for, so paging and incremental sync can be exercised without the network.
+
+Usage: python benchmarks/stub_arxiv.py [n_papers] [port]
+Then:  ARXIV_API_URL=http://localhost:8081/api/query python fns_papers.py
+"""
+import sys
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+WORDS = ('fairness bias model learning neural policy regulation ethics governance data '
+         'robust transparency accountability privacy audit deep agent safety risk').split()
+
+
+def synthetic_papers(n_papers, seed_date=datetime(2024, 1, 1)):
+    """Generates n_papers paper dicts, newest first, with deterministic content."""
+    papers = []
+    for i in range(n_papers):
+        words = [WORDS[(i * 7 + j * 3) % len(WORDS)] for j in range(120)]
+        published = (seed_date - timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        papers.append({
+            'arxiv_id': f'2401.{i:05d}',
+            'title': ' '.join(words[:8]).title(),
+            'summary': ' '.join(words),
+            'authors': [f'Author {i % 97}', f'Author {(i + 13) % 97}'],
+            'published': published
+        })
+    return papers
+
+
+def entry_xml(paper):
+    authors = ''.join(f'<author><name>{escape(name)}</name></author>' for name in paper['authors'])
+    return (
+        '<entry>'
+        f'<id>http://arxiv.org/abs/{paper["arxiv_id"]}v1</id>'
+        f'<updated>{paper["published"]}</updated>'
+        f'<published>{paper["published"]}</published>'
+        f'<title>{escape(paper["title"])}</title>'
+        f'<summary>{escape(paper["summary"])}</summary>'
+        f'{authors}'
+        f'<link title="pdf" href="http://arxiv.org/pdf/{paper["arxiv_id"]}v1" rel="related" type="application/pdf"/>'
+        '</entry>'
+    )
+
+
+def atom_feed(papers, total):
+    """Renders papers as an arXiv-style Atom feed reporting total results."""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+        f'<opensearch:totalResults>{total}</opensearch:totalResults>'
+        + ''.join(entry_xml(paper) for paper in papers) +
+        '</feed>'
+    )
+
+
+def make_app(papers):
+    async def query(request):
+        start = int(request.query.get('start', 0))
+        max_results = int(request.query.get('max_results', 10))
+        page = papers[start:start + max_results]
+        return web.Response(text=atom_feed(page, len(papers)), content_type='application/atom+xml')
+
+    app = web.Application()
+    app.router.add_get('/api/query', query)
+    return app
+
+
+if __name__ == '__main__':
+    n_papers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8081
+    web.run_app(make_app(synthetic_papers(n_papers)), port=port)
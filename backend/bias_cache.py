@@ -0,0 +1,71 @@
+import hashlib
+
+from lru_cache import LRUCache
+
+# Bytes hashed per read when fingerprinting an upload
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(stream):
+    """
+    Hashes an uploaded file without loading it into memory, then rewinds it.
+
+    Args:
+        stream: Seekable binary file object.
+
+    Returns:
+        str: Hex SHA-256 digest of the contents.
+    """
+    hasher = hashlib.sha256()
+    for block in iter(lambda: stream.read(HASH_BLOCK_SIZE), b''):
+        hasher.update(block)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+
+# Shared by the bias routes. Holds parsed frames keyed by upload digest, and
+# group counts keyed by (digest, label, protected attributes) for streamed uploads.
+bias_cache = LRUCache()
+
+
+def cached_frame(stream, read_csv):
+    """
+    Returns the parsed DataFrame for an upload, parsing it only if these bytes were not seen before.
+
+    Args:
+        stream: Seekable binary file object with CSV data.
+        read_csv (callable): Parser used on a cache miss.
+
+    Returns:
+        pd.DataFrame: The parsed upload. Callers must not modify it in place.
+    """
+    key = ('frame', file_digest(stream))
+    data = bias_cache.get(key)
+    if data is None:
+        data = read_csv(stream)
+        bias_cache.put(key, data, int(data.memory_usage(deep=True).sum()))
+    return data
+
+
+def cached_group_counts(stream, label, protected_attrs, count_fn):
+    """
+    Returns group counts for an upload, streaming through it only on a cache miss.
+
+    The counts do not depend on the favorable class or privileged values, so
+    changing those reuses the entry.
+
+    Args:
+        stream: Seekable binary file object with CSV data.
+        label (str): Name of the label column.
+        protected_attrs (list): Names of the protected attribute columns.
+        count_fn (callable): Called as count_fn(stream, label, protected_attrs) on a miss.
+
+    Returns:
+        pd.Series: Row counts indexed by (protected attrs..., label).
+    """
+    key = ('counts', file_digest(stream), label, tuple(protected_attrs))
+    counts = bias_cache.get(key)
+    if counts is None:
+        counts = count_fn(stream, label, protected_attrs)
+        bias_cache.put(key, counts, int(counts.memory_usage(deep=True)))
+    return counts
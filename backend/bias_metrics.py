@@ -0,0 +1,221 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Rows per chunk when streaming a CSV. Every column of a chunk is parsed, but
+# only its group counts are kept, so memory stays bounded by this number.
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class EmptyGroupError(ValueError):
+    """The privileged or the unprivileged group has no rows, so the group metrics are undefined."""
+
+
+def as_column_type(values, value):
+    """
+    Converts a value sent as a form string to the type of values.
+
+    A numeric label or attribute never equals the string '1', so without
+    this every row would fall outside the favorable class or privileged group.
+
+    Args:
+        values (pd.Series or pd.Index): Column or index level the value is compared with.
+        value: The value; anything but a string is returned unchanged.
+    """
+    if not isinstance(value, str):
+        return value
+    if pd.api.types.is_bool_dtype(values):
+        return {'true': True, '1': True, 'false': False, '0': False}.get(value.strip().lower(), value)
+    # Chunks merged by stream_group_counts can leave ints and floats in an object level
+    numeric = pd.api.types.is_numeric_dtype(values) or \
+        pd.api.types.infer_dtype(values, skipna=True) in ('integer', 'floating', 'mixed-integer-float')
+    if numeric:
+        try:
+            return pd.to_numeric(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _finite_or_none(value):
+    # JSON has no NaN or Infinity; an undefined ratio becomes null
+    return float(value) if np.isfinite(value) else None
+
+
+def group_counts(data, label, protected_attrs):
+    """
+    Counts rows for every combination of protected attribute values and label value.
+
+    These counts are sufficient statistics for the group metrics: once we have
+    them, the favorable class and privileged value can be applied without
+    touching the rows again.
+
+    Args:
+        data (pd.DataFrame): The dataset.
+        label (str): Name of the label column.
+        protected_attrs (list): Names of the protected attribute columns.
+
+    Returns:
+        pd.Series: Row counts indexed by (protected attrs..., label).
+    """
+    columns = list(protected_attrs) + [label]
+    # StandardDataset drops a row with a missing value in any column, not only
+    # in the grouped ones, so the counts match check_bias exactly
+    frame = data.dropna()[columns]
+    return frame.groupby(columns, sort=False).size()
+
+
+def stream_group_counts(source, label, protected_attrs, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Same as group_counts, but reads a CSV in chunks so memory does not grow with file size.
+
+    Every column is parsed, since a missing value in any of them drops the
+    row, but only the grouped columns of a chunk outlive it.
+
+    Args:
+        source: Path or file-like object with CSV data.
+        label (str): Name of the label column.
+        protected_attrs (list): Names of the protected attribute columns.
+        chunksize (int, optional): Rows parsed per chunk.
+
+    Returns:
+        pd.Series: Row counts indexed by (protected attrs..., label).
+    """
+    columns = list(protected_attrs) + [label]
+    # A plain Counter is used to merge chunks: a column can be parsed as int in
+    # one chunk and float in another, and 1 == 1.0 in a dict but not always
+    # when aligning pandas indexes.
+    totals = Counter()
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        for key, count in group_counts(chunk, label, protected_attrs).items():
+            totals[key] += count
+
+    index = pd.MultiIndex.from_tuples(list(totals.keys()), names=columns)
+    return pd.Series(list(totals.values()), index=index, dtype=np.int64)
+
+
+def metrics_from_counts(counts, label, protected_attr, favorable_class, privileged_value):
+    """
+    Computes mean difference and disparate impact from group counts.
+
+    Rows whose protected attribute equals privileged_value form the privileged
+    group and all other rows the unprivileged group, the same binarization
+    StandardDataset applies in check_bias.
+
+    Args:
+        counts (pd.Series): Output of group_counts or stream_group_counts.
+        label (str): Name of the label column.
+        protected_attr (str): Protected attribute to compare groups on.
+        favorable_class: Label value considered favorable.
+        privileged_value: Protected attribute value of the privileged group.
+
+    Returns:
+        dict: The 'mean_difference' and 'disparate_impact' metrics; disparate
+              impact is None when no privileged row is favorable.
+
+    Raises:
+        EmptyGroupError: If either group has no rows.
+    """
+    n = counts.to_numpy(dtype=np.float64)
+    labels = counts.index.get_level_values(label)
+    attrs = counts.index.get_level_values(protected_attr)
+    favorable = labels.isin([as_column_type(labels, favorable_class)])
+    privileged = attrs.isin([as_column_type(attrs, privileged_value)])
+
+    if not n[privileged].sum():
+        raise EmptyGroupError(f'No rows have {protected_attr} = {privileged_value}')
+    if not n[~privileged].sum():
+        raise EmptyGroupError(f'Every row has {protected_attr} = {privileged_value}, the unprivileged group is empty')
+    privileged_rate = np.float64(n[privileged & favorable].sum()) / n[privileged].sum()
+    unprivileged_rate = np.float64(n[~privileged & favorable].sum()) / n[~privileged].sum()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        disparate_impact = unprivileged_rate / privileged_rate
+    return {
+        'mean_difference': float(unprivileged_rate - privileged_rate),
+        'disparate_impact': _finite_or_none(disparate_impact)
+    }
+
+
+def check_bias_streaming(source, label, protected_attr, favorable_class, privileged_value,
+                         chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Bounded-memory version of check_bias for large CSV uploads.
+
+    Args:
+        source: Path or file-like object with CSV data.
+        label (str): Name of the label column.
+        protected_attr (str): Protected attribute column.
+        favorable_class: Label value considered favorable.
+        privileged_value: Protected attribute value of the privileged group.
+        chunksize (int, optional): Rows parsed per chunk.
+
+    Returns:
+        dict: The 'mean_difference' and 'disparate_impact' metrics.
+    """
+    counts = stream_group_counts(source, label, [protected_attr], chunksize=chunksize)
+    return metrics_from_counts(counts, label, protected_attr, favorable_class, privileged_value)
+
+
+def bias_report_from_counts(counts, label, protected_attrs, favorable_class, privileged_values):
+    """
+    Computes group metrics for several protected attributes from one table of joint counts.
+
+    Args:
+        counts (pd.Series): Output of group_counts over all protected_attrs.
+        label (str): Name of the label column.
+        protected_attrs (list): Protected attributes to report on.
+        favorable_class: Label value considered favorable.
+        privileged_values (dict): Privileged value for each protected attribute.
+
+    Returns:
+        dict: Per attribute, the mean difference, disparate impact, statistical
+              parity difference and the base rate of every group.
+
+    Raises:
+        EmptyGroupError: If either group of an attribute has no rows.
+    """
+    labels = counts.index.get_level_values(label)
+    favorable = labels.isin([as_column_type(labels, favorable_class)])
+    favorable_counts = counts.where(favorable, 0)
+
+    report = {}
+    for attr in protected_attrs:
+        # The joint table is tiny next to the data, marginalizing it is cheap
+        totals = counts.groupby(level=attr, sort=False).sum()
+        favorable_totals = favorable_counts.groupby(level=attr, sort=False).sum()
+        base_rates = favorable_totals / totals
+
+        metrics = metrics_from_counts(counts, label, attr, favorable_class, privileged_values[attr])
+        report[attr] = {
+            'mean_difference': metrics['mean_difference'],
+            'disparate_impact': metrics['disparate_impact'],
+            # aif360 defines statistical parity difference as the mean difference
+            'statistical_parity_difference': metrics['mean_difference'],
+            'base_rates': {str(value): float(rate) for value, rate in base_rates.items()},
+            'group_sizes': {str(value): int(total) for value, total in totals.items()}
+        }
+    return report
+
+
+def compute_bias_metrics(data, label, protected_attrs, favorable_class, privileged_values):
+    """
+    Computes bias metrics for all requested protected attributes in a single groupby pass.
+
+    Replaces building one StandardDataset and BinaryLabelDatasetMetric per
+    attribute: the rows are grouped once on all attributes plus the label, and
+    every metric is derived from those counts.
+
+    Args:
+        data (pd.DataFrame): The dataset.
+        label (str): Name of the label column.
+        protected_attrs (list): Protected attributes to report on.
+        favorable_class: Label value considered favorable.
+        privileged_values (dict): Privileged value for each protected attribute.
+
+    Returns:
+        dict: See bias_report_from_counts.
+    """
+    counts = group_counts(data, label, protected_attrs)
+    return bias_report_from_counts(counts, label, protected_attrs, favorable_class, privileged_values)
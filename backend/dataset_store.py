@@ -0,0 +1,366 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+DATASETS_DIR = os.environ.get('AICADEMIA_DATASETS_DIR',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets'))
+# Uploads still arriving, one spool file and one metadata file per upload
+INCOMING_DIR = os.path.join(DATASETS_DIR, 'incoming')
+# Seconds an upload can go without a chunk before its spool file is removed
+ABANDONED_UPLOAD_TTL = int(os.environ.get('AICADEMIA_UPLOAD_TTL', 24 * 3600))
+# Bytes of CSV converted per Arrow record batch
+CONVERT_BLOCK_SIZE = 16 << 20
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+_DATASET_ID = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    pass
+
+
+class InvalidDatasetError(ValueError):
+    """An upload is not a CSV file that can be read."""
+
+
+class OffsetMismatchError(UploadError):
+    """A chunk was sent for an offset other than the end of what the server has."""
+
+    def __init__(self, expected):
+        super().__init__(f'Upload continues at offset {expected}')
+        self.expected = expected
+
+
+def parse_byte_count(value):
+    """
+    Parses a size or offset sent by a client, as a JSON integer or a decimal string.
+
+    Raises:
+        ValueError: If value is not a non-negative integer.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+        raise ValueError(f'Expected a non-negative integer number of bytes, got {value!r}')
+    return int(value)
+
+
+class UploadStore:
+    """
+    Resumable chunked uploads spooled to disk.
+
+    The spool file is the source of truth for progress: a client that lost
+    its connection asks for the current offset and sends the rest from
+    there. Chunks are hashed as they are appended, so finishing an upload
+    does not have to read it again, unless its chunks were spread over
+    several processes or the server restarted in between. Uploads that
+    received no chunk for abandoned_ttl seconds are removed when the next
+    one is created.
+
+    Args:
+        path (str, optional): Directory of the spool files.
+        abandoned_ttl (float, optional): Seconds an unfinished upload is kept after its last chunk.
+    """
+
+    def __init__(self, path=INCOMING_DIR, abandoned_ttl=ABANDONED_UPLOAD_TTL):
+        self.path = path
+        self.abandoned_ttl = abandoned_ttl
+        self._hashers = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _spool(self, upload_id):
+        if not _UPLOAD_ID.match(upload_id):
+            raise KeyError(upload_id)
+        return os.path.join(self.path, f'{upload_id}.part')
+
+    def _meta(self, upload_id):
+        return os.path.join(self.path, f'{upload_id}.json')
+
+    def _upload_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _prune(self):
+        """Removes uploads whose last chunk arrived more than abandoned_ttl seconds ago."""
+        cutoff = time.time() - self.abandoned_ttl
+        for name in os.listdir(self.path):
+            upload_id, extension = os.path.splitext(name)
+            if extension != '.json' or not _UPLOAD_ID.match(upload_id):
+                continue
+            lock = self._upload_lock(upload_id)
+            # An upload busy appending a chunk is not abandoned
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                spool = self._spool(upload_id)
+                last_write = os.path.getmtime(spool if os.path.exists(spool) else self._meta(upload_id))
+                if last_write < cutoff:
+                    self.discard(upload_id)
+            except FileNotFoundError:
+                # Finished or removed by another process meanwhile
+                pass
+            finally:
+                lock.release()
+
+    def create(self, filename, size=None):
+        """
+        Starts an upload and returns its id.
+
+        Raises:
+            ValueError: If size is given but not a number of bytes.
+        """
+        if size is not None:
+            size = parse_byte_count(size)
+        os.makedirs(self.path, exist_ok=True)
+        self._prune()
+        upload_id = uuid.uuid4().hex
+        with open(self._meta(upload_id), 'w') as f:
+            json.dump({'filename': filename, 'size': size, 'created_at': time.time()}, f)
+        open(self._spool(upload_id), 'wb').close()
+        self._hashers[upload_id] = (hashlib.sha256(), 0)
+        return upload_id
+
+    def status(self, upload_id):
+        """
+        Returns:
+            dict: File name, expected size if known, and the offset the next chunk must start at.
+
+        Raises:
+            KeyError: If the upload does not exist.
+        """
+        spool = self._spool(upload_id)
+        if not os.path.exists(spool):
+            raise KeyError(upload_id)
+        with open(self._meta(upload_id)) as f:
+            meta = json.load(f)
+        return dict(meta, upload_id=upload_id, offset=os.path.getsize(spool))
+
+    def append(self, upload_id, offset, stream, block_size=1 << 20):
+        """
+        Appends the chunk read from stream at offset.
+
+        Returns:
+            int: The new offset.
+
+        Raises:
+            KeyError: If the upload does not exist.
+            OffsetMismatchError: If offset is not where the upload currently ends.
+        """
+        spool = self._spool(upload_id)
+        if not os.path.exists(spool):
+            raise KeyError(upload_id)
+        with self._upload_lock(upload_id):
+            current = os.path.getsize(spool)
+            if offset != current:
+                raise OffsetMismatchError(current)
+            hasher, hashed = self._hashers.get(upload_id, (None, None))
+            if hashed != current:
+                # Earlier chunks went to another process, hash from disk at the end instead
+                hasher = None
+            with open(spool, 'ab') as f:
+                for block in iter(lambda: stream.read(block_size), b''):
+                    f.write(block)
+                    if hasher is not None:
+                        hasher.update(block)
+                new_offset = f.tell()
+            if hasher is not None:
+                self._hashers[upload_id] = (hasher, new_offset)
+            else:
+                self._hashers.pop(upload_id, None)
+            return new_offset
+
+    def finish(self, upload_id):
+        """
+        Closes an upload.
+
+        Returns:
+            tuple: (path of the spooled file, hex SHA-256 of its contents, upload metadata).
+        """
+        status = self.status(upload_id)
+        if status['size'] is not None and status['offset'] != status['size']:
+            raise UploadError(f"Upload has {status['offset']} of {status['size']} bytes")
+        spool = self._spool(upload_id)
+        hasher, hashed = self._hashers.pop(upload_id, (None, None))
+        if hasher is None or hashed != status['offset']:
+            hasher = hashlib.sha256()
+            with open(spool, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    hasher.update(block)
+        return spool, hasher.hexdigest(), status
+
+    def discard(self, upload_id):
+        for path in (self._spool(upload_id), self._meta(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+
+
+def csv_to_parquet(csv_path, parquet_path, block_size=CONVERT_BLOCK_SIZE):
+    """
+    Converts a CSV file to Parquet one record batch at a time, so memory stays bounded by block_size.
+
+    Column types are inferred from the first block. If a later block does not
+    fit them (say, a column of integers that turns into text), the file is
+    converted again in one piece with types inferred from all of it.
+
+    Returns:
+        int: Number of rows written.
+
+    Raises:
+        InvalidDatasetError: If the file cannot be parsed as CSV.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    # Timestamps stay text, as pandas.read_csv leaves them
+    convert_options = pa_csv.ConvertOptions(timestamp_parsers=[])
+    tmp_path = f'{parquet_path}.{uuid.uuid4().hex}.tmp'
+    try:
+        rows = 0
+        reader = pa_csv.open_csv(csv_path, read_options=pa_csv.ReadOptions(block_size=block_size),
+                                 convert_options=convert_options)
+        with pq.ParquetWriter(tmp_path, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    except pa.ArrowInvalid:
+        try:
+            table = pa_csv.read_csv(csv_path, convert_options=convert_options)
+        except pa.ArrowInvalid as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise InvalidDatasetError(f'Not a readable CSV file: {e}') from e
+        pq.write_table(table, tmp_path)
+        rows = table.num_rows
+    os.replace(tmp_path, parquet_path)
+    return rows
+
+
+class DatasetRegistry:
+    """
+    Uploaded datasets stored once as Parquet and identified by the SHA-256 of the uploaded CSV.
+
+    Registering the same file again returns the existing dataset without
+    converting it. Conversions of different datasets run concurrently;
+    registering one dataset twice at once converts it once. Readers load
+    only the columns they ask for, from a memory-mapped file.
+
+    Args:
+        path (str, optional): Directory holding one subdirectory per dataset.
+    """
+
+    def __init__(self, path=DATASETS_DIR):
+        self.path = path
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _dataset_lock(self, dataset_id):
+        with self._lock:
+            return self._locks.setdefault(dataset_id, threading.Lock())
+
+    def _dir(self, dataset_id):
+        if not _DATASET_ID.match(dataset_id):
+            raise KeyError(dataset_id)
+        return os.path.join(self.path, dataset_id)
+
+    def parquet_path(self, dataset_id):
+        """
+        Raises:
+            KeyError: If no such dataset is registered.
+        """
+        path = os.path.join(self._dir(dataset_id), 'data.parquet')
+        if not os.path.exists(path):
+            raise KeyError(dataset_id)
+        return path
+
+    def info(self, dataset_id):
+        with open(os.path.join(self._dir(dataset_id), 'meta.json')) as f:
+            return json.load(f)
+
+    def register_csv(self, csv_path, dataset_id, filename=None):
+        """
+        Converts a CSV file to Parquet under dataset_id, unless that dataset already exists.
+
+        Returns:
+            dict: Dataset metadata: id, file name, rows, columns and size.
+        """
+        dataset_dir = self._dir(dataset_id)
+        meta_path = os.path.join(dataset_dir, 'meta.json')
+        with self._dataset_lock(dataset_id):
+            if os.path.exists(meta_path):
+                return self.info(dataset_id)
+            os.makedirs(dataset_dir, exist_ok=True)
+            parquet_path = os.path.join(dataset_dir, 'data.parquet')
+            try:
+                rows = csv_to_parquet(csv_path, parquet_path)
+            except InvalidDatasetError:
+                os.rmdir(dataset_dir)
+                raise
+
+            import pyarrow.parquet as pq
+            schema = pq.read_schema(parquet_path)
+            meta = {
+                'dataset_id': dataset_id,
+                'filename': filename,
+                'rows': rows,
+                'columns': {field.name: str(field.type) for field in schema},
+                'csv_bytes': os.path.getsize(csv_path),
+                'parquet_bytes': os.path.getsize(parquet_path),
+                'created_at': time.time()
+            }
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+            return meta
+
+    def load(self, dataset_id, columns=None):
+        """
+        Reads a dataset, or only some of its columns, into a DataFrame.
+
+        Raises:
+            KeyError: If no such dataset is registered.
+        """
+        import pandas as pd
+        return pd.read_parquet(self.parquet_path(dataset_id), columns=columns, memory_map=True)
+
+
+upload_store = UploadStore()
+dataset_registry = DatasetRegistry()
+
+
+def register_upload(stream, filename=None):
+    """
+    Spools a single-request upload to disk while hashing it, then registers it as a dataset.
+
+    Returns:
+        dict: Dataset metadata, see DatasetRegistry.register_csv.
+    """
+    upload_id = upload_store.create(filename)
+    try:
+        upload_store.append(upload_id, 0, stream)
+        return finish_upload(upload_id)
+    except Exception:
+        upload_store.discard(upload_id)
+        raise
+
+
+def finish_upload(upload_id):
+    """
+    Registers a completed chunked upload as a dataset and removes its spool file.
+
+    Raises:
+        InvalidDatasetError: If the upload is not a readable CSV file; it is discarded.
+    """
+    spool, digest, status = upload_store.finish(upload_id)
+    try:
+        meta = dataset_registry.register_csv(spool, digest, status['filename'])
+    except InvalidDatasetError:
+        upload_store.discard(upload_id)
+        raise
+    upload_store.discard(upload_id)
+    return meta
@@ -0,0 +1,203 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bias_metrics import as_column_type
+
+DEFAULT_THRESHOLDS = np.round(np.linspace(0.05, 0.95, 19), 2)
+DEFAULT_FOLDS = 5
+
+
+def parse_folds(value):
+    """
+    Parses a number of cross-validation folds sent as a form field.
+
+    Raises:
+        ValueError: If value is not an integer of at least 2.
+    """
+    if not str(value).strip().isdigit() or int(value) < 2:
+        raise ValueError(f'Expected an integer of at least 2, got {value!r}')
+    return int(value)
+
+
+def parse_thresholds(value):
+    """
+    Parses comma separated decision thresholds sent as a form field; None (the default grid) if empty.
+
+    Raises:
+        ValueError: If a threshold is not a number between 0 and 1.
+    """
+    if not value:
+        return None
+    thresholds = []
+    for part in value.split(','):
+        try:
+            threshold = float(part)
+        except ValueError:
+            threshold = np.nan
+        if not 0 <= threshold <= 1:
+            raise ValueError(f'Expected numbers between 0 and 1, got {part.strip()!r}')
+        thresholds.append(threshold)
+    return thresholds
+
+
+def prepare(data, label, protected_attr, favorable_class, privileged_value):
+    """
+    Turns a DataFrame into model inputs the way StandardDataset would.
+
+    Rows with missing values are dropped and categorical columns one-hot
+    encoded. Form values arrive as strings, so favorable_class and
+    privileged_value are converted to the type of their column first.
+
+    Returns:
+        tuple: (features, binary labels, privileged-group mask) as numpy arrays.
+    """
+    data = data.dropna()
+    favorable_class = as_column_type(data[label], favorable_class)
+    privileged_value = as_column_type(data[protected_attr], privileged_value)
+
+    y = (data[label] == favorable_class).to_numpy(dtype=np.int8)
+    privileged = (data[protected_attr] == privileged_value).to_numpy()
+    features = pd.get_dummies(data.drop(columns=[label]), dtype=np.float64)
+    return features.to_numpy(dtype=np.float64), y, privileged
+
+
+def _fit_fold(X, y, train, test):
+    from sklearn.linear_model import LogisticRegression
+    model = LogisticRegression(solver='liblinear')
+    model.fit(X[train], y[train])
+    return test, model.predict_proba(X[test])[:, 1]
+
+
+def fold_probabilities(X, y, n_folds=DEFAULT_FOLDS, workers=None, seed=0):
+    """
+    Out-of-fold probabilities of the favorable label from the same model train_model fits.
+
+    Folds are fitted in parallel, one per process, and every row is scored
+    once by the model that did not see it.
+
+    Returns:
+        tuple: (probabilities, fold number of every row).
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    folds = list(StratifiedKFold(n_folds, shuffle=True, random_state=seed).split(X, y))
+    probabilities = np.empty(len(y))
+    fold_of = np.empty(len(y), dtype=np.int32)
+    workers = min(workers or os.cpu_count(), n_folds)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_fit_fold, X, y, train, test) for train, test in folds]
+        for fold, future in enumerate(futures):
+            test, scores = future.result()
+            probabilities[test] = scores
+            fold_of[test] = fold
+    return probabilities, fold_of
+
+
+def group_confusion(probabilities, y, privileged, thresholds):
+    """
+    Confusion matrices of the privileged and unprivileged groups at every threshold at once.
+
+    Each (group, label) cell's probabilities are sorted once; the number of
+    them at or above each threshold is then a binary search, so all
+    thresholds cost O(n log n + T log n) instead of one pass per threshold.
+
+    Returns:
+        dict: 'tp', 'fp', 'tn', 'fn', each an array of shape (2, len(thresholds));
+              row 0 is the unprivileged group, row 1 the privileged one.
+    """
+    thresholds = np.asarray(thresholds)
+    counts = {name: np.zeros((2, len(thresholds)), dtype=np.int64) for name in ('tp', 'fp', 'tn', 'fn')}
+    for group in (0, 1):
+        in_group = privileged == bool(group)
+        for positive, above, below in ((1, 'tp', 'fn'), (0, 'fp', 'tn')):
+            scores = np.sort(probabilities[in_group & (y == positive)])
+            predicted_positive = len(scores) - np.searchsorted(scores, thresholds, side='left')
+            counts[above][group] = predicted_positive
+            counts[below][group] = len(scores) - predicted_positive
+    return counts
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def tradeoff_metrics(counts):
+    """
+    Accuracy and group fairness metrics per threshold, from group_confusion output.
+
+    Definitions follow aif360's ClassificationMetric, with unprivileged minus
+    (or over) privileged.
+    """
+    tp, fp, tn, fn = counts['tp'], counts['fp'], counts['tn'], counts['fn']
+    n = tp + fp + tn + fn
+    selection_rate = _ratio(tp + fp, n)
+    tpr = _ratio(tp, tp + fn)
+    fpr = _ratio(fp, fp + tn)
+    return {
+        'accuracy': _ratio((tp + tn).sum(axis=0), n.sum(axis=0)),
+        'disparate_impact': _ratio(selection_rate[0], selection_rate[1]),
+        'statistical_parity_difference': selection_rate[0] - selection_rate[1],
+        'equal_opportunity_difference': tpr[0] - tpr[1],
+        'average_odds_difference': ((fpr[0] - fpr[1]) + (tpr[0] - tpr[1])) / 2,
+        'selection_rate_unprivileged': selection_rate[0],
+        'selection_rate_privileged': selection_rate[1],
+    }
+
+
+def _json_values(values):
+    # JSON has no NaN; an undefined metric (an empty group) becomes null
+    return [None if not np.isfinite(value) else float(value) for value in values]
+
+
+def threshold_sweep(data, label, protected_attr, favorable_class, privileged_value, thresholds=None,
+                    n_folds=DEFAULT_FOLDS, workers=None):
+    """
+    Accuracy versus fairness of train_model's logistic regression across decision thresholds.
+
+    Probabilities are taken once per row from cross-validation folds fitted
+    in parallel; every threshold is then evaluated from the same
+    probabilities. Metrics are computed per fold and reported as mean and
+    standard deviation across folds.
+
+    Args:
+        data (pd.DataFrame): The dataset.
+        label (str): Name of the label column.
+        protected_attr (str): Protected attribute column.
+        favorable_class: Label value considered favorable.
+        privileged_value: Protected attribute value of the privileged group.
+        thresholds (list, optional): Decision thresholds on the favorable probability.
+        n_folds (int, optional): Cross-validation folds.
+        workers (int, optional): Processes fitting folds; the CPU count by default.
+
+    Returns:
+        dict: The thresholds, and per metric the per-threshold mean and std across folds.
+    """
+    thresholds = np.asarray(DEFAULT_THRESHOLDS if thresholds is None else thresholds, dtype=np.float64)
+    X, y, privileged = prepare(data, label, protected_attr, favorable_class, privileged_value)
+    probabilities, fold_of = fold_probabilities(X, y, n_folds, workers)
+
+    per_fold = [
+        tradeoff_metrics(group_confusion(probabilities[fold_of == fold], y[fold_of == fold],
+                                         privileged[fold_of == fold], thresholds))
+        for fold in range(n_folds)
+    ]
+    curve = {}
+    for metric in per_fold[0]:
+        values = np.stack([fold[metric] for fold in per_fold])
+        with warnings.catch_warnings():
+            # All-NaN columns (a group empty in every fold) stay NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            curve[metric] = {'mean': _json_values(np.nanmean(values, axis=0)),
+                             'std': _json_values(np.nanstd(values, axis=0))}
+    return {
+        'thresholds': thresholds.tolist(),
+        'folds': n_folds,
+        'rows': int(len(y)),
+        'privileged_rows': int(privileged.sum()),
+        'metrics': curve
+    }
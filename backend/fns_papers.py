@@ -1,79 +1,262 @@
+import os
 import urllib.parse
+import email.utils
+from datetime import datetime, timezone
 import aiohttp
 import xml.etree.ElementTree as ET
 import logging
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+import paper_db
+from metrics import aiohttp_trace_config
+from atom_stream import AtomStream
+from near_dup import NearDuplicateDetector
+from paper_queries import PAPER_INDEXES
 
 logging.basicConfig(level=logging.INFO)
 
-# MongoDB setup
-MONGODB_URI = "mongodb://localhost:27017"
-DATABASE_NAME = "research_papers_db"
+# arXiv API settings. The base URL can point at a local stub server for testing.
+ARXIV_API_URL = os.environ.get('ARXIV_API_URL', 'http://export.arxiv.org/api/query')
+PAGE_SIZE = 100
+MAX_PAGES = 50
+MAX_CONCURRENCY = 3
+# arXiv asks API clients to wait 3 seconds between requests
+MIN_REQUEST_INTERVAL = 3.0
+MAX_RETRIES = 3
+# Papers per Mongo bulk write while a page is still streaming in
+BULK_WRITE_SIZE = 50
 
-client = AsyncIOMotorClient(MONGODB_URI)
-db = client[DATABASE_NAME]
+# Collection holding the newest published date harvested per paper collection
+STATE_COLLECTION = "harvest_state"
 
-async def fetch_papers(search_query, collection_name):
+
+def retry_after_seconds(value, default):
     """
-    Fetches paper details from arXiv based on a search query and stores them in MongoDB.
+    Seconds to wait before retrying, from a Retry-After header in either of its forms.
 
     Args:
-        search_query (str): The search query string.
-        collection_name (str): The MongoDB collection name to store the papers.
+        value (str): Header value, delay seconds or an HTTP date. None if the header was absent.
+        default (float): Delay used when the header is absent or unreadable.
     """
+    if value is None:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        # A '-0000' zone: UTC, by RFC 5322
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
 
-    encoded_query = urllib.parse.quote(search_query)
-    base_url = 'http://export.arxiv.org/api/query?search_query=all:'
-    start_index = 0
-    max_results = 500
 
-    url = f'{base_url}{encoded_query}&start={start_index}&max_results={max_results}'
-    logging.info(f'Fetching URL: {url}')
+class RateLimiter:
+    """
+    Spaces request starts at least min_interval seconds apart, across all tasks sharing it.
+    """
 
-    try:
-        async with aiohttp.ClientSession() as aio_session:
-            async with aio_session.get(url, timeout=30) as response:
-                if response.status != 200:
-                    logging.error(f'Error fetching data: HTTP {response.status}')
-                    return
-
-                data = await response.text()
-                logging.debug(f'Response data: {data}')
-
-                try:
-                    root = ET.fromstring(data)
-                    entries = root.findall('{http://www.w3.org/2005/Atom}entry')
-
-                    papers = []
-
-                    for entry in entries:
-                        paper_title = entry.find('{http://www.w3.org/2005/Atom}title').text
-                        paper_summary = entry.find('{http://www.w3.org/2005/Atom}summary').text.strip()
-                        authors = [author.find('{http://www.w3.org/2005/Atom}name').text for author in entry.findall('{http://www.w3.org/2005/Atom}author')]
-                        pdf_link_element = entry.find('{http://www.w3.org/2005/Atom}link[@type="application/pdf"]')
-                        paper_link = pdf_link_element.attrib.get('href') if pdf_link_element is not None else None
-
-                        paper_details = {
-                            "title": paper_title,
-                            "summary": paper_summary,
-                            "authors": authors,
-                            "link": paper_link
-                        }
-
-                        papers.append(paper_details)
-
-                    if papers:
-                        await db[collection_name].insert_many(papers)
-                        logging.info(f'Successfully fetched and stored {len(papers)} papers for query: {search_query}')
-
-                except ET.ParseError as e:
-                    logging.error("Error parsing XML data", exc_info=True)
-                    logging.error(f'Parsing error: {e}')
-                except Exception as e:
-                    logging.error("Error processing data", exc_info=True)
-                    logging.error(f'Processing error: {e}')
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_start - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start = loop.time() + self.min_interval
+
+
+class ArxivHarvester:
+    """
+    Pages through arXiv search results over one pooled session and upserts them into MongoDB.
+
+    Results are requested newest first. Each collection keeps a watermark (the
+    newest published date stored), so later runs stop paging as soon as they
+    reach papers they already have.
+
+    Args:
+        database: Motor database the papers are written to; the shared paper database by default.
+        base_url (str, optional): arXiv API query endpoint.
+        page_size (int, optional): Entries requested per page.
+        max_pages (int, optional): Upper bound on pages fetched per query.
+        concurrency (int, optional): Pages fetched at the same time.
+        min_interval (float, optional): Seconds between request starts.
+        sink (coroutine function, optional): Awaited with (collection_name, papers) after
+                                             every bulk write, to pass papers on downstream.
+        dedup (bool, optional): Mark near-duplicates of papers already ingested, in this or
+                                another collection, with 'duplicate_of' as they are stored.
+    """
+
+    def __init__(self, database=None, base_url=ARXIV_API_URL, page_size=PAGE_SIZE, max_pages=MAX_PAGES,
+                 concurrency=MAX_CONCURRENCY, min_interval=MIN_REQUEST_INTERVAL, sink=None, dedup=True):
+        self.db = database if database is not None else paper_db.get_async_db()
+        self.base_url = base_url
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(min_interval)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._indexed = set()
+        self.sink = sink
+        self.dedup = NearDuplicateDetector(self.db) if dedup else None
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30),
+                                             trace_configs=[aiohttp_trace_config('arxiv')])
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def page_url(self, search_query, start):
+        params = {
+            'search_query': f'all:{search_query}',
+            'start': start,
+            'max_results': self.page_size,
+            'sortBy': 'submittedDate',
+            'sortOrder': 'descending'
+        }
+        return f'{self.base_url}?{urllib.parse.urlencode(params)}'
 
+    async def fetch_page(self, search_query, start, collection_name, watermark=None):
+        """
+        Streams one page of results, upserting papers newer than watermark in batches as they arrive.
+
+        Returns:
+            dict: Total results reported by arXiv, entries seen, new entries,
+                  documents written and the newest published date among them.
+        """
+        url = self.page_url(search_query, start)
+        for attempt in range(MAX_RETRIES + 1):
+            async with self._semaphore:
+                await self.rate_limiter.wait()
+                logging.info(f'Fetching URL: {url}')
+                async with self.session.get(url) as response:
+                    if response.status == 200:
+                        return await self.consume_page(response, collection_name, watermark)
+                    if response.status not in (429, 503) or attempt == MAX_RETRIES:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status,
+                            message=f'HTTP {response.status} fetching {url}'
+                        )
+                    retry_after = retry_after_seconds(response.headers.get('Retry-After'),
+                                                      self.rate_limiter.min_interval * 2 ** attempt)
+            logging.warning(f'arXiv throttled {url}, retrying in {retry_after:.1f}s')
+            await asyncio.sleep(retry_after)
+
+    async def consume_page(self, response, collection_name, watermark):
+        stream = AtomStream(response)
+        page = {'seen': 0, 'fresh': 0, 'stored': 0, 'newest': None}
+        batch = []
+        async for paper in stream:
+            page['seen'] += 1
+            published = paper['published'] or ''
+            if watermark is not None and published <= watermark:
+                continue
+            page['fresh'] += 1
+            if published and (page['newest'] is None or published > page['newest']):
+                page['newest'] = published
+            batch.append(paper)
+            if len(batch) >= BULK_WRITE_SIZE:
+                page['stored'] += await self.store(batch, collection_name)
+                batch = []
+        page['stored'] += await self.store(batch, collection_name)
+        page['total'] = stream.total_results or 0
+        return page
+
+    async def get_watermark(self, collection_name):
+        state = await self.db[STATE_COLLECTION].find_one({'_id': collection_name})
+        return state.get('watermark') if state else None
+
+    async def set_watermark(self, collection_name, watermark):
+        await self.db[STATE_COLLECTION].update_one(
+            {'_id': collection_name}, {'$max': {'watermark': watermark}}, upsert=True
+        )
+
+    async def store(self, papers, collection_name):
+        """
+        Upserts papers by arXiv id so re-harvesting never duplicates documents.
+
+        Papers that repeat one already ingested under another id or in another
+        collection are stored too, linked to it by 'duplicate_of'.
+        """
+        if not papers:
+            return 0
+        if self.dedup is not None:
+            await self.dedup.mark(collection_name, papers)
+        # Stamped by the server, so trend counts can pick up papers written since they last ran
+        operations = [UpdateOne({'arxiv_id': paper['arxiv_id']}, {'$set': paper, '$currentDate': {'harvested_at': True}},
+                                upsert=True) for paper in papers]
+        result = await self.db[collection_name].bulk_write(operations, ordered=False)
+        if self.sink is not None:
+            await self.sink(collection_name, papers)
+        return result.upserted_count + result.modified_count
+
+    async def harvest(self, search_query, collection_name):
+        """
+        Pulls every paper for search_query newer than the collection's watermark.
+
+        Returns:
+            int: Number of papers inserted or updated.
+        """
+        if collection_name not in self._indexed:
+            # The arXiv id upserts would otherwise scan the collection for every paper
+            await self.db[collection_name].create_indexes(PAPER_INDEXES)
+            self._indexed.add(collection_name)
+        watermark = await self.get_watermark(collection_name)
+
+        first = await self.fetch_page(search_query, 0, collection_name, watermark)
+        stored, newest = first['stored'], first['newest']
+
+        # Pages after the first are fetched a batch at a time, and paging stops
+        # at the first page that reaches already harvested papers.
+        last_start = min(first['total'], self.page_size * self.max_pages)
+        starts = list(range(self.page_size, last_start, self.page_size))
+        reached_watermark = first['fresh'] < first['seen']
+        while starts and not reached_watermark:
+            batch, starts = starts[:self.concurrency], starts[self.concurrency:]
+            pages = await asyncio.gather(*(
+                self.fetch_page(search_query, start, collection_name, watermark) for start in batch
+            ))
+            for page in pages:
+                stored += page['stored']
+                if page['newest'] and (newest is None or page['newest'] > newest):
+                    newest = page['newest']
+                reached_watermark = reached_watermark or page['fresh'] < page['seen'] or not page['seen']
+
+        if newest:
+            await self.set_watermark(collection_name, newest)
+        logging.info(f'Successfully fetched and stored {stored} papers for query: {search_query}')
+        return stored
+
+
+async def fetch_papers(search_query, collection_name, harvester=None):
+    """
+    Fetches paper details from arXiv based on a search query and stores them in MongoDB.
+
+    Args:
+        search_query (str): The search query string.
+        collection_name (str): The MongoDB collection name to store the papers.
+        harvester (ArxivHarvester, optional): Open harvester to share its session and rate limit.
+                                              A new one is opened if not given.
+    """
+    try:
+        if harvester is None:
+            async with ArxivHarvester() as own_harvester:
+                return await own_harvester.harvest(search_query, collection_name)
+        return await harvester.harvest(search_query, collection_name)
+    except ET.ParseError as e:
+        logging.error("Error parsing XML data", exc_info=True)
+        logging.error(f'Parsing error: {e}')
     except aiohttp.ClientError as e:
         logging.error("Error fetching data", exc_info=True)
         logging.error(f'Client error: {e}')
@@ -83,22 +266,23 @@ async def fetch_papers(search_query, collection_name):
 
 
 # Agent functions to fetch papers for each domain
-async def eng_papers():
+async def eng_papers(harvester=None):
     search_query = "engineering AI"
-    await fetch_papers(search_query, "engineering_papers")
+    await fetch_papers(search_query, "engineering_papers", harvester)
 
-async def eth_papers():
+async def eth_papers(harvester=None):
     search_query = "ethics AI"
-    await fetch_papers(search_query, "ethics_papers")
+    await fetch_papers(search_query, "ethics_papers", harvester)
 
-async def pol_papers():
+async def pol_papers(harvester=None):
     search_query = "policy AI"
-    await fetch_papers(search_query, "policy_papers")
+    await fetch_papers(search_query, "policy_papers", harvester)
 
-# Main function to run the tasks concurrently
+# Main function to run the tasks concurrently over one shared session
 async def main():
-    tasks = [eng_papers(), eth_papers(), pol_papers()]
-    await asyncio.gather(*tasks)
+    async with ArxivHarvester() as harvester:
+        tasks = [eng_papers(harvester), eth_papers(harvester), pol_papers(harvester)]
+        await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+JOBS_DIR = os.environ.get('AICADEMIA_JOBS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs'))
+UPLOADS_DIR = os.path.join(JOBS_DIR, 'uploads')
+ARTIFACTS_DIR = os.path.join(JOBS_DIR, 'artifacts')
+
+# Mitigation trains a TensorFlow model, so only a couple of them run at once
+# and the queue behind them is bounded too.
+MAX_WORKERS = int(os.environ.get('AICADEMIA_JOB_WORKERS', 2))
+MAX_PENDING = int(os.environ.get('AICADEMIA_JOB_MAX_PENDING', 16))
+# Seconds a finished job can still be polled; its artifacts stay on disk and are reused
+FINISHED_JOB_TTL = int(os.environ.get('AICADEMIA_JOB_TTL', 3600))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def artifact_key(dataset_digest, label, protected_attr):
+    """Key under which the artifacts of one (dataset, parameters) run are stored."""
+    params = json.dumps([dataset_digest, label, protected_attr])
+    return hashlib.sha256(params.encode('utf-8')).hexdigest()
+
+
+def run_mitigation_job(job_id, file_path, dataset_digest, label, protected_attr, progress):
+    """
+    Runs Reweighing plus AdversarialDebiasing in a worker process and persists the artifacts.
+
+    If a previous run with the same dataset and parameters left a result
+    behind, it is returned without training anything. Reweighed instance
+    weights are kept as weights.npy and the trained debiasing model as a
+    TensorFlow checkpoint next to result.json.
+
+    Args:
+        job_id (str): Id used to report progress.
+        file_path (str): CSV file of the dataset.
+        dataset_digest (str): SHA-256 of the dataset contents.
+        label (str): Name of the label column.
+        protected_attr (str): Protected attribute column.
+        progress (dict): Shared dict the job writes its current stage to.
+
+    Returns:
+        dict: Metrics of the reweighed dataset and of the debiased model, and artifact paths.
+    """
+    import numpy as np
+    import models
+    from bias_metrics import _finite_or_none
+
+    def report(stage, fraction):
+        progress[job_id] = {'stage': stage, 'fraction': fraction}
+
+    artifact_dir = os.path.join(ARTIFACTS_DIR, artifact_key(dataset_digest, label, protected_attr))
+    result_path = os.path.join(artifact_dir, 'result.json')
+    if os.path.exists(result_path):
+        report('done', 1.0)
+        with open(result_path) as f:
+            result = json.load(f)
+        result['reused'] = True
+        return result
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    weights_path = os.path.join(artifact_dir, 'weights.npy')
+    model_path = os.path.join(artifact_dir, 'debias_model', 'model.ckpt')
+
+    report('loading', 0.0)
+    data, label, protected_attr = models.load_data(file_path, label, protected_attr)
+    dataset = models.create_dataset(data, label, protected_attr)
+
+    report('reweighing', 0.1)
+    if os.path.exists(weights_path):
+        dataset_transformed = dataset.copy(deepcopy=True)
+        dataset_transformed.instance_weights = np.load(weights_path)
+    else:
+        dataset_transformed = models.mitigate_bias(dataset, protected_attr)
+        np.save(weights_path, dataset_transformed.instance_weights)
+    reweighing_metrics = models.evaluate_bias(dataset_transformed, protected_attr)
+
+    report('adversarial_debiasing', 0.3)
+    # Worker processes are reused across jobs, start every model from an empty graph
+    import tensorflow.compat.v1 as tf
+    tf.reset_default_graph()
+    debias_model = models.adversarial_debiasing(dataset_transformed, label, protected_attr)
+    models.save_debias_model(debias_model, model_path)
+
+    report('evaluating', 0.9)
+    dataset_pred = debias_model.predict(dataset)
+    debiased_metrics = models.evaluate_bias(dataset_pred, protected_attr)
+    debiased_metrics['accuracy'] = float(np.mean(dataset_pred.labels.ravel() == dataset.labels.ravel()))
+
+    result = {
+        'reweighing': {name: _finite_or_none(value) for name, value in reweighing_metrics.items()},
+        'adversarial_debiasing': {name: _finite_or_none(value) for name, value in debiased_metrics.items()},
+        'artifacts': {'weights': weights_path, 'model': model_path}
+    }
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+    report('done', 1.0)
+    result['reused'] = False
+    return result
+
+
+class JobQueue:
+    """
+    Runs bias mitigation jobs on a local process pool so Flask workers never block on training.
+
+    Args:
+        max_workers (int): Jobs that run at the same time.
+        max_pending (int): Jobs allowed to be queued or running before submit is refused.
+        finished_ttl (float): Seconds finished jobs are kept for polling.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, finished_ttl=FINISHED_JOB_TTL):
+        self.max_pending = max_pending
+        self.finished_ttl = finished_ttl
+        # TensorFlow does not survive fork, start workers from a clean interpreter
+        context = multiprocessing.get_context('spawn')
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        self._manager = context.Manager()
+        self._progress = self._manager.dict()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        """Forgets jobs that finished more than finished_ttl seconds ago. Called with the lock held."""
+        cutoff = time.time() - self.finished_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.get('finished_at') is not None and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._progress.pop(job_id, None)
+
+    def submit(self, file_path, dataset_digest, label, protected_attr):
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if not job['future'].done())
+            if pending >= self.max_pending:
+                raise QueueFullError(f'{pending} mitigation jobs already pending')
+
+            job_id = uuid.uuid4().hex
+            self._progress[job_id] = {'stage': 'queued', 'fraction': 0.0}
+            future = self._executor.submit(
+                run_mitigation_job, job_id, file_path, dataset_digest, label, protected_attr, self._progress
+            )
+            job = {'future': future, 'submitted_at': time.time(), 'finished_at': None}
+            future.add_done_callback(lambda _, job=job: job.update(finished_at=time.time()))
+            self._jobs[job_id] = job
+            logging.info(f'Submitted mitigation job {job_id} for {file_path}')
+            return job_id
+
+    def status(self, job_id):
+        """
+        Reports the state of a job.
+
+        Returns:
+            dict or None: Status, progress and, once finished, the result or error.
+                          None if the job id is unknown.
+        """
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        future = job['future']
+        status = {
+            'job_id': job_id,
+            'submitted_at': job['submitted_at'],
+            'progress': dict(self._progress.get(job_id, {}))
+        }
+        if not future.done():
+            status['status'] = 'running' if future.running() else 'queued'
+        elif future.exception() is not None:
+            status['status'] = 'failed'
+            status['error'] = str(future.exception())
+        else:
+            status['status'] = 'finished'
+            status['result'] = future.result()
+        return status
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Returns the process-wide job queue, starting its worker pool on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
+
+
+def save_upload(stream, dataset_digest):
+    """
+    Stores an uploaded dataset under its content hash so workers can read it from disk.
+
+    Returns:
+        str: Path of the stored CSV file.
+    """
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    path = os.path.join(UPLOADS_DIR, f'{dataset_digest}.csv')
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            for block in iter(lambda: stream.read(1 << 20), b''):
+                f.write(block)
+        os.replace(tmp_path, path)
+    return path
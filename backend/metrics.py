@@ -0,0 +1,287 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter as CounterMetric, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from pymongo import monitoring
+
+# Requests slower than this get a stack-sample profile written to PROFILE_DIR; 0 turns profiling off
+SLOW_REQUEST_SECONDS = float(os.environ.get('AICADEMIA_SLOW_REQUEST_SECONDS', 2.0))
+PROFILE_DIR = os.environ.get('AICADEMIA_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+# Seconds between stack samples of in-flight requests
+SAMPLE_INTERVAL = 0.01
+# Profiles kept on disk, the oldest are removed first
+MAX_PROFILES = 200
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(4 ** i for i in range(4, 15))
+
+REQUEST_LATENCY = Histogram('aicademia_request_duration_seconds', 'Time to handle a request.',
+                            ['app', 'method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+REQUEST_SIZE = Histogram('aicademia_request_size_bytes', 'Request body size.',
+                         ['app', 'method', 'route'], buckets=SIZE_BUCKETS)
+RESPONSE_SIZE = Histogram('aicademia_response_size_bytes', 'Response body size, where known before streaming.',
+                          ['app', 'method', 'route', 'status'], buckets=SIZE_BUCKETS)
+IN_FLIGHT = Gauge('aicademia_requests_in_flight', 'Requests being handled.', ['app', 'route'],
+                  multiprocess_mode='livesum')
+SLOW_REQUESTS = CounterMetric('aicademia_slow_requests', 'Requests over the slow request threshold.',
+                              ['app', 'route'])
+OUTBOUND_LATENCY = Histogram('aicademia_outbound_duration_seconds',
+                             'Time of calls to arXiv and MongoDB, until the response arrived.',
+                             ['service', 'operation', 'outcome'], buckets=LATENCY_BUCKETS)
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def render():
+    """
+    Returns:
+        tuple: (body, content type) of the Prometheus text exposition of every metric.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        # Gunicorn-style workers each write their own files, merged at scrape time
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of the threads handling requests, for profiles of slow ones.
+
+    One daemon thread wakes every interval while any request is watched,
+    and waits for the next one otherwise. Each time it records the stack of
+    each watched thread as a collapsed 'outer;...;inner' line. Requests that end
+    under the threshold throw their samples away; slow ones are written out
+    in the folded format flamegraph.pl and speedscope read. Unlike cProfile,
+    requests that turn out fast pay nothing but the sampling thread's share
+    of the GIL.
+
+    An async app serves every request on its event loop thread, so its
+    samples show whatever that thread ran meanwhile, usually the CPU-bound
+    work that kept the loop from serving the request.
+
+    Args:
+        interval (float, optional): Seconds between samples.
+        path (str, optional): Directory profiles are written to.
+        max_profiles (int, optional): Profiles kept in path.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, path=PROFILE_DIR, max_profiles=MAX_PROFILES):
+        self.interval = interval
+        self.path = path
+        self.max_profiles = max_profiles
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._watching = threading.Condition(self._lock)
+        self._thread = None
+
+    def watch(self, key, thread_id):
+        with self._lock:
+            self._watched[key] = (thread_id, Counter())
+            self._watching.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def unwatch(self, key):
+        """Stops sampling for key and returns its samples, a Counter of collapsed stacks."""
+        with self._lock:
+            _, samples = self._watched.pop(key, (None, Counter()))
+        return samples
+
+    def _run(self):
+        while True:
+            with self._watching:
+                self._watching.wait_for(lambda: self._watched)
+            time.sleep(self.interval)
+            with self._lock:
+                frames = sys._current_frames()
+                for thread_id, samples in self._watched.values():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_collapse(frame)] += 1
+
+    def dump(self, samples, label, seconds):
+        """Writes samples in folded format and returns the file's path."""
+        os.makedirs(self.path, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{_UNSAFE.sub('_', label).strip('_')}-{seconds * 1000:.0f}ms.folded"
+        path = os.path.join(self.path, name)
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        profiles = sorted(os.listdir(self.path))
+        for old in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            os.remove(os.path.join(self.path, old))
+        return path
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+sampler = StackSampler()
+
+
+class RequestTimer:
+    """
+    Per-request bookkeeping shared by the Flask and Quart hooks.
+
+    Args:
+        app_name (str): Value of the 'app' label.
+        slow_seconds (float, optional): Threshold for slow request profiles; 0 disables them.
+    """
+
+    def __init__(self, app_name, slow_seconds=SLOW_REQUEST_SECONDS):
+        self.app_name = app_name
+        self.slow_seconds = slow_seconds
+
+    def start(self, method, route, request_bytes):
+        IN_FLIGHT.labels(self.app_name, route).inc()
+        if request_bytes:
+            REQUEST_SIZE.labels(self.app_name, method, route).observe(request_bytes)
+        state = {'method': method, 'route': route, 'start': time.perf_counter(), 'status': '500',
+                 'key': object()}
+        if self.slow_seconds:
+            sampler.watch(state['key'], threading.get_ident())
+        return state
+
+    def respond(self, state, status, response_bytes):
+        state['status'] = str(status)
+        if response_bytes is not None:
+            RESPONSE_SIZE.labels(self.app_name, state['method'], state['route'], state['status']).observe(response_bytes)
+
+    def finish(self, state):
+        seconds = time.perf_counter() - state['start']
+        route = state['route']
+        IN_FLIGHT.labels(self.app_name, route).dec()
+        REQUEST_LATENCY.labels(self.app_name, state['method'], route, state['status']).observe(seconds)
+        if not self.slow_seconds:
+            return
+        samples = sampler.unwatch(state['key'])
+        if seconds >= self.slow_seconds:
+            SLOW_REQUESTS.labels(self.app_name, route).inc()
+            if samples:
+                path = sampler.dump(samples, f"{self.app_name} {state['method']} {route}", seconds)
+                logging.warning(f"{state['method']} {route} took {seconds:.2f}s, profile written to {path}")
+
+
+def instrument_flask(app, app_name='backend', slow_seconds=SLOW_REQUEST_SECONDS):
+    """Times every request of a Flask app and serves the metrics on /metrics."""
+    from flask import Response, g, request
+
+    timer = RequestTimer(app_name, slow_seconds)
+
+    @app.before_request
+    def _start_timer():
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g._request_timer = timer.start(request.method, route, request.content_length)
+
+    @app.after_request
+    def _record_response(response):
+        state = g.get('_request_timer')
+        if state is not None:
+            timer.respond(state, response.status_code, None if response.is_streamed else response.content_length)
+        return response
+
+    @app.teardown_request
+    def _finish_timer(exc):
+        # Runs after errors too, so in-flight counts never leak
+        state = g.pop('_request_timer', None)
+        if state is not None:
+            timer.finish(state)
+
+    @app.route('/metrics')
+    def metrics():
+        body, content_type = render()
+        return Response(body, content_type=content_type)
+
+    return app
+
+
+def instrument_quart(app, app_name='quart', slow_seconds=SLOW_REQUEST_SECONDS):
+    """Times every request of a Quart app and serves the metrics on /metrics."""
+    from quart import Response, g, request
+
+    timer = RequestTimer(app_name, slow_seconds)
+
+    @app.before_request
+    async def _start_timer():
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g._request_timer = timer.start(request.method, route, request.content_length)
+
+    @app.after_request
+    async def _record_response(response):
+        state = g.get('_request_timer')
+        if state is not None:
+            timer.respond(state, response.status_code, response.content_length)
+        return response
+
+    @app.teardown_request
+    async def _finish_timer(exc):
+        state = g.pop('_request_timer', None)
+        if state is not None:
+            timer.finish(state)
+
+    @app.route('/metrics')
+    async def metrics():
+        body, content_type = render()
+        return Response(body, content_type=content_type)
+
+    return app
+
+
+def aiohttp_trace_config(service='arxiv'):
+    """
+    aiohttp TraceConfig timing every request of a ClientSession, until its response headers arrive.
+
+    Pass it as ClientSession(trace_configs=[aiohttp_trace_config()]).
+    """
+    import aiohttp
+
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        OUTBOUND_LATENCY.labels(service, params.method, str(params.response.status)).observe(
+            time.perf_counter() - context.start)
+
+    async def on_request_exception(session, context, params):
+        OUTBOUND_LATENCY.labels(service, params.method, type(params.exception).__name__).observe(
+            time.perf_counter() - context.start)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    Times every MongoDB command of the clients it is registered with, by command name.
+
+    Pass it as MongoClient(event_listeners=[MongoCommandTimer()]); Motor
+    clients take it the same way.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        OUTBOUND_LATENCY.labels('mongodb', event.command_name, 'ok').observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        OUTBOUND_LATENCY.labels('mongodb', event.command_name, 'error').observe(event.duration_micros / 1e6)
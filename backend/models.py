@@ -1,40 +1,45 @@
+import os
 import pandas as pd
-from aif360.datasets import StandardDataset
-from aif360.metrics import BinaryLabelDatasetMetric, ClassificationMetric
-from aif360.algorithms.preprocessing import Reweighing
-from aif360.algorithms.inprocessing import AdversarialDebiasing
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import accuracy_score
-import tensorflow as tf
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-
-
-db = SQLAlchemy()
-
-
-class User(db.Model):
-    __tablename__ = "user"
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(50), unique=True)
-    email = db.Column(db.String(100), unique=True, nullable=False)
-    password = db.Column(db.String(250), nullable=False)
-    is_business = db.Column(db.Boolean, default=False)
-    is_professional = db.Column(db.Boolean, default=False)
-    is_student = db.Column(db.Boolean, default=False)
-    is_admin = db.Column(db.Boolean, default=False)
-    
-
-def load_data(file_path, label, protected_attr):
-    data = pd.read_csv(file_path)
+# The ORM lives in user_models so the web app can use it without the ML stack,
+# re-exported here for existing imports
+from user_models import db, User
+
+# aif360 algorithms, sklearn and tensorflow take seconds and hundreds of MB to
+# import, so they are only imported inside the functions that use them.
+
+
+def load_data(file_path, label, protected_attr, dataset_id=None):
+    # Registered datasets are Parquet files, read memory-mapped instead of parsing CSV
+    if dataset_id is not None:
+        from dataset_store import dataset_registry
+        file_path = dataset_registry.parquet_path(dataset_id)
+    if file_path.endswith('.parquet'):
+        data = pd.read_parquet(file_path, memory_map=True)
+    else:
+        data = pd.read_csv(file_path)
     return data, label, protected_attr
 
-def create_dataset(data, label, protected_attr):
-    dataset = StandardDataset(data, label_names=[label], protected_attribute_names=[protected_attr])
+def create_dataset(data, label, protected_attr, favorable_class=1, privileged_value=1):
+    from aif360.datasets import StandardDataset
+    # Text feature columns are one-hot encoded, aif360 datasets must be all numeric
+    categorical = [column for column in data.columns
+                   if column not in (label, protected_attr) and not pd.api.types.is_numeric_dtype(data[column])]
+    dataset = StandardDataset(data, label_name=label, favorable_classes=[favorable_class],
+                              protected_attribute_names=[protected_attr], privileged_classes=[[privileged_value]],
+                              categorical_features=categorical)
     return dataset
 
+def group_definitions(dataset, protected_attr):
+    # StandardDataset recodes text attributes to 1.0/0.0 but keeps numeric
+    # values, so the groups are read back from the dataset
+    privileged = [{protected_attr: value} for value in dataset.privileged_protected_attributes[0]]
+    unprivileged = [{protected_attr: value} for value in dataset.unprivileged_protected_attributes[0]]
+    return privileged, unprivileged
+
 def evaluate_bias(dataset, protected_attr):
-    metric = BinaryLabelDatasetMetric(dataset, privileged_groups=[{protected_attr: 1}], unprivileged_groups=[{protected_attr: 0}])
+    from aif360.metrics import BinaryLabelDatasetMetric
+    privileged_groups, unprivileged_groups = group_definitions(dataset, protected_attr)
+    metric = BinaryLabelDatasetMetric(dataset, privileged_groups=privileged_groups, unprivileged_groups=unprivileged_groups)
     bias_metrics = {
         'mean_difference': metric.mean_difference(),
         'disparate_impact': metric.disparate_impact()
@@ -42,6 +47,7 @@ def evaluate_bias(dataset, protected_attr):
     return bias_metrics
 
 def train_model(dataset, label):
+    from sklearn.linear_model import LogisticRegression
     X_train = dataset.features
     y_train = dataset.labels.ravel()
     model = LogisticRegression(solver='liblinear')
@@ -49,6 +55,7 @@ def train_model(dataset, label):
     return model
 
 def evaluate_model(model, dataset):
+    from sklearn.metrics import accuracy_score
     X_test = dataset.features
     y_test = dataset.labels.ravel()
     y_pred = model.predict(X_test)
@@ -56,19 +63,33 @@ def evaluate_model(model, dataset):
     return accuracy
 
 def mitigate_bias(dataset, protected_attr):
-    reweighing = Reweighing(unprivileged_groups=[{protected_attr: 0}], privileged_groups=[{protected_attr: 1}])
+    from aif360.algorithms.preprocessing import Reweighing
+    privileged_groups, unprivileged_groups = group_definitions(dataset, protected_attr)
+    reweighing = Reweighing(unprivileged_groups=unprivileged_groups, privileged_groups=privileged_groups)
     dataset_transformed = reweighing.fit_transform(dataset)
     return dataset_transformed
 
 def adversarial_debiasing(dataset, label, protected_attr):
+    import tensorflow.compat.v1 as tf
+    from aif360.algorithms.inprocessing import AdversarialDebiasing
+    # AdversarialDebiasing builds a TF1 graph
+    tf.disable_eager_execution()
     sess = tf.Session()
-    debias_model = AdversarialDebiasing(privileged_groups=[{protected_attr: 1}], unprivileged_groups=[{protected_attr: 0}],
+    privileged_groups, unprivileged_groups = group_definitions(dataset, protected_attr)
+    debias_model = AdversarialDebiasing(privileged_groups=privileged_groups, unprivileged_groups=unprivileged_groups,
                                         scope_name='debiasing_classifier', sess=sess)
     debias_model.fit(dataset)
     return debias_model
 
-def run_bias_detection(file_path, label, protected_attr):
-    data, label, protected_attr = load_data(file_path, label, protected_attr)
+def save_debias_model(debias_model, model_path):
+    import tensorflow.compat.v1 as tf
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    saver = tf.train.Saver(var_list=tf.global_variables(scope=debias_model.scope_name))
+    saver.save(debias_model.sess, model_path)
+    return model_path
+
+def run_bias_detection(file_path, label, protected_attr, dataset_id=None):
+    data, label, protected_attr = load_data(file_path, label, protected_attr, dataset_id)
     dataset = create_dataset(data, label, protected_attr)
     bias_metrics = evaluate_bias(dataset, protected_attr)
     model = train_model(dataset, label)
@@ -78,6 +99,13 @@ def run_bias_detection(file_path, label, protected_attr):
         'accuracy': accuracy
     }
 
+def run_threshold_sweep(file_path, label, protected_attr, favorable_class=1, privileged_value=1, dataset_id=None,
+                        **sweep_options):
+    # Cross-validated accuracy/fairness trade-off of the train_model classifier, see fairness_sweep
+    from fairness_sweep import threshold_sweep
+    data, label, protected_attr = load_data(file_path, label, protected_attr, dataset_id)
+    return threshold_sweep(data, label, protected_attr, favorable_class, privileged_value, **sweep_options)
+
 def run_bias_mitigation(file_path, label, protected_attr):
     data, label, protected_attr = load_data(file_path, label, protected_attr)
     dataset = create_dataset(data, label, protected_attr)
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import re
+import zlib
+
+import numpy as np
+from pymongo import UpdateOne
+
+import paper_db
+
+# MinHash signature length, split into BANDS bands of NUM_PERM // BANDS rows.
+# Two papers with shingle Jaccard similarity s share at least one band with
+# probability 1 - (1 - s ** rows) ** bands: about 0.99 at s = 0.8 and 0.08 at s = 0.5.
+NUM_PERM = 128
+BANDS = 16
+# Candidates sharing a band are duplicates if their estimated similarity reaches this
+THRESHOLD = 0.8
+# Words per shingle
+SHINGLE_SIZE = 3
+# Signature and canonical document of every ingested paper, by '<collection>:<arxiv id>'
+SIGNATURES_COLLECTION = 'paper_signatures'
+
+_PRIME = (1 << 31) - 1
+_WORD = re.compile(r'\w+')
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Overlapping runs of size lower-cased words; a shorter text is a single shingle."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def paper_key(collection_name, paper):
+    return f"{collection_name}:{paper['arxiv_id']}"
+
+
+class MinHasher:
+    """
+    MinHash signatures from NUM_PERM universal hash functions, applied to all shingles at once.
+
+    Args:
+        num_perm (int, optional): Signature length.
+        seed (int, optional): Seed of the hash functions; signatures are only
+                              comparable between hashers with the same seed.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, text):
+        """
+        Returns:
+            np.ndarray: uint32 signature of text, or None if it has no words.
+        """
+        tokens = shingles(text)
+        if not tokens:
+            return None
+        hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokens), np.uint64, len(tokens))
+        # a * x + b stays below 2 ** 63 for x < 2 ** 31, so uint64 never overflows
+        return ((self.a * (hashes % _PRIME) + self.b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing over MinHash signatures.
+
+    Every document is filed under one bucket per band. Documents that share
+    a bucket with a new one are compared on their full signatures, so a
+    lookup costs a few dictionary probes instead of a pass over all documents.
+
+    Args:
+        bands (int, optional): Bands per signature.
+        threshold (float, optional): Estimated Jaccard similarity at which two documents are duplicates.
+    """
+
+    def __init__(self, bands=BANDS, threshold=THRESHOLD):
+        self.bands = bands
+        self.threshold = threshold
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+        self.canonical = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _band_keys(self, signature):
+        return [band.tobytes() for band in np.split(signature, self.bands)]
+
+    def add(self, key, signature, duplicate_of=None):
+        self.signatures[key] = signature
+        self.canonical[key] = duplicate_of
+        for band, bucket_key in enumerate(self._band_keys(signature)):
+            self.buckets[band].setdefault(bucket_key, []).append(key)
+
+    def query(self, signature):
+        """
+        Returns:
+            tuple: (key, estimated similarity) of the most similar indexed document
+                   at or above threshold, or (None, 0.0).
+        """
+        candidates = set()
+        for band, bucket_key in enumerate(self._band_keys(signature)):
+            candidates.update(self.buckets[band].get(bucket_key, ()))
+        best, best_similarity = None, 0.0
+        for key in candidates:
+            similarity = float(np.mean(self.signatures[key] == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = key, similarity
+        return best, best_similarity
+
+    def assign(self, key, signature):
+        """
+        Files a document and decides whether it duplicates one filed before.
+
+        A document seen before keeps the decision made then, so re-harvesting
+        never changes which copy is canonical.
+
+        Returns:
+            tuple: (canonical key or None if the document is canonical itself, True if the key is new).
+        """
+        if key in self.signatures:
+            return self.canonical[key], False
+        match, _ = self.query(signature)
+        # Link to the original, never to another duplicate
+        duplicate_of = (self.canonical[match] or match) if match is not None else None
+        self.add(key, signature, duplicate_of)
+        return duplicate_of, True
+
+
+def _signature_text(paper):
+    return f"{paper.get('title') or ''} {paper.get('summary') or ''}"
+
+
+def _filed(key, signature, duplicate_of):
+    return UpdateOne({'_id': key}, {'$set': {'signature': signature.astype('<u4').tobytes(),
+                                             'duplicate_of': duplicate_of}}, upsert=True)
+
+
+def _restore(index, documents):
+    for document in documents:
+        index.add(document['_id'], np.frombuffer(document['signature'], dtype='<u4'), document.get('duplicate_of'))
+
+
+class NearDuplicateDetector:
+    """
+    Marks harvested papers that are near-duplicates of a paper ingested before.
+
+    The three harvest queries overlap, so the same paper (or another version
+    of it) arrives in several collections. Each paper is MinHashed over its
+    title and summary and looked up in an LSH index of everything ingested
+    so far; a match gets 'duplicate_of' set to the canonical paper's
+    '<collection>:<arxiv id>', and canonical papers get None. Embedding and
+    indexing skip papers with duplicate_of set. Signatures are kept in
+    SIGNATURES_COLLECTION and loaded on first use.
+
+    Args:
+        database: Motor database; the shared paper database by default.
+        hasher (MinHasher, optional): Signature function.
+        index (LSHIndex, optional): Index to file signatures in.
+    """
+
+    def __init__(self, database=None, hasher=None, index=None):
+        self.db = database if database is not None else paper_db.get_async_db()
+        self.hasher = hasher if hasher is not None else MinHasher()
+        self.index = index if index is not None else LSHIndex()
+        self.duplicates = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def load(self):
+        async with self._load_lock:
+            if self._loaded:
+                return
+            async for documents in paper_db.aiter_batches(self.db[SIGNATURES_COLLECTION]):
+                _restore(self.index, documents)
+            self._loaded = True
+            logging.info(f'Loaded {len(self.index)} paper signatures')
+
+    async def mark(self, collection_name, papers):
+        """
+        Sets 'duplicate_of' on every paper of a batch about to be stored, and files the new ones.
+
+        Returns:
+            int: Papers of the batch that are duplicates.
+        """
+        await self.load()
+        filed, duplicates = [], 0
+        # No awaits in between, so concurrent harvests never both claim to be canonical
+        for paper in papers:
+            signature = self.hasher.signature(_signature_text(paper))
+            if signature is None:
+                paper['duplicate_of'] = None
+                continue
+            key = paper_key(collection_name, paper)
+            paper['duplicate_of'], new = self.index.assign(key, signature)
+            if new:
+                filed.append(_filed(key, signature, paper['duplicate_of']))
+            duplicates += paper['duplicate_of'] is not None
+        if filed:
+            await self.db[SIGNATURES_COLLECTION].bulk_write(filed, ordered=False)
+        self.duplicates += duplicates
+        return duplicates
+
+
+def mark_existing(collections, database=None, batch_size=paper_db.READ_BATCH_SIZE):
+    """
+    Runs the detection over papers stored before ingest did it, in the given collection order.
+
+    Papers already embedded or indexed stay there; only later runs skip them.
+
+    Returns:
+        int: Papers marked as duplicates.
+    """
+    db = database if database is not None else paper_db.get_db()
+    hasher, index = MinHasher(), LSHIndex()
+    for documents in paper_db.iter_batches(db[SIGNATURES_COLLECTION], batch_size=batch_size):
+        _restore(index, documents)
+
+    marked = 0
+    projection = {'arxiv_id': 1, 'title': 1, 'summary': 1}
+    for collection_name in collections:
+        query = {'arxiv_id': {'$exists': True}}
+        for papers in paper_db.iter_batches(db[collection_name], query, projection, batch_size):
+            filed, links = [], []
+            for paper in papers:
+                signature = hasher.signature(_signature_text(paper))
+                if signature is None:
+                    continue
+                key = paper_key(collection_name, paper)
+                duplicate_of, new = index.assign(key, signature)
+                if new:
+                    filed.append(_filed(key, signature, duplicate_of))
+                links.append(UpdateOne({'_id': paper['_id']}, {'$set': {'duplicate_of': duplicate_of}}))
+                marked += duplicate_of is not None
+            if filed:
+                db[SIGNATURES_COLLECTION].bulk_write(filed, ordered=False)
+            if links:
+                db[collection_name].bulk_write(links, ordered=False)
+    logging.info(f'Marked {marked} near-duplicate papers')
+    return marked
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    mark_existing(['engineering_papers', 'ethics_papers', 'policy_papers'])
@@ -0,0 +1,109 @@
+import os
+import threading
+
+from pymongo import MongoClient
+
+from metrics import MongoCommandTimer
+
+# One database holds the papers for every stage: the harvester writes it, and
+# embedding, indexing and reporting read it.
+MONGODB_URI = os.environ.get('AICADEMIA_MONGODB_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = os.environ.get('AICADEMIA_MONGODB_DATABASE', 'researchPapers')
+
+# Shared by every caller in a process, so the pool is sized for the harvester's
+# concurrent writes plus the readers.
+POOL_OPTIONS = {
+    'maxPoolSize': int(os.environ.get('AICADEMIA_MONGODB_POOL_SIZE', 50)),
+    'minPoolSize': 2,
+    'maxIdleTimeMS': 60_000,
+    'serverSelectionTimeoutMS': 5_000,
+    'retryWrites': True,
+}
+READ_BATCH_SIZE = 1000
+# Command timings of every client, served on the apps' /metrics endpoints
+_command_timer = MongoCommandTimer()
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The PyMongo client of this process, created on first use.
+
+    PyMongo clients are not fork-safe, so a worker process forked from a
+    parent that already had one gets its own.
+    """
+    key = ('sync', os.getpid())
+    with _lock:
+        if key not in _clients:
+            _clients[key] = MongoClient(MONGODB_URI, event_listeners=[_command_timer], **POOL_OPTIONS)
+        return _clients[key]
+
+
+def get_async_client():
+    """The Motor client of this process, created on first use."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    key = ('async', os.getpid())
+    with _lock:
+        if key not in _clients:
+            _clients[key] = AsyncIOMotorClient(MONGODB_URI, event_listeners=[_command_timer], **POOL_OPTIONS)
+        return _clients[key]
+
+
+def get_db(name=DATABASE_NAME):
+    return get_client()[name]
+
+
+def get_async_db(name=DATABASE_NAME):
+    return get_async_client()[name]
+
+
+def iter_batches(collection, query=None, projection=None, batch_size=READ_BATCH_SIZE, sort=None):
+    """
+    Streams the documents matching query as lists of at most batch_size, one server round trip each.
+
+    Args:
+        collection: PyMongo collection.
+        query (dict, optional): Filter, all documents by default.
+        projection (dict, optional): Fields returned.
+        batch_size (int, optional): Documents per list.
+        sort (list, optional): Sort specification.
+
+    Yields:
+        list: Documents.
+    """
+    cursor = collection.find(query or {}, projection).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def aiter_batches(collection, query=None, projection=None, batch_size=READ_BATCH_SIZE, sort=None):
+    """Async version of iter_batches over a Motor collection."""
+    cursor = collection.find(query or {}, projection).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def close():
+    """Closes the clients of this process."""
+    with _lock:
+        for key in [key for key in _clients if key[1] == os.getpid()]:
+            _clients.pop(key).close()
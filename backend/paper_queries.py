@@ -0,0 +1,198 @@
+import re
+import threading
+import time
+
+import pymongo
+from pymongo import IndexModel
+
+# Indexes every paper collection carries. The arXiv id is the upsert key of
+# the harvester, published backs date filters and newest-first listings,
+# authors (a multikey index over the list) serves author criteria, and the
+# text index serves keyword criteria. harvested_at, the time the harvester
+# last wrote a paper, is the watermark of the incremental trend counts.
+# Papers stored before the harvester kept arxiv_id lack the field, hence sparse.
+PAPER_INDEXES = [
+    IndexModel([('arxiv_id', pymongo.ASCENDING)], name='arxiv_id_unique', unique=True, sparse=True),
+    IndexModel([('published', pymongo.DESCENDING)], name='published'),
+    IndexModel([('harvested_at', pymongo.ASCENDING)], name='harvested_at'),
+    IndexModel([('authors', pymongo.ASCENDING)], name='authors'),
+    IndexModel([('title', pymongo.TEXT), ('summary', pymongo.TEXT)], name='title_summary_text',
+               weights={'title': 3, 'summary': 1}),
+]
+
+# Fields a report needs; everything else (embeddings, passages) stays on the server
+REPORT_PROJECTION = {'title': 1, 'summary': 1, 'content': 1, 'authors': 1, 'published': 1, 'arxiv_id': 1}
+
+# Report criteria accepted by build_query
+CRITERIA_KEYS = ('keywords', 'published_after', 'published_before', 'authors', 'arxiv_ids')
+# Fields keyword criteria are matched against
+KEYWORD_FIELDS = ('title', 'summary')
+
+_WORD = re.compile(r'\w+')
+
+
+def ensure_paper_indexes(collection):
+    """Creates the paper indexes on a collection; a no-op for indexes that already exist."""
+    return collection.create_indexes(PAPER_INDEXES)
+
+
+def supports_text_search(database):
+    """False for mongomock, which implements neither $text nor sorting by textScore."""
+    return not type(database).__module__.startswith('mongomock')
+
+
+def build_query(criteria, text_search=True):
+    """
+    Translates report criteria into a MongoDB filter that the paper indexes can serve.
+
+    Args:
+        criteria (dict): Any of 'keywords' (str or list, matched against title and
+                         summary), 'published_after' and 'published_before'
+                         (ISO dates, inclusive), 'authors' (list, any match) and
+                         'arxiv_ids' (list).
+        text_search (bool, optional): Match keywords through the text index. When
+                                      False, any keyword appearing in title or
+                                      summary matches, case-insensitively, by regex.
+
+    Returns:
+        dict: The filter.
+
+    Raises:
+        ValueError: On keys other than the ones above. Raw filters are refused
+                    because nothing guarantees an index can serve them.
+    """
+    unknown = set(criteria) - set(CRITERIA_KEYS)
+    if unknown:
+        raise ValueError(f"Unsupported report criteria: {', '.join(sorted(unknown))}")
+
+    query = {}
+    keywords = criteria.get('keywords')
+    if keywords:
+        if not isinstance(keywords, str):
+            keywords = ' '.join(keywords)
+        if text_search:
+            query['$text'] = {'$search': keywords}
+        else:
+            query['$or'] = [{field: {'$regex': re.escape(word), '$options': 'i'}}
+                            for word in _WORD.findall(keywords) for field in KEYWORD_FIELDS]
+
+    published = {}
+    if criteria.get('published_after'):
+        published['$gte'] = criteria['published_after']
+    if criteria.get('published_before'):
+        # Dates are stored as full timestamps, a bare day must include all of it
+        before = criteria['published_before']
+        published['$lte'] = before + 'T23:59:59Z' if len(before) == 10 else before
+    if published:
+        query['published'] = published
+
+    if criteria.get('authors'):
+        query['authors'] = {'$in': list(criteria['authors'])}
+    if criteria.get('arxiv_ids'):
+        query['arxiv_id'] = {'$in': list(criteria['arxiv_ids'])}
+    return query
+
+
+class PaperQueries:
+    """
+    Data-access layer over the paper collections.
+
+    Every query goes through build_query and a projection, so none of them
+    falls back to a collection scan, and each query's latency is recorded
+    under its name. Indexes are created the first time a collection is used.
+
+    Args:
+        database: PyMongo (or mongomock) database holding the paper collections.
+        text_search (bool, optional): Whether keyword criteria use the text index;
+                                      detected with supports_text_search by default.
+    """
+
+    def __init__(self, database, text_search=None):
+        self.db = database
+        self.text_search = supports_text_search(database) if text_search is None else text_search
+        self._indexed = set()
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def collection(self, collection_name):
+        if collection_name not in self._indexed:
+            ensure_paper_indexes(self.db[collection_name])
+            self._indexed.add(collection_name)
+        return self.db[collection_name]
+
+    def _record(self, name, started, returned):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            timing = self._timings.setdefault(name, {'count': 0, 'total_s': 0.0, 'max_s': 0.0, 'documents': 0})
+            timing['count'] += 1
+            timing['total_s'] += elapsed
+            timing['max_s'] = max(timing['max_s'], elapsed)
+            timing['documents'] += returned
+
+    def _timed(self, name, cursor):
+        # Timing covers iteration, which is where a cursor does its work
+        started = time.perf_counter()
+        returned = 0
+        try:
+            for document in cursor:
+                returned += 1
+                yield document
+        finally:
+            self._record(name, started, returned)
+
+    def find_papers(self, collection_name, criteria, projection=None, limit=0, batch_size=100):
+        """
+        Streams the papers matching report criteria.
+
+        Keyword searches through the text index come back by relevance, everything else newest first.
+
+        Args:
+            collection_name (str): Paper collection.
+            criteria (dict): See build_query.
+            projection (dict, optional): Fields returned; REPORT_PROJECTION by default.
+            limit (int, optional): Maximum papers returned, 0 for all.
+            batch_size (int, optional): Documents per round trip.
+
+        Returns:
+            generator: Paper documents.
+        """
+        query = build_query(criteria, self.text_search)
+        projection = dict(projection or REPORT_PROJECTION)
+        if '$text' in query:
+            projection['score'] = {'$meta': 'textScore'}
+            sort = [('score', {'$meta': 'textScore'})]
+        else:
+            sort = [('published', pymongo.DESCENDING)]
+        cursor = self.collection(collection_name).find(query, projection).sort(sort).limit(limit).batch_size(batch_size)
+        return self._timed('find_papers', cursor)
+
+    def get_by_arxiv_ids(self, collection_name, arxiv_ids, projection=None):
+        """Looks papers up by arXiv id through the unique index."""
+        cursor = self.collection(collection_name).find(
+            {'arxiv_id': {'$in': list(arxiv_ids)}}, projection or REPORT_PROJECTION
+        )
+        return list(self._timed('get_by_arxiv_ids', cursor))
+
+    def existing_arxiv_ids(self, collection_name, arxiv_ids):
+        """The subset of arxiv_ids already stored, answered from the index alone."""
+        cursor = self.collection(collection_name).find(
+            {'arxiv_id': {'$in': list(arxiv_ids)}}, {'arxiv_id': 1, '_id': 0}
+        )
+        return {paper['arxiv_id'] for paper in self._timed('existing_arxiv_ids', cursor)}
+
+    def latest(self, collection_name, limit=10, projection=None):
+        """Newest papers by published date."""
+        return list(self.find_papers(collection_name, {}, projection, limit=limit))
+
+    def explain(self, collection_name, criteria):
+        """Winning plan MongoDB picks for criteria, to check an index is used."""
+        explanation = self.collection(collection_name).find(build_query(criteria, self.text_search)).explain()
+        return explanation.get('queryPlanner', {}).get('winningPlan')
+
+    def stats(self):
+        """Count, total and max latency (seconds) and documents returned, per query name."""
+        with self._lock:
+            stats = {}
+            for name, timing in self._timings.items():
+                stats[name] = dict(timing, mean_s=timing['total_s'] / timing['count'])
+            return stats
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+import paper_db
+from fns_papers import ArxivHarvester, STATE_COLLECTION, fetch_papers
+
+# The embedding and indexing stages live with the RAG modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rag-integration'))
+from embedding_store import EmbeddingStore
+from indexing import open_index
+from preprocessing import (EMBEDDING_DIM, EMBEDDINGS_DIR, MODEL_NAME, PAPER_TEXT_PROJECTION, clean_text,
+                           content_hash, embed_batch, paper_text)
+
+logging.basicConfig(level=logging.INFO)
+
+# Search query harvested into each paper collection
+QUERIES = {
+    'engineering_papers': 'engineering AI',
+    'ethics_papers': 'ethics AI',
+    'policy_papers': 'policy AI',
+}
+# Batches waiting between two stages; a full queue makes the stage before it wait
+QUEUE_SIZE = 8
+# Seconds between saves of the index while the pipeline runs
+SAVE_INTERVAL = 30.0
+# Per collection, the harvest watermark up to which a run has been fully indexed
+PIPELINE_STATE_COLLECTION = 'pipeline_state'
+
+
+class StageStats:
+    """Items and batches handled by one stage, and the time it spent working on them."""
+
+    def __init__(self, name, queue=None):
+        self.name = name
+        self.queue = queue
+        self.items = 0
+        self.batches = 0
+        self.busy_s = 0.0
+        self.max_backlog = 0
+        self.started = None
+        self.finished = None
+
+    def record(self, items, busy_s):
+        self.items += items
+        self.batches += 1
+        self.busy_s += busy_s
+
+    def observe_backlog(self):
+        if self.queue is not None:
+            self.max_backlog = max(self.max_backlog, self.queue.qsize())
+
+    def as_dict(self):
+        elapsed = ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+        return {
+            'items': self.items,
+            'batches': self.batches,
+            'busy_s': self.busy_s,
+            'elapsed_s': elapsed,
+            'items_per_s': self.items / elapsed if elapsed else 0.0,
+            'items_per_busy_s': self.items / self.busy_s if self.busy_s else 0.0,
+            'backlog': self.queue.qsize() if self.queue is not None else 0,
+            'max_backlog': self.max_backlog,
+        }
+
+
+class Pipeline:
+    """
+    Runs harvest, embedding and index append as concurrent stages joined by bounded queues.
+
+    Papers are handed to the embedding stage as soon as the harvester has
+    written a batch of them, and their vectors are appended to the unified
+    FAISS index as soon as they are encoded, so no stage waits for the one
+    before it to finish. Bounded queues keep a slow stage from letting work
+    pile up in memory. Papers the harvester marks as near-duplicates of
+    one already ingested (see near_dup) are stored but not embedded.
+
+    Progress is checkpointed per stage: the harvester keeps its watermark,
+    the embedding stores are flushed after every batch, and the index is
+    saved every save_interval seconds and at the end. When a run has drained
+    completely, the harvest watermark is recorded as indexed; a restarted run
+    first replays papers published after that point, which only re-encodes
+    and re-indexes what an interrupted run did not get to.
+
+    Args:
+        queries (dict, optional): Collection name to arXiv search query.
+        index_type (str, optional): Type of the unified index, see indexing.INDEX_TYPES.
+        store_dir (str, optional): Directory of the embedding stores.
+        index_name (str, optional): Name of the unified index under INDEXES_DIR.
+        queue_size (int, optional): Batches allowed to wait between two stages.
+        encode_batch_size (int, optional): Encoder batch size.
+        save_interval (float, optional): Seconds between index saves.
+        database (optional): Motor database; the shared paper database by default.
+        model (optional): Loaded SentenceTransformer to use instead of MODEL_NAME.
+        harvester_options (dict, optional): Passed on to ArxivHarvester.
+        **index_params: Passed on to indexing.build_index.
+    """
+
+    def __init__(self, queries=None, index_type='flat', store_dir=EMBEDDINGS_DIR, index_name='unified',
+                 queue_size=QUEUE_SIZE, encode_batch_size=64, save_interval=SAVE_INTERVAL, database=None,
+                 model=None, harvester_options=None, **index_params):
+        self.queries = queries or QUERIES
+        self.index_type = index_type
+        self.index_params = index_params
+        self.store_dir = store_dir
+        self.index_name = index_name
+        self.queue_size = queue_size
+        self.encode_batch_size = encode_batch_size
+        self.save_interval = save_interval
+        self.db = database if database is not None else paper_db.get_async_db()
+        self.model = model
+        self.harvester_options = harvester_options or {}
+        self.stores = {}
+        self.index = None
+        self._embed_queue = None
+        self._index_queue = None
+        self._stats = {}
+
+    def stats(self):
+        """Per stage: items, batches, throughput, busy time and current and peak queue backlog."""
+        return {name: stage.as_dict() for name, stage in self._stats.items()}
+
+    async def run(self):
+        """
+        Runs one incremental pass over every collection.
+
+        Returns:
+            dict: Stage stats at the end of the run.
+        """
+        loop = asyncio.get_running_loop()
+        if self.model is None:
+            from sentence_transformers import SentenceTransformer
+            self.model = await loop.run_in_executor(None, SentenceTransformer, MODEL_NAME)
+        self.stores = {
+            collection: EmbeddingStore(os.path.join(self.store_dir, collection), EMBEDDING_DIM)
+            for collection in self.queries
+        }
+        self.index = open_index(self.index_name, EMBEDDING_DIM, self.index_type, **self.index_params)
+        existing = [store.vectors() for store in self.stores.values() if len(store)]
+        if not self.index.index.is_trained and existing:
+            self.index.train(np.concatenate(existing))
+        if self.index.index.is_trained:
+            # Vectors embedded earlier, e.g. by an interrupted run, but never indexed
+            for collection, store in self.stores.items():
+                self.index.sync_from_store(store, id_prefix=f'{collection}:')
+
+        self._embed_queue = asyncio.Queue(self.queue_size)
+        self._index_queue = asyncio.Queue(self.queue_size)
+        self._stats = {
+            'harvest': StageStats('harvest'),
+            'embed': StageStats('embed', self._embed_queue),
+            'index': StageStats('index', self._index_queue),
+        }
+        tasks = [asyncio.ensure_future(stage) for stage in (self._harvest_stage(), self._embed_stage(), self._index_stage())]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            # A failed stage would leave the others blocked on its queue
+            for task in tasks:
+                task.cancel()
+            raise
+
+        for collection in self.queries:
+            # Everything harvested up to now has gone through every stage
+            watermark = await self._harvest_watermark(collection)
+            if watermark:
+                await self.db[PIPELINE_STATE_COLLECTION].update_one(
+                    {'_id': collection}, {'$max': {'indexed_watermark': watermark}}, upsert=True
+                )
+        stats = self.stats()
+        logging.info(f'Pipeline finished: {stats}')
+        return stats
+
+    async def _harvest_watermark(self, collection):
+        state = await self.db[STATE_COLLECTION].find_one({'_id': collection})
+        return state.get('watermark') if state else None
+
+    async def _enqueue(self, collection, papers):
+        stage = self._stats['harvest']
+        stage.record(len(papers), 0.0)
+        await self._embed_queue.put((collection, papers))
+        self._stats['embed'].observe_backlog()
+
+    async def _replay(self, collection):
+        """Feeds papers published after the last fully indexed run back into the pipeline."""
+        state = await self.db[PIPELINE_STATE_COLLECTION].find_one({'_id': collection}) or {}
+        watermark = state.get('indexed_watermark')
+        query = {'published': {'$gt': watermark}} if watermark else {}
+        query['duplicate_of'] = None
+        projection = dict(PAPER_TEXT_PROJECTION, published=1)
+        async for papers in paper_db.aiter_batches(self.db[collection], query, projection, batch_size=256):
+            await self._enqueue(collection, papers)
+
+    async def _harvest_stage(self):
+        stage = self._stats['harvest']
+        stage.started = time.perf_counter()
+        try:
+            for collection in self.queries:
+                await self._replay(collection)
+            harvester = ArxivHarvester(self.db, sink=self._enqueue, **self.harvester_options)
+            async with harvester:
+                await asyncio.gather(*(
+                    fetch_papers(query, collection, harvester) for collection, query in self.queries.items()
+                ))
+            await self._embed_queue.put(None)
+        finally:
+            stage.finished = time.perf_counter()
+
+    async def _embed_stage(self):
+        stage = self._stats['embed']
+        stage.started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                item = await self._embed_queue.get()
+                if item is None:
+                    break
+                collection, papers = item
+                # Near-duplicates are stored linked to their canonical paper but never embedded
+                papers = [paper for paper in papers if not paper.get('duplicate_of')]
+                if not papers:
+                    continue
+                missing = [paper['arxiv_id'] for paper in papers if '_id' not in paper]
+                if missing:
+                    # Harvested papers are upserted by arXiv id, look up the ids MongoDB gave them
+                    found = await self.db[collection].find(
+                        {'arxiv_id': {'$in': missing}}, PAPER_TEXT_PROJECTION
+                    ).to_list(None)
+                    papers = [paper for paper in papers if '_id' in paper] + found
+
+                start = time.perf_counter()
+                # Encoding blocks, run it off the event loop so harvesting carries on meanwhile
+                doc_ids, hashes, vectors = await loop.run_in_executor(None, self._embed, collection, papers)
+                stage.record(len(papers), time.perf_counter() - start)
+                if doc_ids:
+                    await self._index_queue.put((collection, doc_ids, hashes, vectors))
+                    self._stats['index'].observe_backlog()
+            await self._index_queue.put(None)
+        finally:
+            stage.finished = time.perf_counter()
+
+    def _embed(self, collection, papers):
+        """Encodes the new or changed papers of a batch and returns their ids, hashes and vectors."""
+        store = self.stores[collection]
+        doc_ids, documents = [], []
+        for paper in papers:
+            content = paper_text(paper)
+            if content:
+                doc_ids.append(str(paper['_id']))
+                documents.append(clean_text(content))
+        hashes = [content_hash(document) for document in documents]
+        todo = [i for i, (doc_id, h) in enumerate(zip(doc_ids, hashes)) if store.needs_embedding(doc_id, h)]
+        if not todo:
+            return [], [], None
+
+        doc_ids = [doc_ids[i] for i in todo]
+        embed_batch(store, self.model, doc_ids, [documents[i] for i in todo], self.encode_batch_size)
+        store.flush()
+        # A copy, the index stage must not read the memmap while the next batch grows it
+        return doc_ids, [hashes[i] for i in todo], np.array(store.get(doc_ids))
+
+    async def _index_stage(self):
+        stage = self._stats['index']
+        stage.started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        last_save = time.perf_counter()
+        dirty = False
+        try:
+            while True:
+                item = await self._index_queue.get()
+                if item is None:
+                    break
+                collection, doc_ids, hashes, vectors = item
+                start = time.perf_counter()
+                ids = [f'{collection}:{doc_id}' for doc_id in doc_ids]
+                # An IVF index short of training data holds the vectors flat and trains once it has enough
+                await loop.run_in_executor(None, self.index.add, vectors, ids, hashes)
+                dirty = True
+                if time.perf_counter() - last_save >= self.save_interval:
+                    await loop.run_in_executor(None, self.index.save)
+                    last_save, dirty = time.perf_counter(), False
+                stage.record(len(doc_ids), time.perf_counter() - start)
+            if dirty:
+                await loop.run_in_executor(None, self.index.save)
+        finally:
+            stage.finished = time.perf_counter()
+
+
+async def main():
+    stats = await Pipeline().run()
+    for name, stage in stats.items():
+        logging.info(f"{name}: {stage['items']} items, {stage['items_per_s']:.1f}/s, "
+                     f"peak backlog {stage['max_backlog']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,254 @@
+import json
+import math
+import os
+import re
+import uuid
+from collections import Counter
+
+import numpy as np
+
+# Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lower-cased word tokens; the same split preprocessing.clean_text produces."""
+    return _WORD.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Inverted index over document text scored with Okapi BM25.
+
+    Postings are kept term by term in compressed sparse row form: for term t,
+    the documents and term frequencies in docs[indptr[t]:indptr[t + 1]].
+    What was loaded from disk is memory-mapped and never modified. Documents
+    added since go to an in-memory delta, and replaced documents are marked
+    dead, so updates never rewrite the base. save() merges the two and drops
+    dead documents. Document frequencies and lengths are taken over live
+    documents only, so scores do not drift between saves.
+
+    Args:
+        path (str): Directory the index is saved to.
+        k1 (float, optional): Term frequency saturation.
+        b (float, optional): Document length normalization.
+    """
+
+    def __init__(self, path, k1=K1, b=B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        self.hashes = []
+        self.id_of = {}
+        self.terms = {}
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.docs = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.float32)
+        self.delta = {}
+        # A rebuilt index gets a new generation, so (generation, version) never repeats
+        self.generation = uuid.uuid4().hex
+        self.version = 0
+
+    def __len__(self):
+        return int(self.live.sum())
+
+    @property
+    def state(self):
+        """Changes whenever the index content does, for invalidating cached search results."""
+        return (self.generation, self.version)
+
+    def needs_update(self, doc_id, content_hash):
+        """True if doc_id is not indexed or was indexed from different content."""
+        doc = self.id_of.get(doc_id)
+        return doc is None or self.hashes[doc] != content_hash
+
+    def add(self, doc_ids, texts, content_hashes=None):
+        """
+        Indexes texts under doc_ids. Documents already in the index are replaced.
+
+        Args:
+            doc_ids (list): Document ids, e.g. '<collection>:<id>' as in the unified FAISS index.
+            texts (list): Document texts, aligned with doc_ids.
+            content_hashes (list, optional): Hash of each text, see needs_update.
+        """
+        if content_hashes is None:
+            content_hashes = [None] * len(doc_ids)
+        first = len(self.doc_ids)
+        lengths = []
+        for doc_id, text, content_hash in zip(doc_ids, texts, content_hashes):
+            old = self.id_of.get(doc_id)
+            if old is not None:
+                self.live[old] = False
+            doc = len(self.doc_ids)
+            self.id_of[doc_id] = doc
+            self.doc_ids.append(doc_id)
+            self.hashes.append(content_hash)
+
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = self.terms.setdefault(term, len(self.terms))
+                postings = self.delta.setdefault(term_id, ([], []))
+                postings[0].append(doc)
+                postings[1].append(tf)
+
+        self.doc_len = np.concatenate([self.doc_len, np.array(lengths, dtype=np.float32)])
+        self.live = np.concatenate([self.live, np.ones(len(self.doc_ids) - first, dtype=bool)])
+        self.version += 1
+
+    def remove(self, doc_ids):
+        for doc_id in doc_ids:
+            doc = self.id_of.pop(doc_id, None)
+            if doc is not None:
+                self.live[doc] = False
+        self.version += 1
+
+    def postings(self, term_id):
+        """Documents and term frequencies of a term, base and delta together, live documents only."""
+        docs, tfs = [], []
+        if term_id + 1 < len(self.indptr):
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs.append(self.docs[start:end])
+            tfs.append(self.tfs[start:end])
+        if term_id in self.delta:
+            delta_docs, delta_tfs = self.delta[term_id]
+            docs.append(np.array(delta_docs, dtype=np.int32))
+            tfs.append(np.array(delta_tfs, dtype=np.float32))
+        if not docs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        docs, tfs = np.concatenate(docs), np.concatenate(tfs)
+        alive = self.live[docs]
+        return docs[alive], tfs[alive]
+
+    def search(self, query, k=5, accept=None):
+        """
+        Top k documents for a query by BM25 score.
+
+        Args:
+            query (str): Query text.
+            k (int, optional): Results wanted.
+            accept (callable, optional): Predicate on document ids; others are skipped.
+
+        Returns:
+            list: (doc_id, score) pairs, best first.
+        """
+        n_live = len(self)
+        if not n_live:
+            return []
+        avgdl = float(self.doc_len[self.live].mean()) or 1.0
+
+        all_docs, all_scores = [], []
+        for term in set(tokenize(query)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            docs, tfs = self.postings(term_id)
+            if not len(docs):
+                continue
+            idf = math.log(1 + (n_live - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / avgdl)
+            all_docs.append(docs)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not all_docs:
+            return []
+
+        # Sum per document over the candidates only, never over the whole collection
+        candidates, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        if accept is None and len(candidates) > k:
+            top = np.argpartition(-scores, k)[:k]
+            order = top[np.argsort(-scores[top])]
+        else:
+            order = np.argsort(-scores)
+
+        hits = []
+        for i in order:
+            doc_id = self.doc_ids[candidates[i]]
+            if accept is None or accept(doc_id):
+                hits.append((doc_id, float(scores[i])))
+                if len(hits) == k:
+                    break
+        return hits
+
+    def _merged(self):
+        """Base and delta postings merged per term, with dead documents dropped and documents renumbered."""
+        renumber = np.full(len(self.doc_ids), -1, dtype=np.int32)
+        renumber[self.live] = np.arange(int(self.live.sum()), dtype=np.int32)
+        counts = np.zeros(len(self.terms), dtype=np.int64)
+        term_docs, term_tfs = [], []
+        for term_id in range(len(self.terms)):
+            docs, tfs = self.postings(term_id)
+            counts[term_id] = len(docs)
+            term_docs.append(renumber[docs])
+            term_tfs.append(tfs)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        docs = np.concatenate(term_docs) if term_docs else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate(term_tfs) if term_tfs else np.zeros(0, dtype=np.float32)
+        return indptr, docs.astype(np.int32), tfs.astype(np.float32)
+
+    def save(self):
+        """Merges the delta into the base, drops dead documents and writes everything to path."""
+        os.makedirs(self.path, exist_ok=True)
+        indptr, docs, tfs = self._merged()
+        keep = np.flatnonzero(self.live)
+        doc_len = self.doc_len[keep]
+        doc_ids = [self.doc_ids[i] for i in keep]
+        hashes = [self.hashes[i] for i in keep]
+
+        for name, array in (('indptr', indptr), ('docs', docs), ('tfs', tfs), ('doc_len', doc_len)):
+            tmp_path = os.path.join(self.path, f'{name}.tmp.npy')
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(self.path, f'{name}.npy'))
+        tmp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'k1': self.k1,
+                'b': self.b,
+                'generation': self.generation,
+                'version': self.version,
+                'terms': sorted(self.terms, key=self.terms.get),
+                'doc_ids': doc_ids,
+                'hashes': hashes
+            }, f)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+        # Continue from the compacted state, as a fresh load would
+        self.indptr, self.docs, self.tfs, self.doc_len = indptr, docs, tfs, doc_len
+        self.doc_ids, self.hashes = doc_ids, hashes
+        self.id_of = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        self.live = np.ones(len(doc_ids), dtype=bool)
+        self.delta = {}
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Loads a saved index; with mmap=True the postings are memory-mapped rather than read."""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        index = cls(path, meta['k1'], meta['b'])
+        mode = 'r' if mmap else None
+        index.indptr = np.load(os.path.join(path, 'indptr.npy'), mmap_mode=mode)
+        index.docs = np.load(os.path.join(path, 'docs.npy'), mmap_mode=mode)
+        index.tfs = np.load(os.path.join(path, 'tfs.npy'), mmap_mode=mode)
+        # Lengths grow as documents are added, keep them in memory
+        index.doc_len = np.load(os.path.join(path, 'doc_len.npy'))
+        index.terms = {term: i for i, term in enumerate(meta['terms'])}
+        index.doc_ids = meta['doc_ids']
+        index.hashes = meta['hashes']
+        index.id_of = {doc_id: i for i, doc_id in enumerate(index.doc_ids)}
+        index.live = np.ones(len(index.doc_ids), dtype=bool)
+        index.generation = meta['generation']
+        index.version = meta['version']
+        return index
+
+
+def open_bm25_index(path):
+    """Loads the index saved at path, or creates an empty one."""
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        return BM25Index.load(path)
+    return BM25Index(path)
@@ -0,0 +1,74 @@
+import numpy as np
+
+PASSAGE_WORDS = 200
+OVERLAP_WORDS = 50
+
+# Every code point str.split() treats as whitespace
+WHITESPACE = np.array([
+    0x09, 0x0a, 0x0b, 0x0c, 0x0d, 0x1c, 0x1d, 0x1e, 0x1f, 0x20, 0x85, 0xa0, 0x1680,
+    0x2000, 0x2001, 0x2002, 0x2003, 0x2004, 0x2005, 0x2006, 0x2007, 0x2008, 0x2009, 0x200a,
+    0x2028, 0x2029, 0x202f, 0x205f, 0x3000
+], dtype=np.uint32)
+
+
+def passage_spans(text, size=PASSAGE_WORDS, overlap=OVERLAP_WORDS):
+    """
+    Splits text into overlapping windows of words and returns their character offsets.
+
+    Word boundaries are found by classifying every character as whitespace
+    or not in numpy, and the windows are computed from those boundaries
+    without a Python loop over words.
+
+    Args:
+        text (str): Text to split.
+        size (int, optional): Words per passage.
+        overlap (int, optional): Words shared by consecutive passages.
+
+    Returns:
+        np.ndarray: (n_passages, 2) array of [start, end) character offsets.
+    """
+    if overlap >= size:
+        raise ValueError('overlap must be smaller than the passage size')
+    # UTF-32 gives one array element per character, so indexes are str offsets
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    is_word = np.concatenate([[False], ~np.isin(codes, WHITESPACE), [False]])
+    edges = np.flatnonzero(is_word[1:] != is_word[:-1])
+    if not len(edges):
+        return np.empty((0, 2), dtype=np.int64)
+    starts, ends = edges[0::2], edges[1::2]
+    n_words = len(starts)
+
+    step = size - overlap
+    first_words = np.arange(0, max(n_words - overlap, 1), step)
+    last_words = np.minimum(first_words + size, n_words) - 1
+    return np.stack([starts[first_words], ends[last_words]], axis=1)
+
+
+def chunk_paper(paper_id, text, size=PASSAGE_WORDS, overlap=OVERLAP_WORDS):
+    """
+    Splits one paper into passage documents that point back to it.
+
+    Returns:
+        list: Dicts with the passage '_id', 'parent_id', 'position', 'start', 'end' and 'text'.
+    """
+    passages = []
+    for position, (start, end) in enumerate(passage_spans(text, size, overlap)):
+        passages.append({
+            '_id': f'{paper_id}:{position}',
+            'parent_id': paper_id,
+            'position': position,
+            'start': int(start),
+            'end': int(end),
+            # Whitespace is normalized but punctuation kept, it matters to the encoder
+            'text': ' '.join(text[start:end].split())
+        })
+    return passages
+
+
+def chunk_papers(papers, size=PASSAGE_WORDS, overlap=OVERLAP_WORDS):
+    """Chunks a batch of (paper_id, text) pairs; the unit of work handed to pool workers."""
+    return [passage for paper_id, text in papers for passage in chunk_paper(paper_id, text, size, overlap)]
+
+
+def parent_id(passage_id):
+    return passage_id.rsplit(':', 1)[0]
@@ -0,0 +1,191 @@
+import json
+import os
+
+import numpy as np
+
+# The id snapshot is rewritten once the rows logged since it outnumber both the
+# rows in the store and this, so rewriting costs O(1) per changed row amortized
+MIN_COMPACT_ROWS = 1024
+
+
+class EmbeddingStore:
+    """
+    On-disk store of document embeddings backed by a memory-mapped matrix.
+
+    Each document id maps to a row and to the hash of the content it was
+    embedded from, so callers can skip documents that have not changed. The
+    vectors live in a raw float32 (or float16) file that is memory-mapped and
+    grown by doubling. The id mapping is kept as a JSON snapshot plus a log:
+    a flush appends the rows changed since the previous one, and the
+    snapshot is only rewritten once the log holds as many rows as the store.
+
+    Args:
+        path (str): Directory holding the store.
+        dim (int): Embedding dimension.
+        dtype (str, optional): 'float32' or 'float16'.
+    """
+
+    def __init__(self, path, dim, dtype='float32'):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, 'index.json')
+        self.vectors_path = os.path.join(path, 'vectors.bin')
+        self.rows = 0
+        self.doc_ids = []
+        self.hashes = []
+        # Every snapshot starts a new log, so a log is never replayed onto a newer snapshot
+        self.log_seq = 0
+        self._logged_rows = 0
+        self._flushed_rows = 0
+        self._dirty = set()
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta['dim'] != dim or meta['dtype'] != dtype:
+                raise ValueError(f"Store at {path} holds {meta['dtype']} vectors of dim {meta['dim']}, "
+                                 f"not {dtype} of dim {dim}")
+            self.rows = meta['rows']
+            self.doc_ids = meta['doc_ids']
+            self.hashes = meta['hashes']
+            self.log_seq = meta.get('log_seq', 0)
+            self._replay()
+            self._flushed_rows = self.rows
+
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+        self._vectors = None
+        self._open(max(self.rows, 1024))
+
+    @property
+    def log_path(self):
+        return os.path.join(self.path, f'index.{self.log_seq}.log')
+
+    def _replay(self):
+        """Applies the flushes logged since the snapshot, one JSON line each."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A flush cut short by a crash, the vectors it described are lost with it
+                    break
+                for row, doc_id, content_hash in entry['set']:
+                    if row >= len(self.doc_ids):
+                        grow = row + 1 - len(self.doc_ids)
+                        self.doc_ids.extend([None] * grow)
+                        self.hashes.extend([None] * grow)
+                    self.doc_ids[row] = doc_id
+                    self.hashes[row] = content_hash
+                self.rows = entry['rows']
+                del self.doc_ids[self.rows:], self.hashes[self.rows:]
+                self._logged_rows += len(entry['set'])
+
+    def _open(self, capacity):
+        size = capacity * self.dim * self.dtype.itemsize
+        with open(self.vectors_path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r+', shape=(capacity, self.dim))
+
+    def __len__(self):
+        return self.rows
+
+    def needs_embedding(self, doc_id, content_hash):
+        """True if doc_id is unknown or was embedded from different content."""
+        row = self.row_of.get(doc_id)
+        return row is None or self.hashes[row] != content_hash
+
+    def put(self, doc_ids, content_hashes, vectors):
+        """
+        Writes vectors for doc_ids, overwriting changed documents in place and appending new ones.
+        """
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        new = sum(1 for doc_id in doc_ids if doc_id not in self.row_of)
+        if self.rows + new > self._vectors.shape[0]:
+            self._open(max(self._vectors.shape[0] * 2, self.rows + new))
+
+        for doc_id, content_hash, vector in zip(doc_ids, content_hashes, vectors):
+            row = self.row_of.get(doc_id)
+            if row is None:
+                row = self.rows
+                self.rows += 1
+                self.row_of[doc_id] = row
+                self.doc_ids.append(doc_id)
+                self.hashes.append(content_hash)
+            else:
+                self.hashes[row] = content_hash
+            self._vectors[row] = vector
+            self._dirty.add(row)
+
+    def remove(self, doc_ids):
+        """
+        Drops doc_ids from the store, moving the last rows into the ones they free.
+
+        Returns:
+            int: Number of documents that were in the store.
+        """
+        removed = 0
+        for doc_id in doc_ids:
+            row = self.row_of.pop(doc_id, None)
+            if row is None:
+                continue
+            last = self.rows - 1
+            if row != last:
+                moved = self.doc_ids[last]
+                self._vectors[row] = self._vectors[last]
+                self.doc_ids[row] = moved
+                self.hashes[row] = self.hashes[last]
+                self.row_of[moved] = row
+                self._dirty.add(row)
+            self.doc_ids.pop()
+            self.hashes.pop()
+            self.rows -= 1
+            removed += 1
+        return removed
+
+    def vectors(self):
+        """Memory-mapped view of all stored vectors, in row order."""
+        return self._vectors[:self.rows]
+
+    def get(self, doc_ids):
+        return self._vectors[[self.row_of[doc_id] for doc_id in doc_ids]]
+
+    def flush(self):
+        """Writes the vectors, then logs the rows changed since the last flush."""
+        self._vectors.flush()
+        changed = sorted(row for row in self._dirty if row < self.rows)
+        self._dirty.clear()
+        if not changed and self.rows == self._flushed_rows:
+            return
+        self._flushed_rows = self.rows
+        if not os.path.exists(self.meta_path) or self._logged_rows + len(changed) > max(self.rows, MIN_COMPACT_ROWS):
+            self._snapshot()
+            return
+        entry = {'rows': self.rows, 'set': [[row, self.doc_ids[row], self.hashes[row]] for row in changed]}
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self._logged_rows += len(changed)
+
+    def _snapshot(self):
+        old_log = self.log_path
+        self.log_seq += 1
+        tmp_path = f'{self.meta_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'dim': self.dim,
+                'dtype': self.dtype.name,
+                'rows': self.rows,
+                'doc_ids': self.doc_ids,
+                'hashes': self.hashes,
+                'log_seq': self.log_seq
+            }, f)
+        os.replace(tmp_path, self.meta_path)
+        if os.path.exists(old_log):
+            os.remove(old_log)
+        self._logged_rows = 0
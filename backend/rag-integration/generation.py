@@ -1,8 +1,19 @@
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
 import numpy as np
+import torch
+from transformers import GPT2LMHeadModel, GPT2Tokenizer
+
+MODEL_NAME = 'gpt2'
+MAX_NEW_TOKENS = 200
+# Concurrent requests arriving within this window are generated as one batch
+BATCH_WINDOW = 0.01
+MAX_BATCH_SIZE = 8
 
-tokenizer = GPT2Tokenizer.from_pretrained('gpt2')
-gpt2_model = GPT2LMHeadModel.from_pretrained('gpt2')
 
 def retrieve_documents(query, index, docs, sentence_model):
     query_embedding = sentence_model.encode([query])
@@ -10,9 +21,236 @@ def retrieve_documents(query, index, docs, sentence_model):
     relevant_docs = [docs[i] for i in I[0]]
     return relevant_docs
 
+
+def conv1d_to_linear(model):
+    """
+    Replaces the Conv1D layers of a GPT-2 model with equivalent nn.Linear ones, in place.
+
+    Conv1D computes x @ weight + bias with weight stored as (in, out), the
+    transpose of nn.Linear. Dynamic quantization only knows nn.Linear, so
+    without this it would skip every attention and MLP projection.
+    """
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                n_in, n_out = child.weight.shape
+                linear = torch.nn.Linear(n_in, n_out)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+
+class GenerationEngine:
+    """
+    Keeps one warm GPT-2 model per process and serves generation requests against it.
+
+    The prompt is packed to fit the model's context window: retrieved
+    documents are taken in ranking order until the token budget left after
+    the query and the new tokens runs out, and the last one is trimmed.
+    Concurrent generate() calls are micro-batched on a worker thread; requests
+    whose prompts and answers cannot share the context window run in separate groups.
+    stream() decodes greedily token by token, reusing the KV cache of the
+    previous step, and yields text as soon as each token is produced.
+
+    Args:
+        model_name (str, optional): Hugging Face model to load.
+        quantize (bool, optional): Apply int8 dynamic quantization to every projection for CPU inference.
+        max_new_tokens (int, optional): Tokens generated per request.
+        batch_window (float, optional): Seconds the batcher waits for more requests.
+        max_batch_size (int, optional): Requests generated together at most.
+        model, tokenizer (optional): Already loaded model and tokenizer to use instead of model_name.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, quantize=False, max_new_tokens=MAX_NEW_TOKENS,
+                 batch_window=BATCH_WINDOW, max_batch_size=MAX_BATCH_SIZE, model=None, tokenizer=None):
+        self.tokenizer = tokenizer or GPT2Tokenizer.from_pretrained(model_name)
+        # GPT-2 has no pad token; pad on the left so every prompt ends where generation starts
+        self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = 'left'
+
+        model = model or GPT2LMHeadModel.from_pretrained(model_name)
+        model.eval()
+        if quantize:
+            # The blocks use Conv1D, which quantize_dynamic would leave in float
+            model = torch.quantization.quantize_dynamic(conv1d_to_linear(model), {torch.nn.Linear},
+                                                        dtype=torch.qint8)
+        self.model = model
+        self.context_size = model.config.n_positions
+        self.max_new_tokens = max_new_tokens
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._batch_loop, daemon=True)
+        self._worker.start()
+        self.warm_up()
+
+    def warm_up(self):
+        """Runs one tiny generation so the first real request does not pay for lazy initialization."""
+        with torch.no_grad():
+            self.model.generate(**self.tokenizer(['Hello'], return_tensors='pt'), max_new_tokens=1,
+                                pad_token_id=self.tokenizer.eos_token_id)
+
+    def pack_context(self, query, relevant_docs, max_new_tokens=None):
+        """
+        Builds prompt token ids from the query and as many ranked documents as fit.
+
+        Args:
+            query (str): The question.
+            relevant_docs (list): Documents, best first.
+            max_new_tokens (int, optional): Tokens reserved for the answer.
+
+        Returns:
+            list: Token ids of the prompt, at most context_size - max_new_tokens long.
+        """
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        query_ids = self.tokenizer.encode(query)
+        budget = self.context_size - max_new_tokens
+        if len(query_ids) >= budget:
+            # Keep the end of an overlong question, it usually holds the actual ask
+            return query_ids[-budget:]
+
+        separator = self.tokenizer.encode(' ')
+        context_ids = []
+        remaining = budget - len(query_ids)
+        for doc in relevant_docs:
+            doc_ids = separator + self.tokenizer.encode(doc)
+            if len(doc_ids) > remaining:
+                context_ids.extend(doc_ids[:remaining])
+                break
+            context_ids.extend(doc_ids)
+            remaining -= len(doc_ids)
+        return query_ids + context_ids
+
+    def generate(self, query, relevant_docs, max_new_tokens=None):
+        """
+        Generates an answer; blocks until the batch holding this request has run.
+        """
+        return self.submit(query, relevant_docs, max_new_tokens).result()
+
+    def submit(self, query, relevant_docs, max_new_tokens=None):
+        """Queues a request for the batcher and returns a Future with the answer text."""
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        if max_new_tokens >= self.context_size:
+            raise ValueError(f'max_new_tokens must be below the context size of {self.context_size}')
+        future = Future()
+        prompt_ids = self.pack_context(query, relevant_docs, max_new_tokens)
+        self._requests.put((prompt_ids, max_new_tokens, future))
+        return future
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                # Requests cancelled while queued are dropped, the rest can no longer be cancelled
+                batch = [request for request in batch if request[2].set_running_or_notify_cancel()]
+                for group in self._fitting_groups(batch):
+                    self._run_group(group)
+            except Exception:
+                # This thread serves every request, it must outlive any one batch
+                logging.exception("Error in the generation batch loop")
+
+    def _fitting_groups(self, batch):
+        """
+        Splits a batch into groups that generate together without shortening anyone's answer.
+
+        Prompts are left padded to the longest one in their group, and all of
+        them generate as many tokens as the largest request, so a group fits
+        while its longest prompt plus its largest token count stays within the context.
+        """
+        groups = []
+        for request in sorted(batch, key=lambda request: len(request[0]), reverse=True):
+            prompt_ids, tokens, _ = request
+            for group in groups:
+                longest = len(group[0][0])
+                if longest + max(tokens, max(t for _, t, _ in group)) <= self.context_size:
+                    group.append(request)
+                    break
+            else:
+                groups.append([request])
+        return groups
+
+    def _run_group(self, group):
+        try:
+            for future, text in zip((future for _, _, future in group), self._run_batch(group)):
+                future.set_result(text)
+        except Exception as e:
+            logging.error("Error generating batch", exc_info=True)
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _run_batch(self, batch):
+        """Generates a group from _fitting_groups and returns the answer texts in order."""
+        prompts = [prompt_ids for prompt_ids, _, _ in batch]
+        max_new_tokens = max(tokens for _, tokens, _ in batch)
+        longest = max(len(prompt_ids) for prompt_ids in prompts)
+        pad_id = self.tokenizer.pad_token_id
+        input_ids = torch.tensor([[pad_id] * (longest - len(p)) + p for p in prompts])
+        attention_mask = torch.tensor([[0] * (longest - len(p)) + [1] * len(p) for p in prompts])
+
+        with torch.no_grad():
+            outputs = self.model.generate(
+                input_ids=input_ids, attention_mask=attention_mask, max_new_tokens=max_new_tokens,
+                pad_token_id=pad_id, use_cache=True
+            )
+        return [
+            self.tokenizer.decode(torch.cat([torch.tensor(prompt_ids), output[longest:longest + tokens]]),
+                                  skip_special_tokens=True)
+            for (prompt_ids, tokens, _), output in zip(batch, outputs)
+        ]
+
+    def stream(self, query, relevant_docs, max_new_tokens=None):
+        """
+        Yields the answer text piece by piece as tokens are generated.
+        """
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        prompt_ids = self.pack_context(query, relevant_docs, max_new_tokens)
+        input_ids = torch.tensor([prompt_ids])
+        past_key_values = None
+        generated = []
+        emitted = ''
+        with torch.no_grad():
+            for _ in range(max_new_tokens):
+                # After the first step only the newest token is fed, the rest comes from the KV cache
+                outputs = self.model(input_ids=input_ids, past_key_values=past_key_values, use_cache=True)
+                past_key_values = outputs.past_key_values
+                next_token = int(outputs.logits[0, -1].argmax())
+                if next_token == self.tokenizer.eos_token_id:
+                    break
+                generated.append(next_token)
+                # Decode everything so far: multi-byte characters can span tokens
+                text = self.tokenizer.decode(generated, skip_special_tokens=True)
+                if len(text) > len(emitted) and not text.endswith('�'):
+                    yield text[len(emitted):]
+                    emitted = text
+                input_ids = torch.tensor([[next_token]])
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(**kwargs):
+    """Returns the process-wide engine, loading the model on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = GenerationEngine(**kwargs)
+        return _engine
+
+
 def generate_response(query, relevant_docs):
-    context = " ".join(relevant_docs)
-    inputs = tokenizer.encode(query + " " + context, return_tensors='pt')
-    outputs = gpt2_model.generate(inputs, max_length=500, num_return_sequences=1)
-    response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    return response
+    return get_engine().generate(query, relevant_docs)
@@ -1,6 +1,17 @@
+import json
+import logging
+import os
+import uuid
 import faiss
 import numpy as np
 
+INDEXES_DIR = os.environ.get('INDEXES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'indexes'))
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+# faiss recommends at least 39 training points per IVF centroid
+TRAIN_POINTS_PER_CENTROID = 39
+# Centroids of each product quantizer sub-vector, 8 bits per code
+PQ_CENTROIDS = 256
+
 def create_faiss_index(embeddings):
     d = embeddings.shape[1]
     index = faiss.IndexFlatL2(d)
@@ -15,3 +26,331 @@ async def create_indexes(engineering_embeddings, ethics_embeddings, policy_embed
     return engineering_index, ethics_index, policy_index
 
 
+def build_index(d, index_type='flat', nlist=256, pq_m=16, hnsw_m=32):
+    """
+    Creates an empty index of the requested type, wrapped so vectors carry our own int64 ids.
+
+    Args:
+        d (int): Vector dimension.
+        index_type (str): One of INDEX_TYPES.
+        nlist (int, optional): IVF cells.
+        pq_m (int, optional): Product quantizer sub-vectors for 'ivf_pq', must divide d.
+        hnsw_m (int, optional): Neighbours per node for 'hnsw'.
+    """
+    if index_type == 'flat':
+        index = faiss.IndexFlatL2(d)
+    elif index_type == 'ivf_flat':
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(d), d, nlist)
+    elif index_type == 'ivf_pq':
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(d), d, nlist, pq_m, 8)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(d, hnsw_m)
+    else:
+        raise ValueError(f'Unknown index type {index_type!r}, expected one of {INDEX_TYPES}')
+    return faiss.IndexIDMap2(index)
+
+
+class PersistentIndex:
+    """
+    FAISS index saved to disk, with a mapping from FAISS ids back to MongoDB document ids.
+
+    Vectors can be appended after the index was built. Every change bumps
+    version, which lets caches of search results notice the index moved on.
+
+    IVF indexes cannot be trained on fewer vectors than they have centroids.
+    Until min_train_points vectors are there, they go to a flat index, which
+    is exact and fast enough at that size; the add that reaches the mark
+    trains the IVF index on them and moves them over.
+
+    Args:
+        path (str): Directory the index is saved to.
+        dim (int): Vector dimension.
+        index_type (str, optional): One of INDEX_TYPES.
+        **params: Passed on to build_index.
+    """
+
+    def __init__(self, path, dim, index_type='flat', **params):
+        self.path = path
+        self.dim = dim
+        self.index_type = index_type
+        self.params = params
+        self.index = build_index(dim, index_type, **params)
+        self.doc_ids = []
+        self.hashes = []
+        self.id_of = {}
+        # A rebuilt index gets a new generation, so (generation, version) never repeats
+        self.generation = uuid.uuid4().hex
+        self.version = 0
+
+    @property
+    def index_file(self):
+        return os.path.join(self.path, 'index.faiss')
+
+    @property
+    def meta_file(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def __len__(self):
+        return self.index.ntotal
+
+    @property
+    def min_train_points(self):
+        """Vectors needed to train the IVF quantizers well, 0 for index types without training."""
+        if not self.index_type.startswith('ivf'):
+            return 0
+        points = self.params.get('nlist', 256) * TRAIN_POINTS_PER_CENTROID
+        if self.index_type == 'ivf_pq':
+            points = max(points, PQ_CENTROIDS)
+        return points
+
+    @property
+    def provisional(self):
+        """True while an IVF index holds its vectors in a flat index, waiting for enough to train on."""
+        return self.index_type.startswith('ivf') and not isinstance(faiss.downcast_index(self.index.index), faiss.IndexIVF)
+
+    @property
+    def state(self):
+        """Changes whenever the index content does, for invalidating cached search results."""
+        return (self.generation, self.version)
+
+    def train(self, vectors, sample_size=None, seed=0):
+        """
+        Trains IVF quantizers on a random sample of vectors. Flat and HNSW indexes need no training.
+
+        Given fewer than min_train_points vectors, an IVF index falls back to a flat one instead.
+        """
+        if self.index.is_trained:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) < self.min_train_points:
+            logging.info(f'{len(vectors)} vectors are too few to train {self.index_type} on, '
+                         f'using a flat index until there are {self.min_train_points}')
+            self.index = build_index(self.dim, 'flat')
+            return
+        if sample_size is None:
+            sample_size = self.min_train_points
+        if len(vectors) > sample_size:
+            rows = np.random.default_rng(seed).choice(len(vectors), sample_size, replace=False)
+            vectors = vectors[np.sort(rows)]
+        self.index.train(vectors)
+
+    def add(self, vectors, doc_ids, content_hashes=None):
+        """
+        Appends vectors for doc_ids. Documents already in the index are replaced.
+
+        Args:
+            vectors (np.ndarray): Vectors, one row per document.
+            doc_ids (list): MongoDB document ids as strings.
+            content_hashes (list, optional): Hash of the content each vector was embedded from.
+        """
+        if content_hashes is None:
+            content_hashes = [None] * len(doc_ids)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not self.index.is_trained:
+            self.train(vectors)
+
+        replaced = [self.id_of[doc_id] for doc_id in doc_ids if doc_id in self.id_of]
+        if replaced:
+            try:
+                self.index.remove_ids(np.array(replaced, dtype=np.int64))
+            except RuntimeError:
+                # HNSW cannot remove vectors: orphan the old ids instead, search skips them
+                for faiss_id in replaced:
+                    del self.id_of[self.doc_ids[faiss_id]]
+                    self.doc_ids[faiss_id] = None
+
+        ids = []
+        for doc_id, content_hash in zip(doc_ids, content_hashes):
+            faiss_id = self.id_of.get(doc_id)
+            if faiss_id is None:
+                faiss_id = len(self.doc_ids)
+                self.id_of[doc_id] = faiss_id
+                self.doc_ids.append(doc_id)
+                self.hashes.append(content_hash)
+            else:
+                self.hashes[faiss_id] = content_hash
+            ids.append(faiss_id)
+        self.index.add_with_ids(vectors, np.array(ids, dtype=np.int64))
+        if self.provisional and self.index.ntotal >= self.min_train_points:
+            self._train_provisional()
+        self.version += 1
+
+    def remove(self, doc_ids):
+        """
+        Drops documents from the index. An HNSW index keeps their vectors, orphaned, and search skips them.
+
+        Returns:
+            int: Number of documents that were in the index.
+        """
+        removed = [self.id_of.pop(doc_id) for doc_id in doc_ids if doc_id in self.id_of]
+        if not removed:
+            return 0
+        try:
+            self.index.remove_ids(np.array(removed, dtype=np.int64))
+        except RuntimeError:
+            # HNSW cannot remove vectors, clearing their doc ids below orphans them
+            pass
+        for faiss_id in removed:
+            self.doc_ids[faiss_id] = None
+        self.version += 1
+        return len(removed)
+
+    def _train_provisional(self):
+        flat = self.index
+        ids = faiss.vector_to_array(flat.id_map)
+        vectors = flat.index.reconstruct_n(0, flat.ntotal)
+        self.index = build_index(self.dim, self.index_type, **self.params)
+        self.train(vectors)
+        self.index.add_with_ids(vectors, ids)
+        logging.info(f'Trained {self.index_type} on {len(ids)} vectors')
+
+    def sync_from_store(self, store, id_prefix=''):
+        """
+        Adds the vectors of an EmbeddingStore that are missing from the index or were re-embedded,
+        and removes the documents under id_prefix that the store no longer holds.
+
+        Args:
+            store (EmbeddingStore): Source of the vectors.
+            id_prefix (str, optional): Prepended to the store's document ids, e.g. to tag their domain.
+
+        Returns:
+            int: Number of vectors added.
+        """
+        stale = [doc_id for doc_id in self.id_of
+                 if doc_id.startswith(id_prefix) and doc_id[len(id_prefix):] not in store.row_of]
+        if stale:
+            logging.info(f'Removing {self.remove(stale)} documents no longer in {store.path}')
+        rows = []
+        for row, doc_id in enumerate(store.doc_ids):
+            faiss_id = self.id_of.get(id_prefix + doc_id)
+            if faiss_id is None or self.hashes[faiss_id] != store.hashes[row]:
+                rows.append(row)
+        if rows:
+            vectors = store.vectors()[rows]
+            if not self.index.is_trained:
+                self.train(store.vectors())
+            self.add(vectors, [id_prefix + store.doc_ids[row] for row in rows], [store.hashes[row] for row in rows])
+        return len(rows)
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """
+        Trades recall for speed: IVF cells probed per query, or HNSW candidate list size.
+
+        Parameters the index in use does not have are ignored, such as nprobe
+        while an IVF index is still provisional and searches exactly.
+        """
+        params = faiss.ParameterSpace()
+        index = faiss.downcast_index(self.index.index)
+        if nprobe is not None and isinstance(index, faiss.IndexIVF):
+            params.set_index_parameter(self.index, 'nprobe', nprobe)
+        if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+            params.set_index_parameter(self.index, 'efSearch', ef_search)
+
+    def search(self, queries, k=5):
+        """
+        Searches the index.
+
+        Returns:
+            tuple: (list of distance arrays, list of lists of document ids), one entry per query.
+                   Missing and orphaned results are dropped from both, so they stay aligned.
+        """
+        distances, ids = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        kept_distances, doc_ids = [], []
+        for row_distances, row_ids in zip(distances, ids):
+            keep = [i >= 0 and self.doc_ids[i] is not None for i in row_ids]
+            kept_distances.append(row_distances[keep])
+            doc_ids.append([self.doc_ids[i] for i, kept in zip(row_ids, keep) if kept])
+        return kept_distances, doc_ids
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        faiss.write_index(self.index, self.index_file)
+        with open(self.meta_file, 'w') as f:
+            json.dump({
+                'dim': self.dim,
+                'index_type': self.index_type,
+                'params': self.params,
+                'generation': self.generation,
+                'version': self.version,
+                'doc_ids': self.doc_ids,
+                'hashes': self.hashes
+            }, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a saved index.
+
+        With mmap=True the inverted lists of IVF indexes are memory-mapped rather
+        than read into RAM, which makes loading cheap but leaves the index read
+        only. Load with mmap=False to append to it.
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        persistent = cls(path, meta['dim'], meta['index_type'], **meta['params'])
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        persistent.index = faiss.read_index(persistent.index_file, flags)
+        persistent.doc_ids = meta['doc_ids']
+        persistent.hashes = meta['hashes']
+        persistent.id_of = {doc_id: i for i, doc_id in enumerate(persistent.doc_ids) if doc_id is not None}
+        persistent.generation = meta['generation']
+        persistent.version = meta['version']
+        return persistent
+
+
+def open_index(name, dim, index_type='flat', **params):
+    """
+    Loads the named index from INDEXES_DIR for appending, or creates an empty one.
+    """
+    path = os.path.join(INDEXES_DIR, name)
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        persistent = PersistentIndex.load(path, mmap=False)
+        if persistent.index_type != index_type:
+            logging.warning(f'Index {name} is {persistent.index_type}, ignoring requested {index_type}')
+        return persistent
+    return PersistentIndex(path, dim, index_type, **params)
+
+
+def update_indexes(stores, index_type='flat', **params):
+    """
+    Brings one persistent index per collection up to date with its EmbeddingStore and saves it.
+
+    Args:
+        stores (dict): Collection name to EmbeddingStore.
+
+    Returns:
+        dict: Collection name to PersistentIndex.
+    """
+    indexes = {}
+    for name, store in stores.items():
+        persistent = open_index(name, store.dim, index_type, **params)
+        version = persistent.version
+        added = persistent.sync_from_store(store)
+        if persistent.version != version:
+            persistent.save()
+        logging.info(f'{name}: added {added} vectors, index holds {len(persistent)}')
+        indexes[name] = persistent
+    return indexes
+
+
+def update_unified_index(stores, index_type='flat', name='unified', **params):
+    """
+    Keeps a single index over all collections, with document ids tagged as '<collection>:<id>'.
+
+    Args:
+        stores (dict): Collection name to EmbeddingStore.
+
+    Returns:
+        PersistentIndex: The saved unified index.
+    """
+    dim = next(iter(stores.values())).dim
+    persistent = open_index(name, dim, index_type, **params)
+    if not persistent.index.is_trained:
+        # Train on all domains together so the IVF cells cover every one of them
+        persistent.train(np.concatenate([store.vectors() for store in stores.values()]))
+    version = persistent.version
+    added = sum(persistent.sync_from_store(store, id_prefix=f'{collection}:') for collection, store in stores.items())
+    if persistent.version != version:
+        persistent.save()
+    logging.info(f'{name}: added {added} vectors, index holds {len(persistent)}')
+    return persistent
@@ -1,13 +1,36 @@
 # data_processing.py
+import hashlib
+import os
 import pymongo
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from sentence_transformers import SentenceTransformer
 import logging
+from pymongo import InsertOne
+from embedding_store import EmbeddingStore
+from chunking import chunk_papers
+from bm25 import open_bm25_index
 
-MONGODB_URI = "mongodb://localhost:27017"
-DATABASE_NAME = "researchPapers"
-client = pymongo.MongoClient(MONGODB_URI)
-db = client[DATABASE_NAME]
+# Papers are read through the data layer shared with the backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import paper_db
+
+db = paper_db.get_db()
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_DIM = 384
+EMBEDDINGS_DIR = os.environ.get('EMBEDDINGS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embeddings'))
+COLLECTIONS = ['engineering_papers', 'ethics_papers', 'policy_papers']
+# Passages of all collections, and the content hash each paper was last chunked from
+PASSAGES_COLLECTION = 'passages'
+CHUNKED_COLLECTION = 'chunked_papers'
+PAPER_TEXT_PROJECTION = {'content': 1, 'summary': 1}
+# Papers marked at ingest as near-duplicates of another (see near_dup) are not embedded or indexed
+CANONICAL_PAPERS = {'duplicate_of': None}
+# Lexical index over all collections, fused with the unified FAISS index at query time
+BM25_DIR = os.environ.get('BM25_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bm25'))
 
 
 def clean_text(text):
@@ -16,7 +39,7 @@ def clean_text(text):
     return text.strip()
 
 def get_papers_from_collection(collection_name):
-    papers = db[collection_name].find()
+    papers = db[collection_name].find(CANONICAL_PAPERS)
     documents = []
     for paper in papers:
         content = paper.get('content', '')
@@ -28,7 +51,7 @@ def get_papers_from_collection(collection_name):
     return documents
 
 def generate_embeddings():
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = SentenceTransformer(MODEL_NAME)
 
     engineering_docs = get_papers_from_collection('engineering_papers')
     ethics_docs = get_papers_from_collection('ethics_papers')
@@ -40,8 +63,212 @@ def generate_embeddings():
 
     return engineering_docs, ethics_docs, policy_docs, engineering_embeddings, ethics_embeddings, policy_embeddings
 
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def paper_text(paper):
+    """Full text of a paper, or its abstract for harvested arXiv entries that only carry that."""
+    return paper.get('content') or paper.get('summary', '')
+
+def iter_paper_batches(collection_name, batch_size=256):
+    """
+    Streams cleaned paper contents from MongoDB in batches instead of loading the collection.
+
+    Yields:
+        tuple: (list of document ids as strings, list of cleaned contents).
+    """
+    for papers in paper_db.iter_batches(db[collection_name], CANONICAL_PAPERS, PAPER_TEXT_PROJECTION, batch_size):
+        doc_ids, documents = [], []
+        for paper in papers:
+            content = paper_text(paper)
+            if not content:
+                logging.warning(f'Found paper with no content: {paper.get("_id")}')
+                continue
+            doc_ids.append(str(paper['_id']))
+            documents.append(clean_text(content))
+        if doc_ids:
+            yield doc_ids, documents
+
+def embed_batch(store, model, doc_ids, documents, batch_size=64, pool=None):
+    """
+    Embeds the documents of one batch that are new or changed and writes them to store.
+
+    Args:
+        store (EmbeddingStore): Where the vectors are kept.
+        model (SentenceTransformer): Encoder.
+        doc_ids (list): Document ids.
+        documents (list): Cleaned contents, aligned with doc_ids.
+        batch_size (int, optional): Encoder batch size.
+        pool (dict, optional): Pool from model.start_multi_process_pool() to encode across processes.
+
+    Returns:
+        int: Number of documents encoded.
+    """
+    hashes = [content_hash(document) for document in documents]
+    todo = [i for i, (doc_id, h) in enumerate(zip(doc_ids, hashes)) if store.needs_embedding(doc_id, h)]
+    if not todo:
+        return 0
+
+    texts = [documents[i] for i in todo]
+    if pool is not None:
+        vectors = model.encode_multi_process(texts, pool, batch_size=batch_size)
+    else:
+        vectors = model.encode(texts, batch_size=batch_size)
+    store.put([doc_ids[i] for i in todo], [hashes[i] for i in todo], vectors)
+    return len(todo)
+
+def iter_passage_batches(collection_name, batch_size=256):
+    """
+    Streams the passages of one paper collection in batches.
+
+    Yields:
+        tuple: (list of passage ids, list of passage texts).
+    """
+    query = {'collection': collection_name}
+    for passages in paper_db.iter_batches(db[PASSAGES_COLLECTION], query, {'text': 1}, batch_size):
+        yield [passage['_id'] for passage in passages], [passage['text'] for passage in passages]
+
+def store_passages(collection_name, papers, passages):
+    """Replaces the passages of the given papers and records the content they were chunked from."""
+    paper_ids = [paper_id for paper_id, _ in papers]
+    db[PASSAGES_COLLECTION].delete_many({'parent_id': {'$in': paper_ids}})
+    if passages:
+        for passage in passages:
+            passage['collection'] = collection_name
+        db[PASSAGES_COLLECTION].bulk_write([InsertOne(passage) for passage in passages], ordered=False)
+    db[CHUNKED_COLLECTION].bulk_write([
+        pymongo.UpdateOne({'_id': paper_id}, {'$set': {'hash': content_hash(content)}}, upsert=True)
+        for paper_id, content in papers
+    ], ordered=False)
+
+def chunk_collection(collection_name, workers=None, batch_size=256):
+    """
+    Splits the papers of a collection into overlapping passages, in parallel across processes.
+
+    Papers whose content is unchanged since they were last chunked are skipped.
+
+    Returns:
+        int: Number of papers chunked.
+    """
+    chunked = {state['_id']: state['hash'] for state in db[CHUNKED_COLLECTION].find()}
+    workers = workers or os.cpu_count()
+
+    def batches():
+        batch = []
+        for paper in db[collection_name].find(CANONICAL_PAPERS, PAPER_TEXT_PROJECTION).batch_size(batch_size):
+            content = paper_text(paper)
+            paper_id = str(paper['_id'])
+            if content and chunked.get(paper_id) != content_hash(content):
+                batch.append((paper_id, content))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    count = 0
+    with ProcessPoolExecutor(workers) as pool:
+        # Keep a bounded number of batches in flight so the collection is never all in memory
+        pending = []
+        for batch in batches():
+            pending.append((batch, pool.submit(chunk_papers, batch)))
+            if len(pending) >= workers * 2:
+                papers, future = pending.pop(0)
+                store_passages(collection_name, papers, future.result())
+                count += len(papers)
+        for papers, future in pending:
+            store_passages(collection_name, papers, future.result())
+            count += len(papers)
+    logging.info(f'{collection_name}: chunked {count} papers into passages')
+    return count
+
+def get_passages(passage_ids):
+    """Returns passage documents in the order of passage_ids, for handing to generation."""
+    passages = {passage['_id']: passage for passage in db[PASSAGES_COLLECTION].find({'_id': {'$in': list(passage_ids)}})}
+    return [passages[passage_id] for passage_id in passage_ids if passage_id in passages]
+
+def update_embeddings(batch_size=64, read_batch_size=1024, workers=0, dtype='float32', store_dir=EMBEDDINGS_DIR,
+                      passages=False):
+    """
+    Incrementally embeds the three paper collections into one on-disk store per collection.
 
+    Only papers that are new or whose content hash changed since the last run
+    are encoded. With workers > 0 encoding is spread over that many CPU processes.
+    With passages=True the passages made by chunk_collection are embedded
+    instead of whole papers, into stores under store_dir/passages, and
+    passages no longer in the passages collection are removed from them.
 
+    Returns:
+        dict: Per collection, the EmbeddingStore and the number of documents encoded.
+    """
+    model = SentenceTransformer(MODEL_NAME)
+    pool = model.start_multi_process_pool(target_devices=['cpu'] * workers) if workers else None
+    results = {}
+    try:
+        for collection_name in COLLECTIONS:
+            if passages:
+                store = EmbeddingStore(os.path.join(store_dir, 'passages', collection_name), EMBEDDING_DIM, dtype=dtype)
+                batches = iter_passage_batches(collection_name, read_batch_size)
+            else:
+                store = EmbeddingStore(os.path.join(store_dir, collection_name), EMBEDDING_DIM, dtype=dtype)
+                batches = iter_paper_batches(collection_name, read_batch_size)
+            encoded = 0
+            seen = set()
+            start = time.perf_counter()
+            for doc_ids, documents in batches:
+                encoded += embed_batch(store, model, doc_ids, documents, batch_size, pool)
+                store.flush()
+                seen.update(doc_ids)
+            if passages:
+                # Papers re-chunked into fewer passages leave the old tail behind
+                removed = store.remove([doc_id for doc_id in store.doc_ids if doc_id not in seen])
+                if removed:
+                    store.flush()
+                    logging.info(f'{collection_name}: removed {removed} stale passages')
+            elapsed = time.perf_counter() - start
+            logging.info(f'{collection_name}: encoded {encoded} of {len(store)} papers in {elapsed:.1f}s')
+            results[collection_name] = {'store': store, 'encoded': encoded}
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+    return results
 
+def update_bm25_index(read_batch_size=1024, path=BM25_DIR, passages=False):
+    """
+    Incrementally indexes the three paper collections for BM25 search.
 
+    Document ids are tagged '<collection>:<id>' like those of the unified
+    FAISS index, so the two rankings can be fused. Only papers that are new
+    or whose content hash changed since the last run are indexed.
+    With passages=True passages are indexed instead, and passages no longer
+    in the passages collection are removed.
 
+    Returns:
+        BM25Index: The saved index.
+    """
+    index = open_bm25_index(os.path.join(path, 'passages') if passages else path)
+    added = removed = 0
+    seen = set()
+    for collection_name in COLLECTIONS:
+        batches = iter_passage_batches(collection_name, read_batch_size) if passages \
+            else iter_paper_batches(collection_name, read_batch_size)
+        for doc_ids, documents in batches:
+            tagged_ids, texts, hashes = [], [], []
+            for doc_id, document in zip(doc_ids, documents):
+                tagged_id, digest = f'{collection_name}:{doc_id}', content_hash(document)
+                seen.add(tagged_id)
+                if index.needs_update(tagged_id, digest):
+                    tagged_ids.append(tagged_id)
+                    texts.append(document)
+                    hashes.append(digest)
+            if tagged_ids:
+                index.add(tagged_ids, texts, hashes)
+                added += len(tagged_ids)
+    stale = [doc_id for doc_id in index.id_of if doc_id not in seen] if passages else []
+    if stale:
+        index.remove(stale)
+        removed = len(stale)
+    if added or removed:
+        index.save()
+    logging.info(f'bm25: indexed {added} and removed {removed} documents, index holds {len(index)}')
+    return index
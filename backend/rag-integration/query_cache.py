@@ -0,0 +1,86 @@
+import os
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+
+# The LRU cache is shared with the backend's bias routes
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lru_cache import LRUCache
+
+
+def normalize_query(query):
+    """Lower-cases and collapses whitespace so trivially different questions share cache entries."""
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+class QueryCache:
+    """
+    Two-level cache for the RAG retrieval path.
+
+    The first level maps normalized query text to its embedding, so repeated
+    questions skip the encoder. The second maps (query, k, domains) to the
+    retrieved hits for one state of the index. When the index is rebuilt or
+    appended to its state changes and the second level is dropped.
+
+    Args:
+        max_embeddings (int, optional): Query embeddings kept.
+        max_results (int, optional): Result lists kept.
+    """
+
+    def __init__(self, max_embeddings=10000, max_results=10000):
+        self.embeddings = LRUCache(max_embeddings, max_bytes=None)
+        self.results = LRUCache(max_results, max_bytes=None)
+        self.index_state = None
+        self.invalidations = 0
+        self.encode_seconds = 0.0
+        self.encoded = 0
+        self.search_seconds = 0.0
+        self.searched = 0
+        self._lock = threading.Lock()
+
+    def embed(self, model, queries, batch_size=256):
+        """
+        Returns embeddings for queries, encoding only the ones not cached, in one batch.
+        """
+        keys = [normalize_query(query) for query in queries]
+        vectors = [self.embeddings.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            start = time.perf_counter()
+            encoded = np.asarray(model.encode([queries[i] for i in missing], batch_size=batch_size), dtype=np.float32)
+            with self._lock:
+                self.encode_seconds += time.perf_counter() - start
+                self.encoded += len(missing)
+            for i, vector in zip(missing, encoded):
+                self.embeddings.put(keys[i], vector, vector.nbytes)
+                vectors[i] = vector
+        return np.stack(vectors)
+
+    def check_index(self, index):
+        """Drops cached results if the index changed since they were stored."""
+        with self._lock:
+            if index.state != self.index_state:
+                if self.index_state is not None:
+                    self.invalidations += 1
+                self.results.clear()
+                self.index_state = index.state
+
+    def result_key(self, query, k, domains):
+        return (normalize_query(query), k, tuple(sorted(domains)) if domains is not None else None)
+
+    def record_search(self, seconds, count):
+        with self._lock:
+            self.search_seconds += seconds
+            self.searched += count
+
+    def stats(self):
+        return {
+            'embeddings': self.embeddings.stats(),
+            'results': self.results.stats(),
+            'invalidations': self.invalidations,
+            'avg_encode_ms': 1000 * self.encode_seconds / self.encoded if self.encoded else 0.0,
+            'avg_search_ms': 1000 * self.search_seconds / self.searched if self.searched else 0.0
+        }
@@ -1,51 +1,236 @@
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import pymongo
-from pymongo import MongoClient
-import spacy
-from spacy.Summarization.v1 import Summarizer
+from pymongo import UpdateOne
+import io
+from summarization import SummaryService
+
+# The paper database and query layer are shared with the backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import paper_db
+from paper_queries import PaperQueries
 
 # Connect to MongoDB
-client = MongoClient("mongodb://localhost:27017/")
-db = client["researchPapers"]  # Assuming the database name from previous code
+db = paper_db.get_db()
+papers = PaperQueries(db)
+
+# Incremental trend counts: one document per (collection, n, ngram), the
+# harvested_at watermark per collection, and the title and summary each paper
+# was last counted with, so an edited paper's old n-grams can be taken back out
+TREND_NGRAMS_COLLECTION = "trend_ngrams"
+TREND_STATE_COLLECTION = "trend_state"
+TREND_COUNTED_COLLECTION = "trend_counted"
+SUMMARIES_COLLECTION = "paper_summaries"
+MAX_N_GRAM = 3
+TOP_K = 10
+READ_BATCH_SIZE = 1000
+
+def tokenize(text):
+  return [word.lower() for word in text.split() if word.isalnum()]
+
+def count_ngrams(papers, max_n=MAX_N_GRAM):
+  """
+  Counts unigrams up to max_n-grams of titles and abstracts in a single pass.
+
+  Args:
+      papers (iterable): Paper documents with 'title' and 'summary'.
+      max_n (int, optional): Longest n-gram counted.
+
+  Returns:
+      list: One Counter per n, index 0 holding unigrams. Keys are space-joined n-grams.
+  """
+  counters = [Counter() for _ in range(max_n)]
+  for paper in papers:
+    tokens = tokenize(f"{paper.get('title', '')} {paper.get('summary', '')}")
+    counters[0].update(tokens)
+    for n in range(2, max_n + 1):
+      # zip over shifted token lists builds every n-gram without a Python index loop
+      counters[n - 1].update(map(" ".join, zip(*(tokens[i:] for i in range(n)))))
+  return counters
+
+def _counted_key(collection_name, paper_id):
+  return f"{collection_name}:{paper_id}"
+
+def _count_partition(collection_name, query, lower, upper, max_n, last=False):
+  """
+  Counts the papers matching query in the [lower, upper) _id range of a
+  collection, or [lower, upper] for the last range. Papers counted before
+  with another title or summary contribute the difference. Runs in a worker
+  process, which gets its own pooled client.
+  """
+  database = paper_db.get_db()
+  query = dict(query, _id={"$gte": lower, "$lte" if last else "$lt": upper})
+  counters = [Counter() for _ in range(max_n)]
+  for batch in paper_db.iter_batches(database[collection_name], query, {"title": 1, "summary": 1}, READ_BATCH_SIZE):
+    keys = {_counted_key(collection_name, paper["_id"]): paper for paper in batch}
+    previous = {
+      counted["_id"]: counted
+      for counted in database[TREND_COUNTED_COLLECTION].find({"_id": {"$in": list(keys)}})
+    }
+    changed = {
+      key: paper for key, paper in keys.items()
+      if key not in previous or (previous[key].get("title"), previous[key].get("summary"))
+      != (paper.get("title"), paper.get("summary"))
+    }
+    if not changed:
+      continue
+    for total, counter in zip(counters, count_ngrams(changed.values(), max_n)):
+      total.update(counter)
+    for total, counter in zip(counters, count_ngrams([previous[key] for key in changed if key in previous], max_n)):
+      total.subtract(counter)
+    database[TREND_COUNTED_COLLECTION].bulk_write([
+      UpdateOne({"_id": key}, {"$set": {"title": paper.get("title"), "summary": paper.get("summary")}}, upsert=True)
+      for key, paper in changed.items()
+    ], ordered=False)
+  return counters
+
+def _partition_bounds(collection_name, query, partitions):
+  """Finds the first _id of roughly equal slices of the papers matching query, using the _id index only."""
+  total = db[collection_name].count_documents(query)
+  if not total:
+    return []
+  step = max(total // partitions, 1)
+  bounds = []
+  for offset in range(0, total, step):
+    first = db[collection_name].find(query, {"_id": 1}).sort("_id", 1).skip(offset).limit(1)
+    bounds.extend(paper["_id"] for paper in first)
+  return bounds
+
+def _uncounted(state):
+  """Query for papers harvested since the watermark of a trend state; all papers before the first update."""
+  if state is None:
+    return {}
+  if state.get("harvested_at") is None:
+    # Only papers stored before harvests were stamped had been counted
+    return {"harvested_at": {"$ne": None}}
+  return {"harvested_at": {"$gt": state["harvested_at"]}}
+
+def update_trend_counts(collection_name, max_n=MAX_N_GRAM, workers=None):
+  """
+  Adds the n-gram counts of papers harvested since the last update to the trend table.
+
+  The harvester stamps every paper it stores with harvested_at, so a paper
+  upserted again with a new title or summary is picked up like a new one,
+  and its old n-grams are subtracted. Papers to count are split into _id
+  ranges that are counted in parallel by a process pool (in this process
+  for a single worker), then the partial counters are merged and applied
+  with $inc, so only papers harvested since the previous run are ever read.
+
+  Returns:
+      int: Number of partitions counted.
+  """
+  state = db[TREND_STATE_COLLECTION].find_one({"_id": collection_name})
+  query = _uncounted(state)
+  stamped = {"$and": [query, {"harvested_at": {"$ne": None}}]}
+  newest_stamp = next(iter(db[collection_name].find(stamped, {"harvested_at": 1}).sort("harvested_at", -1).limit(1)), None)
+  watermark = newest_stamp["harvested_at"] if newest_stamp is not None else (state or {}).get("harvested_at")
+  if watermark is not None:
+    # Papers harvested while counting are left for the next update; unstamped
+    # ones only match before the first update
+    query = {"$and": [query, {"$or": [{"harvested_at": {"$lte": watermark}}, {"harvested_at": None}]}]}
+  newest = next(iter(db[collection_name].find(query, {"_id": 1}).sort("_id", -1).limit(1)), None)
+  if newest is None:
+    return 0
+
+  workers = workers or os.cpu_count()
+  starts = _partition_bounds(collection_name, query, workers)
+  ranges = list(zip(starts, starts[1:] + [newest["_id"]]))
+  arguments = [
+    (collection_name, query, lower, upper, max_n, i == len(ranges) - 1) for i, (lower, upper) in enumerate(ranges)
+  ]
+  totals = [Counter() for _ in range(max_n)]
+  if workers == 1:
+    partials = [_count_partition(*args) for args in arguments]
+  else:
+    with ProcessPoolExecutor(workers) as pool:
+      futures = [pool.submit(_count_partition, *args) for args in arguments]
+      partials = [future.result() for future in futures]
+  for partial in partials:
+    for total, counter in zip(totals, partial):
+      total.update(counter)
+
+  operations = [
+    UpdateOne({"collection": collection_name, "n": n, "ngram": ngram}, {"$inc": {"count": count}}, upsert=True)
+    for n, counter in enumerate(totals, start=1) for ngram, count in counter.items() if count
+  ]
+  for start in range(0, len(operations), READ_BATCH_SIZE):
+    db[TREND_NGRAMS_COLLECTION].bulk_write(operations[start:start + READ_BATCH_SIZE], ordered=False)
+  # N-grams that only edited-away text had are gone
+  db[TREND_NGRAMS_COLLECTION].delete_many({"collection": collection_name, "count": {"$lte": 0}})
+  db[TREND_STATE_COLLECTION].update_one(
+    {"_id": collection_name}, {"$set": {"harvested_at": watermark}, "$unset": {"last_id": ""}}, upsert=True
+  )
+  return len(ranges)
+
+def ensure_trend_indexes():
+  db[TREND_NGRAMS_COLLECTION].create_index(
+    [("collection", pymongo.ASCENDING), ("n", pymongo.ASCENDING), ("ngram", pymongo.ASCENDING)], unique=True
+  )
+  db[TREND_NGRAMS_COLLECTION].create_index(
+    [("collection", pymongo.ASCENDING), ("n", pymongo.ASCENDING), ("count", pymongo.DESCENDING)]
+  )
+
+def refresh_trends(collection_names, max_n=MAX_N_GRAM, workers=None):
+  """
+  Brings the trend table up to date with the papers harvested since the last refresh.
+
+  Run it after harvesting; identify_trends and identify_all_trends only read the table.
+
+  Returns:
+      dict: Partitions counted per collection.
+  """
+  ensure_trend_indexes()
+  return {name: update_trend_counts(name, max_n, workers) for name in collection_names}
+
+def _top_ngrams(collection_name, n, top_k):
+  top = db[TREND_NGRAMS_COLLECTION].find(
+    {"collection": collection_name, "n": n}, {"ngram": 1, "count": 1, "_id": 0}
+  ).sort("count", pymongo.DESCENDING).limit(top_k)
+  return [(row["ngram"], row["count"]) for row in top]
 
 # Function to identify research trends
-def identify_trends(collection_name, n_gram=1):
+def identify_trends(collection_name, n_gram=1, top_k=TOP_K):
   """
   This function analyzes the research paper collection and identifies trends
   based on n-gram frequency in titles and abstracts.
 
+  The top n-grams are read from the trend table through the (collection, n,
+  count) index; refresh_trends keeps the table up to date.
+
   Args:
       collection_name (str): Name of the MongoDB collection containing papers.
       n_gram (int, optional): Number of words to consider for n-gram analysis. Defaults to 1 (unigrams).
+      top_k (int, optional): Number of n-grams returned.
 
   Returns:
       dict: Dictionary containing top n frequent n-grams and their counts.
   """
-  # Fetch all documents from the collection
-  papers = db[collection_name].find()
+  return {"top_n_grams": _top_ngrams(collection_name, n_gram, top_k)}
 
-  # Initialize empty dictionary for storing n-gram counts
-  ngram_counts = {}
+def identify_all_trends(collection_name, top_k=TOP_K):
+  """Top unigrams through trigrams from the trend table."""
+  return {n: _top_ngrams(collection_name, n, top_k) for n in range(1, MAX_N_GRAM + 1)}
 
-  # Loop through each paper
-  for paper in papers:
-    title = paper.get("title", "")
-    abstract = paper.get("summary", "")
-    text = f"{title} {abstract}"  # Combine title and abstract for analysis
-
-    # Process text and extract n-grams
-    tokens = [word.lower() for word in text.split() if word.isalnum()]
-    for i in range(len(tokens) - n_gram + 1):
-      ngram = " ".join(tokens[i:i+n_gram])
-      ngram_counts[ngram] = ngram_counts.get(ngram, 0) + 1
+_summary_service = None
 
-  # Sort n-grams by count in descending order and return top n
-  top_n_grams = sorted(ngram_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-  return {"top_n_grams": top_n_grams}
+def get_summary_service(n_process=None):
+  """The process-wide SummaryService, so the spaCy pipeline is loaded once rather than per paper."""
+  global _summary_service
+  if _summary_service is None:
+    _summary_service = SummaryService(db[SUMMARIES_COLLECTION])
+  if n_process is not None:
+    _summary_service.n_process = n_process
+  return _summary_service
 
 # Function to summarize key findings of a paper
 def summarize_findings(paper):
   """
-  This function uses spaCy's summarization model to summarize the key findings of a paper.
+  This function uses spaCy to summarize the key findings of a paper.
+
+  spaCy ships no summarization model, so the summary is extractive: the
+  sentences whose words are most frequent in the paper (see summarization.py).
 
   Args:
       paper (dict): A dictionary containing the paper details (title, summary, etc.)
@@ -53,18 +238,31 @@ def summarize_findings(paper):
   Returns:
       str: A summarized version of the paper's key findings.
   """
-  # Load spaCy language model (ensure you have spaCy installed)
-  nlp = spacy.load("en_core_web_sm")
+  # Assuming 'content' field stores full text
+  _, summary = next(iter(get_summary_service().summarize_papers([paper])))
+  return summary
 
-  # Preprocess text (optional, can be improved)
-  text = paper.get("content", "")  # Assuming 'content' field stores full text
-  text = " ".join(word.lower() for word in text.split() if word.isalnum())
-  doc = nlp(text)
+def write_report(criteria, collection_name, out, n_process=1):
+  """
+  Streams a report to a file-like object, one paper at a time as its summary is ready.
 
-  # Use spaCy summarization model
-  summarizer = Summarizer(nlp)
-  summary = summarizer(doc.text)
-  return summary.text
+  Args:
+      criteria (dict): Report criteria, see paper_queries.build_query.
+      collection_name (str): Name of the MongoDB collection containing papers.
+      out: Object with a write(str) method, e.g. an open file or a response stream.
+      n_process (int, optional): Processes spaCy uses to summarize.
+
+  Returns:
+      int: Number of papers written.
+  """
+  # Criteria are translated into an indexed query that only fetches the fields a report uses
+  filtered_papers = papers.find_papers(collection_name, criteria)
+  written = 0
+  for paper, summary in get_summary_service(n_process).summarize_papers(filtered_papers):
+    out.write(f"\nPaper: {paper.get('title', '')}\n")
+    out.write(summary)
+    written += 1
+  return written
 
 # Function to generate reports based on criteria
 def generate_report(criteria, collection_name):
@@ -72,31 +270,25 @@ def generate_report(criteria, collection_name):
   This function generates a report based on user-defined criteria (e.g., specific keywords, publication dates).
 
   Args:
-      criteria (dict): Dictionary containing criteria for report generation.
+      criteria (dict): Report criteria, e.g. {"keywords": "fairness", "published_after": "2023-01-01"};
+                       see paper_queries.build_query.
       collection_name (str): Name of the MongoDB collection containing papers.
 
   Returns:
       str: A string representation of the generated report.
   """
-  # Implement logic to filter papers based on criteria and potentially use other analysis techniques
-  # This part would highly depend on the specific criteria you want to support
-  filtered_papers = db[collection_name].find(criteria)  # Placeholder for filtering
-
-  # Generate report content based on the filtered papers (e.g., trends, summaries)
-  report_content = ""
-  for paper in filtered_papers:
-    # Call functions like identify_trends or summarize_findings on each paper
-    # and incorporate the results into the report content
-    report_content += f"\nPaper: {paper.get('title', '')}\n"
-    report_content += summarize_findings(paper)
-    # ... add other analysis results
-
-  return report_content
+  # Papers are summarized in batches through nlp.pipe; the text is built in a
+  # StringIO instead of by repeated string concatenation
+  report = io.StringIO()
+  write_report(criteria, collection_name, report)
+  return report.getvalue()
 
 # Example usage
-# Trend analysis
-print(identify_trends("engineering_papers"))  # Replace with desired collection
+if __name__ == "__main__":
+  # Trend analysis
+  refresh_trends(["engineering_papers"])
+  print(identify_trends("engineering_papers"))  # Replace with desired collection
 
-# Paper summarization
-paper = db["engineering_papers"].find_one()  # Fetch a sample paper
-summary = summarize_findings(paper)
+  # Paper summarization
+  paper = db["engineering_papers"].find_one()  # Fetch a sample paper
+  summary = summarize_findings(paper)
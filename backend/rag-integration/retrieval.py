@@ -1,7 +1,181 @@
+import time
 import numpy as np
+from chunking import parent_id
 
 
-def retrieve_documents(query, index, docs, model, k=5):
-    query_embedding = model.encode([query])
-    D, I = index.search(np.array(query_embedding), k)
-    return [docs[i] for i in I[0]]
+# Results fetched per wanted hit when filtering by domain, grown until k hits are found
+OVERFETCH = 4
+# Reciprocal-rank fusion: ranks are scored 1 / (RRF_K + rank), and each
+# retriever contributes its top FUSION_DEPTH (or k, if larger) candidates
+RRF_K = 60
+FUSION_DEPTH = 20
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merges ranked lists of ids by summing 1 / (k + rank) over the lists each id appears in.
+
+    Returns:
+        list: (id, fused score) pairs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def retrieve_documents(query, index, docs, model, k=5, cache=None, sparse=None):
+    """
+    Top k of docs for query from a FAISS index over their embeddings.
+
+    With sparse, a bm25.BM25Index over the same docs with their positions as
+    ids, dense and BM25 rankings are merged by reciprocal-rank fusion.
+    """
+    if cache is not None:
+        query_embedding = cache.embed(model, [query])
+    else:
+        query_embedding = model.encode([query])
+    depth = max(k, FUSION_DEPTH) if sparse is not None else k
+    D, I = index.search(np.array(query_embedding), depth)
+    if sparse is None:
+        return [docs[i] for i in I[0]]
+    dense = [str(i) for i in I[0] if i >= 0]
+    lexical = [doc_id for doc_id, _ in sparse.search(query, depth)]
+    return [docs[int(doc_id)] for doc_id, _ in reciprocal_rank_fusion([dense, lexical])[:k]]
+
+
+class RetrievalService:
+    """
+    Batched retrieval over one index that holds every domain.
+
+    Document ids in the index are tagged '<collection>:<id>' (see
+    indexing.update_unified_index). A batch of queries is encoded in one
+    forward pass and searched in one call. Results are ranked by distance
+    across all domains, or across the requested subset of domains.
+
+    With a BM25 index over the same tagged ids, the dense and BM25 rankings
+    are merged by reciprocal-rank fusion, which recovers exact-term matches
+    (acronyms, regulation names) that embeddings rank low.
+
+    Args:
+        model (SentenceTransformer): Query encoder, the same model used for the documents.
+        index (indexing.PersistentIndex): Unified index.
+        cache (query_cache.QueryCache, optional): Cache for query embeddings and results.
+        passages (bool, optional): The index holds passages; hits then also carry their 'parent_id' paper.
+        sparse (bm25.BM25Index, optional): Lexical index fused with the dense results.
+    """
+
+    def __init__(self, model, index, cache=None, passages=False, sparse=None):
+        self.model = model
+        self.index = index
+        self.cache = cache
+        self.passages = passages
+        self.sparse = sparse
+
+    @property
+    def state(self):
+        """Changes when either index does, so cached results are dropped."""
+        return (self.index.state, self.sparse.state if self.sparse is not None else None)
+
+    def encode(self, queries, batch_size=256):
+        if self.cache is not None:
+            return self.cache.embed(self.model, queries, batch_size)
+        return np.asarray(self.model.encode(queries, batch_size=batch_size), dtype=np.float32)
+
+    def search(self, queries, k=5, domains=None):
+        """
+        Retrieves the top k documents for every query.
+
+        Args:
+            queries (list): Query strings.
+            k (int, optional): Results per query.
+            domains (iterable, optional): Collection names to restrict results to. All if None.
+
+        Returns:
+            list: Per query, a list of dicts with 'doc_id', 'domain' and 'distance',
+                  best first and merged across domains. Fused results also carry
+                  'bm25' and 'rrf' scores; 'distance' is None for BM25-only hits.
+        """
+        if self.cache is None:
+            return self._search(queries, self.encode(queries), k, domains)
+
+        self.cache.check_index(self)
+        keys = [self.cache.result_key(query, k, domains) for query in queries]
+        results = [self.cache.results.get(key) for key in keys]
+        missing = [i for i, hits in enumerate(results) if hits is None]
+        if missing:
+            query_vectors = self.encode([queries[i] for i in missing])
+            start = time.perf_counter()
+            found = self._search([queries[i] for i in missing], query_vectors, k, domains)
+            self.cache.record_search(time.perf_counter() - start, len(missing))
+            for i, hits in zip(missing, found):
+                self.cache.results.put(keys[i], hits)
+                results[i] = hits
+        return results
+
+    def _search(self, queries, query_vectors, k, domains):
+        if self.sparse is None:
+            return self.search_vectors(query_vectors, k, domains)
+        depth = max(k, FUSION_DEPTH)
+        dense = self.search_vectors(query_vectors, depth, domains)
+        wanted = set(domains) if domains is not None else None
+        accept = None if wanted is None else (lambda tagged_id: tagged_id.split(':', 1)[0] in wanted)
+
+        results = []
+        for query, dense_hits in zip(queries, dense):
+            lexical = dict(self.sparse.search(query, depth, accept))
+            distances = {f"{hit['domain']}:{hit['doc_id']}": hit['distance'] for hit in dense_hits}
+            hits = []
+            for tagged_id, score in reciprocal_rank_fusion([list(distances), list(lexical)])[:k]:
+                domain, doc_id = tagged_id.split(':', 1)
+                hit = {'doc_id': doc_id, 'domain': domain, 'distance': distances.get(tagged_id),
+                       'bm25': lexical.get(tagged_id), 'rrf': score}
+                if self.passages:
+                    hit['parent_id'] = parent_id(doc_id)
+                hits.append(hit)
+            results.append(hits)
+        return results
+
+    def search_vectors(self, query_vectors, k=5, domains=None):
+        wanted = set(domains) if domains is not None else None
+        total = len(self.index)
+        if not total:
+            return [[] for _ in query_vectors]
+        fetch = k if wanted is None else k * OVERFETCH
+        pending = list(range(len(query_vectors)))
+        results = [None] * len(query_vectors)
+
+        while pending:
+            fetch = min(fetch, total)
+            distances, doc_ids = self.index.search(query_vectors[pending], fetch)
+            still_short = []
+            for row, query in enumerate(pending):
+                hits = []
+                for distance, tagged_id in zip(distances[row], doc_ids[row]):
+                    domain, doc_id = tagged_id.split(':', 1)
+                    if wanted is None or domain in wanted:
+                        hit = {'doc_id': doc_id, 'domain': domain, 'distance': float(distance)}
+                        if self.passages:
+                            hit['parent_id'] = parent_id(doc_id)
+                        hits.append(hit)
+                        if len(hits) == k:
+                            break
+                results[query] = hits
+                if len(hits) < k and fetch < total:
+                    still_short.append(query)
+            # Queries whose domains are rare among their neighbours search again, deeper
+            pending = still_short
+            fetch *= OVERFETCH
+        return results
+
+    def search_per_domain(self, queries, k=5, domains=('engineering_papers', 'ethics_papers', 'policy_papers')):
+        """
+        Retrieves the top k documents of each domain for every query, sharing one encode.
+
+        Returns:
+            list: Per query, a dict of domain to its list of hits.
+        """
+        query_vectors = self.encode(queries)
+        per_domain = {domain: self.search_vectors(query_vectors, k, [domain]) for domain in domains}
+        return [{domain: per_domain[domain][i] for domain in domains} for i in range(len(queries))]
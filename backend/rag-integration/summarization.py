@@ -0,0 +1,127 @@
+import hashlib
+import heapq
+from collections import Counter
+
+import spacy
+
+SPACY_MODEL = "en_core_web_sm"
+MAX_SENTENCES = 3
+BATCH_SIZE = 32
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _word(token):
+    # Pipelines without a lemmatizer leave lemma_ empty
+    return (token.lemma_ or token.text).lower()
+
+
+def summarize_doc(doc, max_sentences=MAX_SENTENCES):
+    """
+    Extractive summary of a parsed spaCy doc: the sentences whose words are most frequent in it.
+
+    Args:
+        doc (spacy.tokens.Doc): Parsed text.
+        max_sentences (int, optional): Sentences kept.
+
+    Returns:
+        str: The selected sentences, in their original order.
+    """
+    frequencies = Counter(
+        _word(token) for token in doc if token.is_alpha and not token.is_stop
+    )
+    if not frequencies:
+        return doc.text.strip()
+    top = max(frequencies.values())
+
+    sentences = list(doc.sents)
+    scores = [
+        sum(frequencies.get(_word(token), 0) for token in sentence) / top / max(len(sentence), 1)
+        for sentence in sentences
+    ]
+    best = heapq.nlargest(max_sentences, range(len(sentences)), key=scores.__getitem__)
+    return " ".join(sentences[i].text.strip() for i in sorted(best))
+
+
+def _paper_text(paper, text_field):
+    if text_field is None:
+        # As preprocessing.paper_text, without loading the encoder it imports
+        return paper.get("content") or paper.get("summary", "")
+    return paper.get(text_field, "")
+
+
+class SummaryService:
+    """
+    Summarizes papers with one spaCy pipeline loaded for the life of the process.
+
+    Texts are processed through nlp.pipe in batches, optionally over several
+    processes. Summaries are cached in a MongoDB collection keyed by paper id
+    and the hash of the text they were made from, so unchanged papers are
+    never summarized twice.
+
+    Args:
+        cache_collection (pymongo.collection.Collection, optional): Where summaries are cached.
+        model (str, optional): spaCy pipeline to load.
+        batch_size (int, optional): Texts per nlp.pipe batch.
+        n_process (int, optional): Processes used by nlp.pipe.
+        max_sentences (int, optional): Sentences per summary.
+    """
+
+    def __init__(self, cache_collection=None, model=SPACY_MODEL, batch_size=BATCH_SIZE, n_process=1,
+                 max_sentences=MAX_SENTENCES):
+        # Only sentence boundaries, lemmas and stop words are needed
+        self.nlp = spacy.load(model, disable=["ner"])
+        self.cache = cache_collection
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.max_sentences = max_sentences
+
+    def summarize_texts(self, texts):
+        docs = self.nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process)
+        return [summarize_doc(doc, self.max_sentences) for doc in docs]
+
+    def summarize_papers(self, papers, text_field=None):
+        """
+        Yields (paper, summary) for every paper, in order, working through them in batches.
+
+        Args:
+            papers (iterable): Paper documents; can be a cursor.
+            text_field (str, optional): Field holding the text to summarize. By default the
+                                        content, or the summary for harvested arXiv entries
+                                        that only carry their abstract.
+        """
+        batch = []
+        for paper in papers:
+            batch.append(paper)
+            if len(batch) >= self.batch_size * max(self.n_process, 1):
+                yield from self._summarize_batch(batch, text_field)
+                batch = []
+        if batch:
+            yield from self._summarize_batch(batch, text_field)
+
+    def _summarize_batch(self, papers, text_field):
+        texts = [" ".join(_paper_text(paper, text_field).split()) for paper in papers]
+        keys = [(str(paper.get("_id")), content_hash(text)) for paper, text in zip(papers, texts)]
+
+        summaries = [None] * len(papers)
+        if self.cache is not None:
+            cached = {
+                (row["_id"], row["hash"]): row["summary"]
+                for row in self.cache.find({"_id": {"$in": [paper_id for paper_id, _ in keys]}})
+            }
+            summaries = [cached.get(key) for key in keys]
+
+        missing = [i for i, summary in enumerate(summaries) if summary is None]
+        if missing:
+            for i, summary in zip(missing, self.summarize_texts([texts[i] for i in missing])):
+                summaries[i] = summary
+            if self.cache is not None:
+                from pymongo import UpdateOne
+                self.cache.bulk_write([
+                    UpdateOne({"_id": keys[i][0]}, {"$set": {"hash": keys[i][1], "summary": summaries[i]}}, upsert=True)
+                    for i in missing
+                ], ordered=False)
+
+        return zip(papers, summaries)
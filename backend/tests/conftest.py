@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The backend and the RAG modules import each other flat, as their entry points run them
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'rag-integration'))
+sys.path.insert(0, BACKEND_DIR)
+
+# Jobs, datasets, slow request profiles and the RAG stores write under these; set before the modules
+# read them, and inherited by job worker processes
+_scratch = tempfile.mkdtemp(prefix='aicademia-tests-')
+os.environ.setdefault('AICADEMIA_JOBS_DIR', os.path.join(_scratch, 'jobs'))
+os.environ.setdefault('AICADEMIA_DATASETS_DIR', os.path.join(_scratch, 'datasets'))
+os.environ.setdefault('AICADEMIA_PROFILE_DIR', os.path.join(_scratch, 'profiles'))
+os.environ.setdefault('INDEXES_DIR', os.path.join(_scratch, 'indexes'))
+os.environ.setdefault('EMBEDDINGS_DIR', os.path.join(_scratch, 'embeddings'))
+os.environ.setdefault('BM25_DIR', os.path.join(_scratch, 'bm25'))
+
+
+@pytest.fixture
+def mongomock(monkeypatch):
+    """The mongomock module, with bulk writes taking the sort option newer pymongo passes to UpdateOne."""
+    mongomock = pytest.importorskip('mongomock')
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, 'add_update', add_update_without_sort)
+    return mongomock
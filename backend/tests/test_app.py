@@ -0,0 +1,83 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+@pytest.fixture
+def hiring_csv():
+    rng = np.random.default_rng(1)
+    n = 1000
+    group = rng.integers(0, 2, n)
+    data = pd.DataFrame({'gender': group, 'race': rng.integers(0, 3, n),
+                         'hired': (rng.random(n) < np.where(group == 1, 0.5, 0.4)).astype(int)})
+    return data.to_csv(index=False).encode()
+
+
+def bias_form(csv, **fields):
+    return dict({'file': (io.BytesIO(csv), 'hiring.csv'), 'label': 'hired', 'favorable_class': '1'}, **fields)
+
+
+@pytest.mark.parametrize('mode', ['', 'stream'])
+def test_check_bias_numeric_columns(client, hiring_csv, mode):
+    response = client.post('/check-bias', data=bias_form(hiring_csv, protected_attr='gender',
+                                                           privileged_value='1', mode=mode))
+    assert response.status_code == 200
+    # Strict parsing: NaN would not be valid JSON
+    metrics = json.loads(response.data, parse_constant=pytest.fail)
+    assert 0 < metrics['disparate_impact'] < 1
+    assert metrics['mean_difference'] < 0
+
+
+def test_check_bias_modes_agree(client, hiring_csv):
+    form = dict(protected_attr='gender', privileged_value='1')
+    full = client.post('/check-bias', data=bias_form(hiring_csv, **form)).get_json()
+    streamed = client.post('/check-bias', data=bias_form(hiring_csv, mode='stream', **form)).get_json()
+    assert streamed == pytest.approx(full)
+
+
+def test_check_bias_multi_numeric_columns(client, hiring_csv):
+    response = client.post('/check-bias-multi', data=bias_form(
+        hiring_csv, protected_attrs='gender,race', privileged_values=json.dumps({'gender': '1', 'race': '0'})))
+    assert response.status_code == 200
+    report = json.loads(response.data, parse_constant=pytest.fail)
+    assert all(rate > 0 for rate in report['gender']['base_rates'].values())
+    assert report['race']['disparate_impact'] is not None
+
+
+@pytest.mark.parametrize('mode', ['', 'stream'])
+def test_check_bias_empty_group(client, hiring_csv, mode):
+    response = client.post('/check-bias', data=bias_form(hiring_csv, protected_attr='gender',
+                                                           privileged_value='5', mode=mode))
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('fields', [{'n_folds': 'five'}, {'n_folds': '1'}, {'thresholds': '0.5,high'},
+                                    {'thresholds': '1.5'}])
+def test_fairness_sweep_invalid_parameters(client, hiring_csv, fields):
+    response = client.post('/fairness-sweep', data=bias_form(hiring_csv, protected_attr='gender',
+                                                               privileged_value='1', **fields))
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('route, fields', [
+    ('/check-bias', {'protected_attr': 'missing', 'privileged_value': '1'}),
+    ('/check-bias-multi', {'protected_attrs': 'missing', 'privileged_values': '{"missing": "1"}'}),
+    ('/fairness-sweep', {'protected_attr': 'missing', 'privileged_value': '1'}),
+])
+def test_server_errors_are_logged_with_traceback(client, hiring_csv, caplog, route, fields):
+    response = client.post(route, data=bias_form(hiring_csv, **fields))
+    assert response.status_code == 500
+    assert any(record.exc_info for record in caplog.records if record.levelname == 'ERROR')
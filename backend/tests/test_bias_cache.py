@@ -0,0 +1,82 @@
+import io
+
+import pandas as pd
+import pytest
+
+from bias_cache import bias_cache, cached_frame, cached_group_counts
+from bias_metrics import stream_group_counts
+from lru_cache import LRUCache
+
+CSV = b'gender,race,hired\n' + b''.join(f'{i % 2},{i % 3},{i % 5 == 0:d}\n'.encode() for i in range(300))
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    bias_cache.clear()
+    yield
+    bias_cache.clear()
+
+
+class CountingParser:
+    def __init__(self, parse):
+        self.parse = parse
+        self.calls = 0
+
+    def __call__(self, stream, *args):
+        self.calls += 1
+        return self.parse(stream, *args)
+
+
+def test_evicts_least_recently_used_by_entry_count():
+    cache = LRUCache(max_entries=2, max_bytes=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    cache.put('a', 'A', 40)
+    cache.put('b', 'B', 40)
+    cache.get('a')
+    cache.put('c', 'C', 30)
+    assert cache.get('b') is None
+    assert cache.stats()['size_bytes'] == 70
+
+    # Replacing an entry counts its new size only
+    cache.put('a', 'A2', 60)
+    assert cache.stats()['size_bytes'] == 90
+    # Larger than the whole budget: not stored, nothing evicted for it
+    cache.put('huge', 'H', 101)
+    assert cache.get('huge') is None
+    assert (cache.get('a'), cache.get('c')) == ('A2', 'C')
+
+
+def test_cached_frame_reuses_identical_bytes():
+    read_csv = CountingParser(pd.read_csv)
+    first = cached_frame(io.BytesIO(CSV), read_csv)
+    # Another upload object, same bytes
+    assert cached_frame(io.BytesIO(CSV), read_csv) is first
+    assert read_csv.calls == 1
+
+    cached_frame(io.BytesIO(CSV + b'1,1,1\n'), read_csv)
+    assert read_csv.calls == 2
+
+
+def test_cached_group_counts_keyed_by_digest_and_columns():
+    count = CountingParser(stream_group_counts)
+    by_gender = cached_group_counts(io.BytesIO(CSV), 'hired', ['gender'], count)
+    assert cached_group_counts(io.BytesIO(CSV), 'hired', ['gender'], count) is by_gender
+    assert count.calls == 1
+    assert by_gender.sum() == 300
+
+    # Other attributes of the same upload are a different entry, and so is its frame
+    cached_group_counts(io.BytesIO(CSV), 'hired', ['gender', 'race'], count)
+    assert count.calls == 2
+    read_csv = CountingParser(pd.read_csv)
+    cached_frame(io.BytesIO(CSV), read_csv)
+    assert read_csv.calls == 1
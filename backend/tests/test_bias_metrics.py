@@ -0,0 +1,63 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bias_metrics import (EmptyGroupError, compute_bias_metrics, group_counts, metrics_from_counts,
+                          stream_group_counts)
+
+
+@pytest.fixture
+def hiring():
+    rng = np.random.default_rng(0)
+    n = 2000
+    group = rng.integers(0, 3, n)
+    data = pd.DataFrame({
+        'group': group,
+        'age': rng.integers(20, 65, n).astype(np.float64),
+        'hired': (rng.random(n) < np.where(group == 1, 0.6, 0.4)).astype(int),
+    })
+    # Missing values in a column the metrics never look at still drop their rows
+    data.loc[rng.choice(n, 150, replace=False), 'age'] = np.nan
+    data.loc[rng.choice(n, 50, replace=False), 'group'] = np.nan
+    return data
+
+
+def test_counts_match_check_bias(hiring):
+    from app import check_bias
+
+    expected = check_bias(hiring, 'hired', 'group', 1, 1.0)
+    counts = group_counts(hiring, 'hired', ['group'])
+    assert counts.sum() == len(hiring.dropna())
+    metrics = metrics_from_counts(counts, 'hired', 'group', 1, 1.0)
+    assert metrics['mean_difference'] == pytest.approx(expected['mean_difference'])
+    assert metrics['disparate_impact'] == pytest.approx(expected['disparate_impact'])
+
+
+def test_streaming_matches_in_memory(hiring):
+    csv = hiring.to_csv(index=False)
+    streamed = stream_group_counts(io.StringIO(csv), 'hired', ['group'], chunksize=300)
+    in_memory = group_counts(pd.read_csv(io.StringIO(csv)), 'hired', ['group'])
+    assert metrics_from_counts(streamed, 'hired', 'group', 1, 1.0) == \
+        pytest.approx(metrics_from_counts(in_memory, 'hired', 'group', 1, 1.0))
+
+
+def test_multi_attribute_report_matches_single(hiring):
+    report = compute_bias_metrics(hiring, 'hired', ['group'], 1, {'group': 1.0})
+    single = metrics_from_counts(group_counts(hiring, 'hired', ['group']), 'hired', 'group', 1, 1.0)
+    assert report['group']['disparate_impact'] == pytest.approx(single['disparate_impact'])
+
+
+def test_form_strings_match_numeric_columns(hiring):
+    counts = group_counts(hiring, 'hired', ['group'])
+    assert metrics_from_counts(counts, 'hired', 'group', '1', '1') == \
+        metrics_from_counts(counts, 'hired', 'group', 1, 1.0)
+    report = compute_bias_metrics(hiring, 'hired', ['group'], '1', {'group': '1'})
+    assert report['group']['base_rates']['1.0'] > 0
+
+
+def test_empty_group_raises(hiring):
+    counts = group_counts(hiring, 'hired', ['group'])
+    with pytest.raises(EmptyGroupError):
+        metrics_from_counts(counts, 'hired', 'group', 1, 7)
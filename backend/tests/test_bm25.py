@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+import pytest
+
+from bm25 import BM25Index
+from retrieval import reciprocal_rank_fusion
+
+DOCS = {
+    'd1': 'Apple banana apple',
+    'd2': 'banana cherry',
+    'd3': 'cherry date elderberry fig',
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path / 'bm25'))
+    index.add(list(DOCS), list(DOCS.values()))
+    return index
+
+
+def test_score_matches_okapi_bm25(index):
+    # 3 documents averaging 3 words; 'apple' is in one of them, twice, and that one is 3 words long
+    idf = math.log(1 + (3 - 1 + 0.5) / (1 + 0.5))
+    norm = 1.5 * (1 - 0.75 + 0.75 * 3 / 3)
+    (doc_id, score), = index.search('apple', k=5)
+    assert doc_id == 'd1'
+    assert score == pytest.approx(idf * 2 * (1.5 + 1) / (2 + norm))
+
+
+def test_removed_document_is_not_found_or_counted(index):
+    index.remove(['d1'])
+    assert len(index) == 2
+    assert index.search('apple') == []
+
+    # Only d2 and d3 remain: 'banana' is in one of two documents, which average 3 words
+    idf = math.log(1 + (2 - 1 + 0.5) / (1 + 0.5))
+    norm = 1.5 * (1 - 0.75 + 0.75 * 2 / 3)
+    (doc_id, score), = index.search('banana')
+    assert doc_id == 'd2'
+    assert score == pytest.approx(idf * (1.5 + 1) / (1 + norm))
+
+
+def test_search_after_save_and_memory_mapped_load(index):
+    index.add(['d2'], ['cherry cherry'])
+    index.remove(['d3'])
+    expected = [index.search(query) for query in ('apple', 'banana', 'cherry', 'fig')]
+    index.save()
+
+    loaded = BM25Index.load(index.path, mmap=True)
+    assert isinstance(loaded.docs, np.memmap)
+    assert loaded.state == index.state
+    assert [loaded.search(query) for query in ('apple', 'banana', 'cherry', 'fig')] == expected
+    assert expected[3] == []
+
+    # New documents go to the delta over the read-only base
+    loaded.add(['d4'], ['fig jam'])
+    assert [doc_id for doc_id, _ in loaded.search('fig')] == ['d4']
+    assert [doc_id for doc_id, _ in loaded.search('cherry banana', k=1)] == ['d2']
+
+
+def test_reciprocal_rank_fusion_ordering():
+    fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'c', 'd']], k=60)
+    # Appearing in both lists outranks topping only one
+    assert [doc_id for doc_id, _ in fused] == ['b', 'c', 'a', 'd']
+    assert dict(fused)['b'] == pytest.approx(1 / 62 + 1 / 61)
+    assert dict(fused)['a'] == pytest.approx(1 / 61)
@@ -0,0 +1,117 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import dataset_store
+from app import app
+from dataset_store import DatasetRegistry, UploadStore, csv_to_parquet
+
+CSV = b'gender,hired\n' + b''.join(f'{i % 2},{i % 3 == 0:d}\n'.encode() for i in range(500))
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def create(client, size=len(CSV)):
+    response = client.post('/uploads', json={'filename': 'hiring.csv', 'size': size})
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+
+def patch(client, upload_id, offset, chunk):
+    return client.patch(f'/uploads/{upload_id}', data=chunk, headers={'Upload-Offset': str(offset)})
+
+
+def test_resume_after_lost_chunk(client):
+    upload_id = create(client)
+    assert patch(client, upload_id, 0, CSV[:1000]).get_json()['offset'] == 1000
+
+    # A retried or skipped chunk is refused with the offset to continue from
+    for offset in (0, 1500):
+        response = patch(client, upload_id, offset, CSV[offset:offset + 500])
+        assert response.status_code == 409
+        assert response.get_json()['offset'] == 1000
+
+    assert client.get(f'/uploads/{upload_id}').get_json()['offset'] == 1000
+    assert patch(client, upload_id, 1000, CSV[1000:]).get_json()['offset'] == len(CSV)
+
+    dataset = client.post(f'/uploads/{upload_id}/complete').get_json()
+    assert dataset['dataset_id'] == hashlib.sha256(CSV).hexdigest()
+    assert dataset['rows'] == 500
+    assert client.get(f"/datasets/{dataset['dataset_id']}").status_code == 200
+
+
+def test_size_sent_as_string(client):
+    upload_id = create(client, size=str(len(CSV)))
+    patch(client, upload_id, 0, CSV[:100])
+    assert client.post(f'/uploads/{upload_id}/complete').status_code == 409
+    patch(client, upload_id, 100, CSV[100:])
+    assert client.post(f'/uploads/{upload_id}/complete').status_code == 200
+
+
+@pytest.mark.parametrize('size', ['many', -1, 1.5, True])
+def test_invalid_size(client, size):
+    assert client.post('/uploads', json={'filename': 'hiring.csv', 'size': size}).status_code == 400
+
+
+@pytest.mark.parametrize('headers', [{}, {'Upload-Offset': 'zero'}, {'Upload-Offset': '-5'}])
+def test_invalid_offset_header(client, headers):
+    upload_id = create(client)
+    response = client.patch(f'/uploads/{upload_id}', data=CSV, headers=headers)
+    assert response.status_code == 400
+    assert client.get(f'/uploads/{upload_id}').get_json()['offset'] == 0
+
+
+@pytest.mark.parametrize('content', [b'', b'a,b\n1,2\n3,4,5\n'])
+def test_unreadable_csv(client, content):
+    response = client.post('/upload', data={'file': (io.BytesIO(content), 'broken.csv')})
+    assert response.status_code == 400
+
+    upload_id = create(client, size=len(content))
+    patch(client, upload_id, 0, content)
+    assert client.post(f'/uploads/{upload_id}/complete').status_code == 400
+    assert client.get(f'/uploads/{upload_id}').status_code == 404
+
+
+def test_abandoned_uploads_are_removed(tmp_path):
+    store = UploadStore(str(tmp_path), abandoned_ttl=60)
+    abandoned, active = store.create('old.csv'), store.create('new.csv')
+    store.append(abandoned, 0, io.BytesIO(CSV[:100]))
+    store.append(active, 0, io.BytesIO(CSV[:100]))
+    an_hour_ago = time.time() - 3600
+    os.utime(os.path.join(str(tmp_path), f'{abandoned}.part'), (an_hour_ago, an_hour_ago))
+
+    store.create('next.csv')
+    with pytest.raises(KeyError):
+        store.status(abandoned)
+    assert not any(name.startswith(abandoned) for name in os.listdir(str(tmp_path)))
+    assert store.status(active)['offset'] == 100
+
+
+def test_datasets_convert_concurrently_and_once(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'hiring.csv'
+    csv_path.write_bytes(CSV)
+    registry = DatasetRegistry(str(tmp_path / 'datasets'))
+    # Two different datasets meet inside the conversion, which one lock across all would never allow
+    converting = threading.Barrier(2, timeout=10)
+    conversions = []
+
+    def convert(csv_path, parquet_path):
+        conversions.append(parquet_path)
+        converting.wait()
+        return csv_to_parquet(csv_path, parquet_path)
+
+    monkeypatch.setattr(dataset_store, 'csv_to_parquet', convert)
+    ids = ['a' * 64, 'b' * 64, 'a' * 64]
+    with ThreadPoolExecutor(3) as pool:
+        metas = list(pool.map(lambda dataset_id: registry.register_csv(str(csv_path), dataset_id), ids))
+    assert [meta['dataset_id'] for meta in metas] == ids
+    assert len(conversions) == 2
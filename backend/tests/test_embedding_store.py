@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+DIM = 4
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, DIM), dtype=np.float32)
+
+
+def ids(n, start=0):
+    return [f'doc{i}' for i in range(start, start + n)]
+
+
+def assert_same(store, reopened):
+    assert reopened.doc_ids == store.doc_ids
+    assert reopened.hashes == store.hashes
+    np.testing.assert_array_equal(reopened.vectors(), store.vectors())
+
+
+def test_flushes_append_and_reopen_replays_them(tmp_path):
+    store = EmbeddingStore(str(tmp_path), DIM)
+    store.put(ids(2000), ['h'] * 2000, vectors(2000))
+    store.flush()
+    snapshot = os.path.getmtime(store.meta_path), os.path.getsize(store.meta_path)
+
+    # New, re-embedded and removed documents, a batch per flush
+    store.put(ids(10, 2000), ['h'] * 10, vectors(10, 1))
+    store.flush()
+    store.put(['doc5'], ['changed'], vectors(1, 2))
+    store.remove(['doc7', 'doc2009'])
+    store.flush()
+    assert (os.path.getmtime(store.meta_path), os.path.getsize(store.meta_path)) == snapshot
+    with open(store.log_path) as f:
+        assert len(f.readlines()) == 2
+
+    reopened = EmbeddingStore(str(tmp_path), DIM)
+    assert_same(store, reopened)
+    assert len(reopened) == 2008
+    assert not reopened.needs_embedding('doc5', 'changed')
+    assert 'doc7' not in reopened.row_of
+
+
+def test_log_is_folded_into_a_new_snapshot(tmp_path):
+    store = EmbeddingStore(str(tmp_path), DIM)
+    store.put(ids(10), ['h'] * 10, vectors(10))
+    store.flush()
+    first_log = store.log_path
+    for i in range(1100):
+        store.put([f'doc{i % 10}'], [f'h{i}'], vectors(1, i))
+        store.flush()
+    assert store.log_path != first_log
+    assert not os.path.exists(first_log)
+    assert_same(store, EmbeddingStore(str(tmp_path), DIM))
+
+
+def test_flush_cut_short_is_ignored(tmp_path):
+    store = EmbeddingStore(str(tmp_path), DIM)
+    store.put(ids(3), ['h'] * 3, vectors(3))
+    store.flush()
+    store.put(ids(1, 3), ['h'], vectors(1, 1))
+    store.flush()
+    with open(store.log_path, 'a') as f:
+        f.write('{"rows": 9, "set": [[4, "doc')
+
+    assert_same(store, EmbeddingStore(str(tmp_path), DIM))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from fairness_sweep import group_confusion, parse_folds, parse_thresholds
+
+
+def test_group_confusion_matches_counting_each_threshold():
+    rng = np.random.default_rng(3)
+    n = 500
+    # Rounded so that many probabilities sit exactly on a threshold
+    probabilities = np.round(rng.random(n), 2)
+    y = rng.integers(0, 2, n)
+    privileged = rng.random(n) < 0.3
+    thresholds = np.round(np.linspace(0, 1, 21), 2)
+
+    counts = group_confusion(probabilities, y, privileged, thresholds)
+    for group in (0, 1):
+        in_group = privileged == bool(group)
+        for t, threshold in enumerate(thresholds):
+            predicted = probabilities >= threshold
+            expected = {'tp': predicted & (y == 1), 'fp': predicted & (y == 0),
+                        'tn': ~predicted & (y == 0), 'fn': ~predicted & (y == 1)}
+            for name, cells in expected.items():
+                assert counts[name][group, t] == np.sum(cells & in_group), (name, group, threshold)
+
+
+@pytest.mark.parametrize('value', ['five', '1', '-3', '2.5', ''])
+def test_invalid_folds(value):
+    with pytest.raises(ValueError):
+        parse_folds(value)
+
+
+@pytest.mark.parametrize('value', ['0.5,high', '1.5', '-0.1', 'nan', '0.2,,0.4'])
+def test_invalid_thresholds(value):
+    with pytest.raises(ValueError):
+        parse_thresholds(value)
+
+
+def test_thresholds_default_when_empty():
+    assert parse_thresholds('') is None
+    assert parse_thresholds('0, 0.25,1') == [0.0, 0.25, 1.0]
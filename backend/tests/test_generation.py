@@ -0,0 +1,92 @@
+import copy
+from concurrent.futures import Future
+
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('transformers')
+from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+from transformers.convert_slow_tokenizer import bytes_to_unicode
+
+from generation import GenerationEngine, conv1d_to_linear
+
+CONTEXT = 64
+
+
+def tiny_model():
+    torch.manual_seed(0)
+    # No eos, so generation never stops before max_new_tokens
+    config = GPT2Config(vocab_size=257, n_positions=CONTEXT, n_embd=32, n_layer=2, n_head=2,
+                        bos_token_id=None, eos_token_id=None)
+    return GPT2LMHeadModel(config).eval()
+
+
+def byte_tokenizer():
+    """One token per byte, so prompt lengths are easy to control; no download needed."""
+    vocab = {char: i for i, char in enumerate(bytes_to_unicode().values())}
+    vocab['<|endoftext|>'] = 256
+    return GPT2Tokenizer(vocab=vocab, merges=[])
+
+
+@pytest.fixture
+def engine():
+    engine = GenerationEngine(model=tiny_model(), tokenizer=byte_tokenizer(), max_new_tokens=8, batch_window=0.05)
+    calls = []
+    generate = engine.model.generate
+
+    def recording_generate(**kwargs):
+        calls.append((kwargs['input_ids'].shape, kwargs['max_new_tokens']))
+        return generate(**kwargs)
+
+    engine.model.generate = recording_generate
+    engine.calls = calls
+    return engine
+
+
+def test_conv1d_to_linear_keeps_outputs():
+    model = tiny_model()
+    inputs = torch.randint(0, 256, (2, 20))
+    with torch.no_grad():
+        expected = model(inputs).logits
+        converted = conv1d_to_linear(copy.deepcopy(model))
+        torch.testing.assert_close(converted(inputs).logits, expected, rtol=1e-4, atol=1e-5)
+    quantized = torch.quantization.quantize_dynamic(converted, {torch.nn.Linear}, dtype=torch.qint8)
+    # Every attention and MLP projection is quantized, not only the LM head
+    assert sum(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in quantized.modules()) == 2 * 4 + 1
+
+
+def test_long_and_short_prompts_each_get_their_tokens(engine):
+    short = engine.submit('hi', [], max_new_tokens=30)
+    long = engine.submit('x' * 50, [], max_new_tokens=8)
+    assert len(short.result(timeout=60)) > 2 and long.result(timeout=60)
+    # Together they would need 50 + 30 positions: generated apart, each with its own budget
+    assert sorted(engine.calls) == sorted([(torch.Size([1, 2]), 30), (torch.Size([1, 50]), 8)])
+
+
+def test_prompts_that_fit_are_batched(engine):
+    futures = [engine.submit('a' * n, [], max_new_tokens=8) for n in (3, 5, 7)]
+    for future in futures:
+        future.result(timeout=60)
+    assert engine.calls == [(torch.Size([3, 7]), 8)]
+
+
+def test_worker_survives_failures_and_cancellations(engine):
+    generate = engine.model.generate
+
+    def failing_generate(**kwargs):
+        engine.model.generate = generate
+        raise RuntimeError('out of memory')
+
+    engine.model.generate = failing_generate
+    with pytest.raises(RuntimeError, match='out of memory'):
+        engine.generate('first', [])
+
+    cancelled = Future()
+    cancelled.cancel()
+    engine._requests.put((engine.pack_context('cancelled', []), 8, cancelled))
+    assert engine.submit('later', []).result(timeout=60).startswith('later')
+
+
+def test_token_budget_must_leave_room_for_a_prompt(engine):
+    with pytest.raises(ValueError):
+        engine.submit('hi', [], max_new_tokens=CONTEXT)
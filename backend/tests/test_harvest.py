@@ -0,0 +1,110 @@
+import asyncio
+import email.utils
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+import pytest
+
+pytest.importorskip('mongomock_motor')
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from mongomock_motor import AsyncMongoMockClient
+
+from atom_stream import AtomStream
+from benchmarks.stub_arxiv import make_app, synthetic_papers
+from fns_papers import ArxivHarvester, retry_after_seconds
+
+
+def stub_app(papers, starts):
+    """Stub arXiv server over papers (newest first), recording the start of every page asked for."""
+    @web.middleware
+    async def record(request, handler):
+        starts.append(int(request.query.get('start', 0)))
+        return await handler(request)
+
+    app = make_app(papers)
+    app.middlewares.append(record)
+    return app
+
+
+async def harvest(server, database, page_size=10):
+    async with ArxivHarvester(database, base_url=str(server.make_url('/api/query')), page_size=page_size,
+                              min_interval=0, dedup=False) as harvester:
+        return await harvester.harvest('fairness', 'papers')
+
+
+def test_harvest_pages_through_everything_then_only_new_papers(mongomock):
+    papers, starts = synthetic_papers(47), []
+
+    async def run():
+        database = AsyncMongoMockClient()['aicademia']
+        async with TestServer(stub_app(papers, starts)) as server:
+            assert await harvest(server, database) == 47
+            assert sorted(starts) == [0, 10, 20, 30, 40]
+            stored = await database['papers'].find_one({'arxiv_id': papers[5]['arxiv_id']})
+            assert stored['authors'] == papers[5]['authors']
+            assert stored['published'] == papers[5]['published']
+            assert isinstance(stored['harvested_at'], datetime)
+
+            # Nothing new: the first page already reaches the watermark
+            starts.clear()
+            assert await harvest(server, database) == 0
+            assert starts == [0]
+
+            newer = synthetic_papers(3, seed_date=datetime(2024, 2, 1))
+            for paper in newer:
+                paper['arxiv_id'] = paper['arxiv_id'].replace('2401', '2402')
+            papers[:0] = newer
+            starts.clear()
+            assert await harvest(server, database) == 3
+            assert starts == [0]
+            assert await database['papers'].count_documents({}) == 50
+
+    asyncio.run(run())
+
+
+def test_retry_after_in_seconds_or_as_a_date():
+    soon = email.utils.format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= retry_after_seconds(soon, 1.0) <= 30
+    assert retry_after_seconds('Wed, 21 Oct 2015 07:28:00 GMT', 1.0) == 0
+    assert retry_after_seconds('120', 1.0) == 120
+    assert retry_after_seconds(None, 1.5) == 1.5
+    assert retry_after_seconds('soon', 1.5) == 1.5
+
+
+def test_harvest_retries_after_a_dated_throttle(mongomock):
+    papers, starts = synthetic_papers(5), []
+
+    @web.middleware
+    async def throttle_once(request, handler):
+        starts.append(int(request.query.get('start', 0)))
+        if len(starts) == 1:
+            # The HTTP date form, already passed, so the retry is immediate
+            return web.Response(status=503, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        return await handler(request)
+
+    async def run():
+        app = make_app(papers)
+        app.middlewares.append(throttle_once)
+        async with TestServer(app) as server:
+            return await harvest(server, AsyncMongoMockClient()['aicademia'])
+
+    assert asyncio.run(run()) == 5
+    assert starts == [0, 0]
+
+
+@pytest.mark.parametrize('chunk_size', [64, 1 << 16])
+def test_atom_stream_parses_entries_across_chunks(chunk_size):
+    papers = synthetic_papers(12)
+
+    async def run():
+        async with TestServer(make_app(papers)) as server, aiohttp.ClientSession() as session:
+            async with session.get(server.make_url('/api/query'), params={'max_results': 5}) as response:
+                stream = AtomStream(response, chunk_size=chunk_size)
+                parsed = [paper async for paper in stream]
+        return stream.total_results, parsed
+
+    total, parsed = asyncio.run(run())
+    assert total == 12
+    assert [paper['arxiv_id'] for paper in parsed] == [paper['arxiv_id'] for paper in papers[:5]]
+    assert [paper['title'] for paper in parsed] == [paper['title'] for paper in papers[:5]]
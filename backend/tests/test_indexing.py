@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip('faiss')
+from indexing import PersistentIndex, TRAIN_POINTS_PER_CENTROID
+
+DIM = 16
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, DIM), dtype=np.float32)
+
+
+def ids(n, start=0):
+    return [f'doc{i}' for i in range(start, start + n)]
+
+
+def test_search_drops_distances_of_orphaned_ids(tmp_path):
+    index = PersistentIndex(str(tmp_path), DIM, 'hnsw')
+    corpus = vectors(20)
+    index.add(corpus, ids(20))
+    # HNSW cannot remove, re-adding orphans the old ids
+    index.add(corpus[:5] + 10, ids(5))
+
+    distances, doc_ids = index.search(corpus[:3], k=10)
+    assert 'doc0' not in doc_ids[0]
+    for query, row_distances, row_ids in zip(corpus[:3], distances, doc_ids):
+        # Every distance still belongs to the document next to it
+        expected = [np.sum((corpus[int(doc_id[3:])] - query) ** 2) for doc_id in row_ids]
+        np.testing.assert_allclose(row_distances, expected, rtol=1e-4)
+
+
+@pytest.mark.parametrize('index_type, params', [('ivf_flat', {'nlist': 8}), ('ivf_pq', {'nlist': 4, 'pq_m': 4})])
+def test_ivf_with_fewer_vectors_than_centroids(tmp_path, index_type, params):
+    index = PersistentIndex(str(tmp_path), DIM, index_type, **params)
+    corpus = vectors(index.min_train_points + 10)
+
+    index.add(corpus[:3], ids(3))
+    assert index.provisional
+    # Flat until trained, so there are no cells to probe
+    index.set_search_params(nprobe=params['nlist'])
+    _, doc_ids = index.search(corpus[:1], k=1)
+    assert doc_ids == [['doc0']]
+
+    # Reaching the mark trains the IVF index and keeps every vector and id
+    index.add(corpus[3:], ids(len(corpus) - 3, 3))
+    assert not index.provisional
+    assert len(index) == len(corpus)
+    index.set_search_params(nprobe=params['nlist'])
+    _, doc_ids = index.search(corpus[10:11], k=1)
+    assert doc_ids == [['doc10']]
+
+
+def test_provisional_index_survives_save_and_load(tmp_path):
+    index = PersistentIndex(str(tmp_path), DIM, 'ivf_flat', nlist=2)
+    corpus = vectors(2 * TRAIN_POINTS_PER_CENTROID)
+    index.train(corpus[:5])
+    index.add(corpus[:5], ids(5))
+    index.save()
+
+    loaded = PersistentIndex.load(str(tmp_path), mmap=False)
+    assert loaded.provisional
+    loaded.add(corpus[5:], ids(len(corpus) - 5, 5))
+    assert not loaded.provisional
+    assert len(loaded) == len(corpus)
@@ -0,0 +1,49 @@
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import jobs
+from bias_cache import file_digest
+
+
+def wait(queue, job_id, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = queue.status(job_id)
+        if status['status'] in ('finished', 'failed'):
+            return status
+        time.sleep(0.5)
+    pytest.fail(f'job {job_id} did not finish')
+
+
+def test_mitigation_job_end_to_end():
+    pytest.importorskip('tensorflow')
+    rng = np.random.default_rng(0)
+    n = 400
+    sex = rng.integers(0, 2, n)
+    data = pd.DataFrame({'sex': sex, 'score': rng.random(n), 'city': rng.choice(['a', 'b'], n),
+                         'hired': (rng.random(n) < np.where(sex == 1, 0.6, 0.4)).astype(int)})
+    csv = data.to_csv(index=False).encode()
+    digest = file_digest(io.BytesIO(csv))
+    path = jobs.save_upload(io.BytesIO(csv), digest)
+
+    queue = jobs.JobQueue(max_workers=1, finished_ttl=1)
+    status = wait(queue, queue.submit(path, digest, 'hired', 'sex'))
+    assert status['status'] == 'finished', status.get('error')
+    result = status['result']
+    assert not result['reused']
+    assert os.path.exists(result['artifacts']['weights'])
+    assert os.path.exists(result['artifacts']['model'] + '.index')
+    assert result['reweighing']['disparate_impact'] == pytest.approx(1.0)
+
+    # The same dataset and parameters reuse the artifacts instead of training
+    job_id = queue.submit(path, digest, 'hired', 'sex')
+    assert wait(queue, job_id)['result']['reused']
+
+    time.sleep(1.5)
+    assert queue.status(job_id) is None
+    assert not queue._jobs
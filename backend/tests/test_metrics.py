@@ -0,0 +1,79 @@
+import sys
+import threading
+import time
+
+from flask import Flask
+from prometheus_client.parser import text_string_to_metric_families
+
+import metrics
+from metrics import StackSampler, instrument_flask
+
+
+def make_app(app_name, slow_seconds=0):
+    app = Flask(__name__)
+    instrument_flask(app, app_name, slow_seconds)
+
+    @app.route('/papers/<paper_id>')
+    def paper(paper_id):
+        return {'paper_id': paper_id}
+
+    @app.route('/slow')
+    def slow():
+        # Busy rather than asleep, so the samples show this function
+        deadline = time.perf_counter() + 0.2
+        while time.perf_counter() < deadline:
+            pass
+        return 'done'
+
+    return app.test_client()
+
+
+def samples(client, name, **labels):
+    """Values of the samples of a metric whose labels include labels."""
+    families = text_string_to_metric_families(client.get('/metrics').get_data(as_text=True))
+    return [sample.value for family in families for sample in family.samples
+            if sample.name == name and labels.items() <= sample.labels.items()]
+
+
+def test_latency_recorded_and_nothing_left_in_flight():
+    client = make_app('latency-test')
+    for paper_id in ('2401.00001', '2401.00002'):
+        assert client.get(f'/papers/{paper_id}').status_code == 200
+
+    # One series per route pattern, not per URL
+    labels = {'app': 'latency-test', 'route': '/papers/<paper_id>'}
+    assert samples(client, 'aicademia_request_duration_seconds_count', status='200', **labels) == [2]
+    assert samples(client, 'aicademia_request_duration_seconds_bucket', le='+Inf', **labels) == [2]
+    assert samples(client, 'aicademia_requests_in_flight', **labels) == [0]
+
+
+def test_slow_request_writes_a_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics.sampler, 'path', str(tmp_path))
+    client = make_app('profile-test', slow_seconds=0.05)
+
+    assert client.get('/papers/2401.00001').status_code == 200
+    assert list(tmp_path.iterdir()) == []
+    assert client.get('/slow').status_code == 200
+
+    profile, = tmp_path.glob('*.folded')
+    assert 'profile-test_GET_slow' in profile.name
+    stacks = [line.rsplit(' ', 1) for line in profile.read_text().splitlines()]
+    assert any('slow (test_metrics.py' in stack for stack, _ in stacks)
+    assert sum(int(count) for _, count in stacks) > 1
+    assert samples(client, 'aicademia_slow_requests_total', app='profile-test') == [1]
+
+
+def test_sampler_waits_while_nothing_is_watched():
+    sampler = StackSampler(interval=0.001)
+    sampler.watch('request', threading.get_ident())
+    time.sleep(0.05)
+    assert sum(sampler.unwatch('request').values()) > 0
+
+    def waiting():
+        frame = sys._current_frames().get(sampler._thread.ident)
+        return frame is not None and frame.f_code.co_name == 'wait'
+
+    deadline = time.monotonic() + 2
+    while not waiting() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert waiting()
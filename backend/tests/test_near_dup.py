@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('mongomock_motor')
+from mongomock_motor import AsyncMongoMockClient
+
+from near_dup import SIGNATURES_COLLECTION, NearDuplicateDetector, mark_existing
+
+ABSTRACT = (
+    'We study how large language models encode demographic bias when they are used to screen job '
+    'applicants, and propose a counterfactual auditing procedure that swaps protected attributes in '
+    'resumes while holding qualifications fixed. Across four hiring datasets the procedure uncovers '
+    'disparities that aggregate fairness metrics miss, and a lightweight reweighting step removes most '
+    'of them without reducing screening accuracy on held out candidates.'
+)
+# One word changed and punctuation dropped, as a revised version on arXiv would differ
+REVISED = ABSTRACT.replace('four hiring datasets', 'five hiring datasets').replace(',', '')
+UNRELATED = (
+    'A finite element model of composite wind turbine blades predicts fatigue cracking under cyclic '
+    'loading, validated against strain gauge measurements from a full scale test rig over two million cycles.'
+)
+
+
+def paper(arxiv_id, summary, title='Auditing resume screening models'):
+    return {'arxiv_id': arxiv_id, 'title': title, 'summary': summary}
+
+
+def test_near_identical_abstract_is_flagged_and_unrelated_is_not(mongomock):
+    async def run():
+        detector = NearDuplicateDetector(AsyncMongoMockClient()['aicademia'])
+        batch = [paper('2401.00001', ABSTRACT), paper('2401.00002', REVISED),
+                 paper('2401.00003', UNRELATED, 'Fatigue of composite blades')]
+        assert await detector.mark('ethics_papers', batch) == 1
+        return batch
+
+    original, revised, unrelated = asyncio.run(run())
+    assert original['duplicate_of'] is None
+    assert revised['duplicate_of'] == 'ethics_papers:2401.00001'
+    assert unrelated['duplicate_of'] is None
+
+
+def test_signatures_persist_across_detectors(mongomock):
+    async def run():
+        database = AsyncMongoMockClient()['aicademia']
+        await NearDuplicateDetector(database).mark('ethics_papers', [paper('2401.00001', ABSTRACT)])
+
+        # A later harvest, e.g. after a restart, matches against what was stored
+        later = NearDuplicateDetector(database)
+        batch = [paper('2401.00002', REVISED), paper('2401.00001', ABSTRACT)]
+        await later.mark('policy_papers', batch)
+        assert len(later.index) == 3
+        return batch, await database[SIGNATURES_COLLECTION].count_documents({})
+
+    (revised, copy), stored = asyncio.run(run())
+    assert revised['duplicate_of'] == 'ethics_papers:2401.00001'
+    assert copy['duplicate_of'] == 'ethics_papers:2401.00001'
+    assert stored == 3
+
+
+def test_mark_existing_is_idempotent(mongomock):
+    database = mongomock.MongoClient()['aicademia']
+    database['engineering_papers'].insert_many([paper('2401.00001', ABSTRACT)])
+    database['ethics_papers'].insert_many([paper('2401.00001', REVISED), paper('2401.00003', UNRELATED)])
+    collections = ['engineering_papers', 'ethics_papers']
+
+    assert mark_existing(collections, database) == 1
+    signatures = list(database[SIGNATURES_COLLECTION].find({}, sort=[('_id', 1)]))
+    assert mark_existing(collections, database) == 1
+    assert list(database[SIGNATURES_COLLECTION].find({}, sort=[('_id', 1)])) == signatures
+
+    links = {(document['arxiv_id'], document['duplicate_of'])
+             for collection in collections for document in database[collection].find()}
+    assert links == {('2401.00001', None), ('2401.00001', 'engineering_papers:2401.00001'), ('2401.00003', None)}
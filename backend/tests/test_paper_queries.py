@@ -0,0 +1,52 @@
+import pytest
+
+from paper_queries import PAPER_INDEXES, PaperQueries, build_query
+
+PAPERS = [
+    {'arxiv_id': '2401.00001', 'title': 'Fairness audits of hiring models', 'summary': 'We audit models.',
+     'authors': ['Ada Lovelace', 'Alan Turing'], 'published': '2024-01-03T10:00:00Z'},
+    {'arxiv_id': '2401.00002', 'title': 'Policy for AI', 'summary': 'Regulation and FAIRNESS in practice.',
+     'authors': ['Grace Hopper'], 'published': '2024-01-02T10:00:00Z'},
+    {'arxiv_id': '2401.00003', 'title': 'Deep agents', 'summary': 'Robust planning.',
+     'authors': ['Alan Turing'], 'published': '2024-01-01T10:00:00Z'},
+]
+
+
+@pytest.fixture
+def queries(mongomock):
+    database = mongomock.MongoClient()['aicademia']
+    database['papers'].insert_many([dict(paper) for paper in PAPERS])
+    return PaperQueries(database)
+
+
+def arxiv_ids(papers):
+    return [paper['arxiv_id'] for paper in papers]
+
+
+def test_keywords_on_mongomock(queries):
+    assert not queries.text_search
+    assert arxiv_ids(queries.find_papers('papers', {'keywords': 'fairness'})) == ['2401.00001', '2401.00002']
+    assert arxiv_ids(queries.find_papers('papers', {'keywords': ['planning', 'policy']})) == ['2401.00002', '2401.00003']
+
+
+def test_criteria_combine(queries):
+    criteria = {'authors': ['Alan Turing'], 'published_before': '2024-01-02'}
+    assert arxiv_ids(queries.find_papers('papers', criteria)) == ['2401.00003']
+    criteria = {'keywords': 'fairness', 'published_after': '2024-01-03'}
+    assert arxiv_ids(queries.find_papers('papers', criteria)) == ['2401.00001']
+    assert arxiv_ids(queries.latest('papers', limit=2)) == ['2401.00001', '2401.00002']
+    assert queries.existing_arxiv_ids('papers', ['2401.00002', '2401.09999']) == {'2401.00002'}
+    assert queries.stats()['find_papers']['count'] == 3
+
+
+def test_every_criterion_has_an_index():
+    indexed = {field for index in PAPER_INDEXES for field, _ in index.document['key'].items()}
+    query = build_query({'keywords': 'x', 'published_after': '2024-01-01', 'authors': ['a'], 'arxiv_ids': ['1']})
+    assert '$text' in query
+    assert set(query) - {'$text'} <= indexed
+    assert {'title', 'summary'} <= indexed
+
+
+def test_unknown_criteria_are_refused():
+    with pytest.raises(ValueError):
+        build_query({'title': {'$regex': '.*'}})
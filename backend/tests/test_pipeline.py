@@ -0,0 +1,45 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip('faiss')
+pytest.importorskip('mongomock_motor')
+from aiohttp.test_utils import TestServer
+from mongomock_motor import AsyncMongoMockClient
+
+from benchmarks.stub_arxiv import make_app, synthetic_papers
+from pipeline import Pipeline
+from preprocessing import EMBEDDING_DIM
+
+
+class HashingModel:
+    """Deterministic stand-in for the SentenceTransformer, no download needed."""
+
+    def encode(self, texts, batch_size=64):
+        return np.stack([np.random.default_rng(abs(hash(text)) % 2 ** 32).random(EMBEDDING_DIM, dtype=np.float32)
+                         for text in texts])
+
+
+async def run_pipeline(tmp_path, n_papers, **index_params):
+    async with TestServer(make_app(synthetic_papers(n_papers))) as server:
+        pipeline = Pipeline(
+            queries={'engineering_papers': 'engineering AI'}, store_dir=str(tmp_path / 'embeddings'),
+            index_name=str(tmp_path / 'index'), database=AsyncMongoMockClient()['test'],
+            model=HashingModel(), save_interval=0.0,
+            harvester_options={'base_url': str(server.make_url('/api/query')), 'page_size': 5, 'min_interval': 0,
+                               'dedup': False},
+            **index_params
+        )
+        stats = await pipeline.run()
+    return pipeline, stats
+
+
+def test_ivf_pipeline_with_fewer_papers_than_centroids(tmp_path, mongomock):
+    pipeline, stats = asyncio.run(run_pipeline(tmp_path, 12, index_type='ivf_flat', nlist=16))
+
+    assert stats['index']['items'] == 12
+    assert len(pipeline.index) == 12
+    assert pipeline.index.provisional
+    _, doc_ids = pipeline.index.search(pipeline.stores['engineering_papers'].vectors()[:1], k=1)
+    assert doc_ids[0][0].startswith('engineering_papers:')
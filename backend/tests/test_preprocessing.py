@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('faiss')
+import preprocessing
+from embedding_store import EmbeddingStore
+from indexing import update_unified_index
+
+COLLECTION = 'engineering_papers'
+
+
+class HashingModel:
+    """Deterministic stand-in for the SentenceTransformer, no download needed."""
+
+    def __init__(self, name=None):
+        pass
+
+    def encode(self, texts, batch_size=64):
+        return np.stack([np.random.default_rng(abs(hash(text)) % 2 ** 32).random(preprocessing.EMBEDDING_DIM,
+                                                                                 dtype=np.float32)
+                         for text in texts])
+
+
+@pytest.fixture
+def db(mongomock, monkeypatch):
+    database = mongomock.MongoClient()['aicademia']
+    monkeypatch.setattr(preprocessing, 'db', database)
+    monkeypatch.setattr(preprocessing, 'SentenceTransformer', HashingModel)
+    monkeypatch.setattr(preprocessing, 'COLLECTIONS', [COLLECTION])
+    return database
+
+
+def words(n, offset=0):
+    return ' '.join(f'word{i + offset}' for i in range(n))
+
+
+def rebuild(tmp_path):
+    """Runs every passage stage and returns the passage ids each one holds."""
+    preprocessing.chunk_collection(COLLECTION, workers=1)
+    stores = {name: result['store'] for name, result in preprocessing.update_embeddings(
+        store_dir=str(tmp_path / 'embeddings'), passages=True).items()}
+    bm25 = preprocessing.update_bm25_index(path=str(tmp_path / 'bm25'), passages=True)
+    index = update_unified_index(stores, name=str(tmp_path / 'index'))
+    return {
+        'collection': {passage['_id'] for passage in preprocessing.db[preprocessing.PASSAGES_COLLECTION].find()},
+        'store': set(EmbeddingStore(str(tmp_path / 'embeddings' / 'passages' / COLLECTION),
+                                    preprocessing.EMBEDDING_DIM).doc_ids),
+        'bm25': {doc_id.split(':', 1)[1] for doc_id in bm25.id_of},
+        'index': {doc_id.split(':', 1)[1] for doc_id in index.doc_ids if doc_id is not None},
+    }
+
+
+def test_rechunked_paper_leaves_no_stale_passages(db, tmp_path):
+    paper_id = db[COLLECTION].insert_one({'content': words(700)}).inserted_id
+    db[COLLECTION].insert_one({'content': words(300, offset=1000)})
+    before = rebuild(tmp_path)
+    assert len(before['collection']) > 4
+    assert all(ids == before['collection'] for ids in before.values())
+
+    db[COLLECTION].update_one({'_id': paper_id}, {'$set': {'content': words(250, offset=5000)}})
+    after = rebuild(tmp_path)
+    assert len(after['collection']) < len(before['collection'])
+    for stage, ids in after.items():
+        assert ids == after['collection'], stage
+
+    # The store moved rows around; every vector must still be the one of its passage
+    store = EmbeddingStore(str(tmp_path / 'embeddings' / 'passages' / COLLECTION), preprocessing.EMBEDDING_DIM)
+    texts = {passage['_id']: passage['text'] for passage in db[preprocessing.PASSAGES_COLLECTION].find()}
+    np.testing.assert_array_equal(store.get(store.doc_ids), HashingModel().encode([texts[i] for i in store.doc_ids]))
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import aiohttp
+import pytest
+
+pytest.importorskip('quart')
+from aiohttp.test_utils import TestServer
+
+from benchmarks.stub_arxiv import make_app, synthetic_papers
+
+QUART_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'quart_app', 'oneRagent')
+
+
+def test_entry_point_finds_the_backend_modules_itself():
+    # A fresh interpreter, without the backend on its path
+    completed = subprocess.run([sys.executable, '-c', 'import app; import onlyRagent'], cwd=QUART_DIR,
+                               capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=''))
+    assert completed.returncode == 0, completed.stderr
+
+
+def test_agent_returns_the_first_paper_of_the_stub_feed(monkeypatch):
+    monkeypatch.syspath_prepend(QUART_DIR)
+    from onlyRagent import fetch_first_paper
+
+    papers = synthetic_papers(8)
+
+    async def run():
+        async with TestServer(make_app(papers)) as server, aiohttp.ClientSession() as session:
+            return await fetch_first_paper(session, str(server.make_url('/api/query?max_results=1')))
+
+    paper = asyncio.run(run())
+    assert paper['arxiv_id'] == papers[0]['arxiv_id']
+    assert paper['title'] == papers[0]['title']
+
+
+def test_cache_coalesces_loads_and_serves_stale_while_refreshing(monkeypatch):
+    monkeypatch.syspath_prepend(QUART_DIR)
+    from ttl_cache import AsyncTTLCache
+
+    loads = []
+
+    async def loader():
+        loads.append(None)
+        await asyncio.sleep(0.01)
+        return len(loads)
+
+    async def run():
+        cache = AsyncTTLCache(ttl=0.05, stale_ttl=10)
+        # Concurrent misses share one load
+        assert await asyncio.gather(*(cache.get_or_load('papers', loader) for _ in range(5))) == [1] * 5
+        assert await cache.get_or_load('papers', loader) == 1
+        await asyncio.sleep(0.06)
+        # Expired: the old value comes back at once while a refresh runs
+        assert await cache.get_or_load('papers', loader) == 1
+        await asyncio.sleep(0.03)
+        assert await cache.get_or_load('papers', loader) == 2
+        return cache.stats()
+
+    stats = asyncio.run(run())
+    assert len(loads) == 2
+    assert stats['misses'] == 5 and stats['coalesced'] == 4 and stats['stale_hits'] == 1
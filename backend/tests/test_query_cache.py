@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip('faiss')
+from indexing import PersistentIndex
+from query_cache import QueryCache, normalize_query
+from retrieval import RetrievalService
+
+DIM = 4
+
+
+class CountingModel:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, queries, batch_size=None):
+        self.encoded.extend(queries)
+        return np.ones((len(queries), DIM), dtype=np.float32)
+
+
+def unified_index(path, n):
+    index = PersistentIndex(str(path), DIM)
+    index.add(np.random.default_rng(0).random((n, DIM), dtype=np.float32), [f'ethics_papers:p{i}' for i in range(n)])
+    return index
+
+
+def test_normalize_query():
+    assert normalize_query('  What is\tALGORITHMIC\n\nbias? ') == 'what is algorithmic bias?'
+
+
+def test_normalized_queries_share_entries(tmp_path):
+    model, cache = CountingModel(), QueryCache()
+    service = RetrievalService(model, unified_index(tmp_path, 10), cache)
+
+    first = service.search(['Fairness  in hiring'], k=3)
+    assert service.search(['fairness in HIRING', 'fairness in hiring '], k=3) == first * 2
+    assert model.encoded == ['Fairness  in hiring']
+    # Domains are part of the result key, in any order, while the embedding is shared
+    service.search(['fairness in hiring'], k=3, domains=['policy_papers', 'ethics_papers'])
+    service.search(['fairness in hiring'], k=3, domains=['ethics_papers', 'policy_papers'])
+    assert model.encoded == ['Fairness  in hiring']
+    results = cache.stats()['results']
+    assert (results['hits'], results['misses']) == (3, 2)
+
+
+def test_results_dropped_when_the_index_changes(tmp_path):
+    model, cache = CountingModel(), QueryCache()
+    service = RetrievalService(model, unified_index(tmp_path / 'a', 10), cache)
+    assert len(service.search(['bias'], k=20)[0]) == 10
+
+    # Appending bumps the version
+    service.index.add(np.zeros((1, DIM), dtype=np.float32), ['ethics_papers:new'])
+    assert len(service.search(['bias'], k=20)[0]) == 11
+    assert cache.invalidations == 1
+
+    # A rebuilt index at the same version differs by generation
+    rebuilt = unified_index(tmp_path / 'b', 5)
+    rebuilt.add(np.zeros((1, DIM), dtype=np.float32), ['ethics_papers:new'])
+    assert rebuilt.version == service.index.version
+    service.index = rebuilt
+    assert len(service.search(['bias'], k=20)[0]) == 6
+    assert cache.invalidations == 2
+    # The query embedding survives every rebuild
+    assert model.encoded == ['bias']
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('spacy')
+import paper_db
+import report_generation
+from report_generation import (TREND_NGRAMS_COLLECTION, count_ngrams, identify_trends, refresh_trends,
+                               update_trend_counts)
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def database(mongomock, monkeypatch):
+    database = mongomock.MongoClient()['aicademia']
+    monkeypatch.setattr(report_generation, 'db', database)
+    monkeypatch.setattr(paper_db, 'get_db', lambda name=None: database)
+    return database
+
+
+def harvest(database, arxiv_id, title, summary, minutes):
+    database['papers'].update_one({'arxiv_id': arxiv_id}, {'$set': {
+        'title': title, 'summary': summary, 'harvested_at': START + timedelta(minutes=minutes)}}, upsert=True)
+
+
+def trend_table(database):
+    return {(row['n'], row['ngram']): row['count'] for row in database[TREND_NGRAMS_COLLECTION].find()}
+
+
+def recounted(database):
+    """The trend table a full count of the collection as it is now would give."""
+    counters = count_ngrams(database['papers'].find())
+    return {(n, ngram): count for n, counter in enumerate(counters, start=1) for ngram, count in counter.items()}
+
+
+def test_count_ngrams():
+    unigrams, bigrams, trigrams = count_ngrams([
+        {'title': 'Fair ranking', 'summary': 'Fair ranking of candidates.'},
+        {'title': 'Fair hiring'},
+    ])
+    # Tokens with punctuation attached are not words
+    assert unigrams == {'fair': 3, 'ranking': 2, 'of': 1, 'hiring': 1}
+    assert bigrams == {'fair ranking': 2, 'ranking fair': 1, 'ranking of': 1, 'fair hiring': 1}
+    assert trigrams == {'fair ranking fair': 1, 'ranking fair ranking': 1, 'fair ranking of': 1}
+
+
+def test_counts_follow_new_and_edited_papers(database):
+    # Stored before harvests were stamped
+    database['papers'].insert_one({'title': 'Legacy audit', 'summary': 'bias audit of credit models'})
+    harvest(database, '2401.00001', 'Fair ranking', 'ranking with exposure constraints', 0)
+    harvest(database, '2401.00002', 'Hiring audit', 'bias audit of hiring models', 1)
+    refresh_trends(['papers'], workers=1)
+    assert trend_table(database) == recounted(database)
+    assert identify_trends('papers', top_k=1) == {'top_n_grams': [('audit', 4)]}
+
+    # A new paper, and an edit of a counted one upserted under the same id
+    harvest(database, '2401.00003', 'Exposure audit', 'exposure in ranking', 2)
+    harvest(database, '2401.00001', 'Fair ranking', 'ranking under group fairness constraints', 3)
+    assert update_trend_counts('papers', workers=1) > 0
+    assert trend_table(database) == recounted(database)
+    # Only the old summary had these
+    assert (2, 'with exposure') not in trend_table(database)
+
+    # Nothing harvested since, nothing read
+    assert update_trend_counts('papers', workers=1) == 0
+    # Re-harvested unchanged, the paper is read but not counted again
+    harvest(database, '2401.00002', 'Hiring audit', 'bias audit of hiring models', 4)
+    update_trend_counts('papers', workers=1)
+    assert trend_table(database) == recounted(database)
+
+
+def test_reading_trends_does_not_count(database):
+    harvest(database, '2401.00001', 'Fair ranking', 'ranking with exposure constraints', 0)
+    assert identify_trends('papers') == {'top_n_grams': []}
+    assert trend_table(database) == {}
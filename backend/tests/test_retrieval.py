@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip('faiss')
+from indexing import PersistentIndex
+from retrieval import OVERFETCH, RetrievalService
+
+DIM = 8
+
+
+class VectorModel:
+    """Encodes each known query to a fixed vector."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, queries, batch_size=None):
+        return np.array([self.vectors[query] for query in queries], dtype=np.float32)
+
+
+def point(x):
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[0] = x
+    return vector
+
+
+@pytest.fixture
+def index(tmp_path):
+    # 100 engineering papers next to the origin, the two ethics papers far out
+    index = PersistentIndex(str(tmp_path), DIM)
+    index.add(np.stack([point(i) for i in range(100)]), [f'engineering_papers:e{i}' for i in range(100)])
+    index.add(np.stack([point(500), point(600)]), ['ethics_papers:t0', 'ethics_papers:t1'])
+    return index
+
+
+def test_results_merge_domains_by_distance(index):
+    service = RetrievalService(VectorModel({'near': point(0), 'far': point(650)}), index)
+    near, far = service.search(['near', 'far'], k=3)
+    assert [hit['doc_id'] for hit in near] == ['e0', 'e1', 'e2']
+    assert [(hit['domain'], hit['doc_id']) for hit in far] == [
+        ('ethics_papers', 't1'), ('ethics_papers', 't0'), ('engineering_papers', 'e99')]
+
+
+def test_domain_filter_widens_the_search(index):
+    service = RetrievalService(VectorModel({'near': point(0)}), index)
+    fetches = []
+    search = index.search
+    index.search = lambda queries, k: fetches.append(k) or search(queries, k)
+
+    hits, = service.search(['near'], k=2, domains=['ethics_papers'])
+    assert [hit['doc_id'] for hit in hits] == ['t0', 't1']
+    assert {hit['domain'] for hit in hits} == {'ethics_papers'}
+    # The ethics papers are the two farthest, found only once the fetch covers the whole index
+    assert fetches == [2 * OVERFETCH, 2 * OVERFETCH ** 2, len(index)]
+
+    fetches.clear()
+    hits, = service.search(['near'], k=2, domains=['engineering_papers'])
+    assert [hit['doc_id'] for hit in hits] == ['e0', 'e1']
+    assert fetches == [2 * OVERFETCH]
+
+
+def test_passage_hits_carry_their_paper(tmp_path):
+    index = PersistentIndex(str(tmp_path), DIM)
+    index.add(np.stack([point(0), point(1), point(2)]),
+              ['policy_papers:2401.00001:0', 'policy_papers:2401.00001:1', 'policy_papers:2401.00002:0'])
+    service = RetrievalService(VectorModel({'q': point(0)}), index, passages=True)
+
+    hits, = service.search(['q'], k=3)
+    assert [hit['doc_id'] for hit in hits] == ['2401.00001:0', '2401.00001:1', '2401.00002:0']
+    assert [hit['parent_id'] for hit in hits] == ['2401.00001', '2401.00001', '2401.00002']
+
+
+def test_empty_index(tmp_path):
+    service = RetrievalService(VectorModel({'q': point(0)}), PersistentIndex(str(tmp_path), DIM))
+    assert service.search(['q', 'q'], k=5, domains=['ethics_papers']) == [[], []]
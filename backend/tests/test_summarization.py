@@ -0,0 +1,25 @@
+import pytest
+
+spacy = pytest.importorskip('spacy')
+from summarization import SummaryService
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    # A blank English pipeline splits sentences without downloading a model
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    path = tmp_path_factory.mktemp('spacy') / 'blank_en'
+    nlp.to_disk(path)
+    return SummaryService(model=str(path))
+
+
+def test_papers_without_content_are_summarized_from_their_abstract(service):
+    abstract = ('Fairness audits of hiring models are rare. We audit three deployed models. '
+                'Two of them show disparate impact against women.')
+    papers = [{'_id': 1, 'summary': abstract}, {'_id': 2, 'content': 'Full text wins. It is longer.', 'summary': abstract}]
+
+    summaries = [summary for _, summary in service.summarize_papers(papers)]
+    assert 'disparate impact' in summaries[0]
+    assert 'Full text wins.' in summaries[1]
+    assert [summary for _, summary in service.summarize_papers(papers[:1], text_field='content')] == ['']
@@ -0,0 +1,16 @@
+from flask_sqlalchemy import SQLAlchemy
+
+
+db = SQLAlchemy()
+
+
+class User(db.Model):
+    __tablename__ = "user"
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(50), unique=True)
+    email = db.Column(db.String(100), unique=True, nullable=False)
+    password = db.Column(db.String(250), nullable=False)
+    is_business = db.Column(db.Boolean, default=False)
+    is_professional = db.Column(db.Boolean, default=False)
+    is_student = db.Column(db.Boolean, default=False)
+    is_admin = db.Column(db.Boolean, default=False)
@@ -1,7 +1,38 @@
+import asyncio
+import logging
+import os
+import sys
+import aiohttp
 from quart import Quart, render_template, jsonify
+
+# Atom parsing and metrics are shared with the backend, put it on the import path first
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from metrics import aiohttp_trace_config, instrument_quart
 from onlyRagent import eng_papers, eth_papers, pol_papers
+from ttl_cache import AsyncTTLCache
 
 app = Quart(__name__)
+# Per-route latency, sizes and in-flight counts on /metrics, and profiles of slow requests
+instrument_quart(app, 'oneRagent')
+
+# Papers change slowly: serve them fresh for 5 minutes, then keep serving the
+# old ones for up to an hour while a background refresh runs.
+papers_cache = AsyncTTLCache(ttl=300, stale_ttl=3600)
+
+AGENTS = {
+    "engineer_paper": eng_papers,
+    "ethicist_paper": eth_papers,
+    "policyMaker_paper": pol_papers
+}
+
+@app.before_serving
+async def open_session():
+    app.arxiv_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=len(AGENTS)),
+                                              trace_configs=[aiohttp_trace_config('arxiv')])
+
+@app.after_serving
+async def close_session():
+    await app.arxiv_session.close()
 
 @app.route('/')
 async def index():
@@ -9,16 +40,18 @@ async def index():
 
 @app.route('/api/papers')
 async def get_papers():
-    engineer_paper = await eng_papers()
-    ethicist_paper = await eth_papers()
-    policyMaker_paper = await pol_papers()
-    papers = {
-        "engineer_paper": engineer_paper,
-        "ethicist_paper": ethicist_paper,
-        "policyMaker_paper": policyMaker_paper
-    }
-    print("Fetched papers:", papers)  
+    session = app.arxiv_session
+    # The three agent queries run concurrently over the shared session
+    results = await asyncio.gather(*(
+        papers_cache.get_or_load(name, lambda agent=agent: agent(session)) for name, agent in AGENTS.items()
+    ))
+    papers = dict(zip(AGENTS, results))
+    logging.debug(f'Fetched papers: {papers}')
     return jsonify(papers)
 
+@app.route('/api/cache-stats')
+async def cache_stats():
+    return jsonify(papers_cache.stats())
+
 if __name__ == "__main__":
     app.run(debug=True)
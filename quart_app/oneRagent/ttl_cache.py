@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+
+
+class AsyncTTLCache:
+    """
+    In-process cache for coroutine results with stale-while-revalidate and single-flight loading.
+
+    A fresh entry is returned directly. An entry past its ttl but within
+    stale_ttl is still returned, and a refresh is started in the background.
+    Concurrent requests for a key that is being loaded all wait on the same
+    load instead of starting their own.
+
+    Args:
+        ttl (float): Seconds an entry is served as fresh.
+        stale_ttl (float): Extra seconds an expired entry may be served while it is refreshed.
+    """
+
+    def __init__(self, ttl=300, stale_ttl=3600):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}
+        self._inflight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key, loader):
+        """
+        Returns the cached value for key, calling loader() to produce it when needed.
+
+        None results are not cached, so a failed load is retried on the next request.
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            value, loaded_at = entry
+            age = now - loaded_at
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                refresh = self._load(key, loader)
+                # Nobody awaits a background refresh, its error is already logged
+                refresh.add_done_callback(lambda task: task.cancelled() or task.exception())
+                return value
+
+        self.misses += 1
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key, loader):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+
+        async def load():
+            try:
+                value = await loader()
+                if value is not None:
+                    self._entries[key] = (value, time.monotonic())
+                return value
+            except Exception:
+                logging.error(f'Error refreshing cache entry {key}', exc_info=True)
+                raise
+            finally:
+                del self._inflight[key]
+
+        task = asyncio.ensure_future(load())
+        self._inflight[key] = task
+        return task
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'entries': len(self._entries),
+            'inflight': len(self._inflight)
+        }